@@ -2,6 +2,7 @@
 TODO: Add description of the file here.
 """
 import argparse
+import json
 from math import floor, sqrt
 import os
 from pathlib import Path
@@ -10,6 +11,9 @@ import sys
 from matplotlib.colors import LinearSegmentedColormap
 
 from internals.result_extractor import extract_bot_positions, extract_death_positions, extract_kill_positions, read_map
+from internals.map_intermediates import load_topology_graph, load_visibility_matrix
+from internals.results_store import load_results
+from internals.atomic_write import atomic_write
 from internals.constants import ALL_BLACK_EMITTER_NAME, ALL_BLACK_NAME, ARCHIVE_ANALYSIS_OUTPUT_FOLDER, GAME_DATA_FOLDER, MAP_ELITES_OUTPUT_FOLDER
 import internals.constants as constants
 import internals.config as conf
@@ -33,8 +37,13 @@ import igraph as ig
 import pickle
 from internals.visibility import WALL_TILE, SPACE_TILE
 
+from dask.distributed import Client, LocalCluster, as_completed
 from ribs.archives import ArchiveDataFrame
 
+# Number of analyzed elites after which the list of analyzed elites is saved, so that an interrupted analysis can be
+# resumed without rewriting the list after every elite
+ANALYZED_SAVE_FREQ = 50
+
 # --- UTILS --- #
 
 def get_map_scale(representation):
@@ -347,8 +356,11 @@ def save_graphs(graphdir, experiment_name, phenotype, index, obj, meas_0, meas_1
         note=f"Name: {experiment_name}\n {conf.OBJECTIVE_NAME}: {obj:.4f}\n{conf.MEASURES_NAMES[0]}: {meas_0:.4f}\n{conf.MEASURES_NAMES[1]}: {meas_1:.4f}"
     )
 
-def save_graphs_vornoi(graphdir, experiment_name, phenotype, index, obj, meas_0, meas_1):
-    graph, outer_shell, obstacles = phenotype.to_topology_graph_vornoi()
+def save_graphs_vornoi(graphdir, experiment_name, phenotype, index, obj, meas_0, meas_1, folder_name=None):
+    if folder_name is not None:
+        graph, outer_shell, obstacles = load_topology_graph(folder_name, experiment_name, phenotype)
+    else:
+        graph, outer_shell, obstacles = phenotype.to_topology_graph_vornoi()
 
     __save_graph_vornoi(
         outer_shell,
@@ -360,8 +372,11 @@ def save_graphs_vornoi(graphdir, experiment_name, phenotype, index, obj, meas_0,
         note=f"Name: {experiment_name}\n {conf.OBJECTIVE_NAME}: {obj:.4f}\n{conf.MEASURES_NAMES[0]}: {meas_0:.4f}\n{conf.MEASURES_NAMES[1]}: {meas_1:.4f}"
     )
 
-def save_visibility_maps(visibilitydir, experiment_name, phenotype, index, obj, meas_0, meas_1):
-    matrix = phenotype.to_visibility_matrix_grid()
+def save_visibility_maps(visibilitydir, experiment_name, phenotype, index, obj, meas_0, meas_1, folder_name=None):
+    if folder_name is not None:
+        matrix = load_visibility_matrix(folder_name, experiment_name, phenotype)
+    else:
+        matrix = phenotype.to_visibility_matrix_grid()
 
     __save_visibility_map(
         matrix,
@@ -370,16 +385,10 @@ def save_visibility_maps(visibilitydir, experiment_name, phenotype, index, obj,
         note=f"Name: {experiment_name}\n {conf.OBJECTIVE_NAME}: {obj:.4f}\n{conf.MEASURES_NAMES[0]}: {meas_0:.4f}\n{conf.MEASURES_NAMES[1]}: {meas_1:.4f}"
     )
 
-def save_results(resultsDir, exportDir, iteration, individual_number, cumulative_dataset):
+def save_results(resultsDir, dataset, iteration, individual_number):
     name = f"final_results_{iteration}_{individual_number}"
-    dataset = pd.read_json(os.path.join(exportDir, name + ".json"))
     dataset.to_json(os.path.join(resultsDir, name + ".json"), orient='records', indent=4)
 
-    if cumulative_dataset is None:
-        return dataset
-    else:
-        return pd.concat([cumulative_dataset, dataset], ignore_index=True)
-    
 def save_lineage_map(lineageDir, lineage, experiment_name, index, obj, meas_0, meas_1):
     if len(lineage) == 0:
         return
@@ -395,35 +404,129 @@ def save_lineage_map(lineageDir, lineage, experiment_name, index, obj, meas_0, m
 # --- MAIN --- #
 
 
+def get_output_dirs(outdir):
+    """Returns the subdirectories of the analysis outputs: maps, positions, deaths, graphs, Voronoi graphs, visibility,
+    results and lineages"""
+    return tuple(Path(os.path.join(outdir, name)) for name in
+                 ["Maps", "Positions_Heatmaps", "Deaths_Kills_Heatmaps", "Graphs", "GraphsVornoi", "Visibility", "Results", "Lineages"])
+
+
+def get_elite_outputs(outdir, representation, index, iteration, individual_number, lineage):
+    """Returns the paths of the files saved by analyze_elite for an elite"""
+    mapsDir, positionDir, deathsDir, graphsDir, graphsVornoiDir, visibilityDir, resultsDir, lineageDir = get_output_dirs(outdir)
+    cell = f"{int(index/conf.MEASURES_BINS_NUMBER[0])}_{int(index%conf.MEASURES_BINS_NUMBER[1])}"
+    paths = [mapsDir / f"map_{cell}.png"]
+    if representation == constants.SMT_NAME:
+        paths.append(mapsDir / f"map_lines_{cell}.png")
+    for bot_n in range(0, 2):
+        paths += [
+            positionDir / f"map_{cell}_positions_bot_{bot_n}.png",
+            deathsDir / f"map_{cell}_deaths_bot_{bot_n}.png",
+            deathsDir / f"map_{cell}_kills_bot_{bot_n}.png",
+            deathsDir / f"map_{cell}_kill_traces_bot_{bot_n}.png",
+        ]
+    paths += [
+        graphsDir / f"graph_{cell}.png",
+        graphsDir / f"graph_{cell}_map.png",
+        graphsVornoiDir / f"graph_vornoi_{cell}.png",
+        visibilityDir / f"visibility_map_{cell}.png",
+        resultsDir / f"final_results_{iteration}_{individual_number}.json",
+    ]
+    if len(lineage) > 0:
+        paths.append(lineageDir / f"lineage_{cell}.png")
+    return paths
+
+
+def analyze_elite(
+    representation,
+    folder_name,
+    outdir,
+    solution,
+    index,
+    obj,
+    meas_0,
+    meas_1,
+    iteration,
+    individual_number,
+    lineage,
+    dataset,
+):
+    """
+    Save the analysis of an elite of the archive. It's run by the Dask workers, one elite per task.
+
+    Args:
+        dataset (pandas.DataFrame): The results of the elite, with one row per match
+
+    Returns:
+        bool: Whether the elite was analyzed. Elites whose map or phenotype can't be read are skipped
+    """
+    mapsDir, positionDir, deathsDir, graphsDir, graphsVornoiDir, visibilityDir, resultsDir, lineageDir = get_output_dirs(outdir)
+    exportDir = Path(os.path.join(GAME_DATA_FOLDER, "Export", folder_name))
+
+    experiment_name = str(iteration) + "_" + str(individual_number)
+    if representation == constants.SMT_NAME:
+        try:
+            phenotype_file = open(os.path.join(exportDir, 'phenotype_' + experiment_name + '.pkl'), 'rb')
+            phenotype = pickle.load(phenotype_file)
+            phenotype_file.close()
+        except:
+            return False
+    else:
+        phenotype = get_phenotype_from_solution(solution, representation)
+    try:
+        sol_map_matrix = read_map(experiment_name, folder_name)
+    except:
+        return False
+    map_scale = get_map_scale(representation)
+
+    save_image_map(mapsDir, experiment_name, sol_map_matrix, index, obj, meas_0, meas_1)
+    if representation == constants.SMT_NAME:
+        genotype = SMTGenome.array_as_genome(list(map(int, solution.tolist())))
+        save_image_map_lines(mapsDir, experiment_name, phenotype, genotype.lines, index, obj, meas_0, meas_1)
+    save_bot_positions_heatmap(exportDir, positionDir, experiment_name, sol_map_matrix, index, obj, meas_0, meas_1, map_scale)
+    save_deaths_and_kills_map(exportDir, deathsDir, experiment_name, sol_map_matrix, index, obj, meas_0, meas_1, map_scale)
+    save_graphs(graphsDir, experiment_name, phenotype, index, obj, meas_0, meas_1)
+    save_graphs_vornoi(graphsVornoiDir, experiment_name, phenotype, index, obj, meas_0, meas_1, folder_name)
+    save_visibility_maps(visibilityDir, experiment_name, phenotype, index, obj, meas_0, meas_1, folder_name)
+    save_results(resultsDir, dataset, iteration, individual_number)
+    save_lineage_map(lineageDir, lineage, experiment_name, index, obj, meas_0, meas_1)
+    return True
+
+
+def __save_analyzed(path, analyzed):
+    atomic_write(path, lambda f: json.dump(analyzed, f, indent=4), mode="w")
+
 def analyze_archive(
     representation,
     folder_name="test_directory",
+    client=None,
 ):
+    """
+    Save the analysis of each elite of the archive of an experiment, and the results of all of them.
+
+    Elites are analyzed in parallel by the Dask workers, or one after the other if no client is given. The elites that
+    were already analyzed by a previous run are skipped if they are still in the archive and their outputs still exist,
+    so that the analysis of a resumed search only analyzes its new elites. They are listed in analyzed_elites.json in
+    the output folder, which can be deleted to analyze all the elites again. Elites without results in the results store
+    (e.g. whose result files were lost) are skipped.
+
+    Args:
+        representation (str): The name of the map representation. See constants.py for possible values
+        folder_name (str): The name of the experiment
+        client (Client): The Dask client used to analyze the elites
+    """
     # Make parent output directory
     outdir = Path(os.path.join(ARCHIVE_ANALYSIS_OUTPUT_FOLDER, folder_name))
     outdir.mkdir(exist_ok=True)
 
     # Get existing directiories with data to analyze
     archiveDir = Path(os.path.join(MAP_ELITES_OUTPUT_FOLDER, folder_name))
-    exportDir = Path(os.path.join(GAME_DATA_FOLDER, "Export", folder_name))
 
     # Make subdirectories for analysis outputs
-    mapsDir = Path(os.path.join(outdir, "Maps"))
-    mapsDir.mkdir(exist_ok=True)
-    positionDir = Path(os.path.join(outdir, "Positions_Heatmaps"))
-    positionDir.mkdir(exist_ok=True)
-    deathsDir = Path(os.path.join(outdir, "Deaths_Kills_Heatmaps"))
-    deathsDir.mkdir(exist_ok=True)
-    graphsDir = Path(os.path.join(outdir, "Graphs"))
-    graphsDir.mkdir(exist_ok=True)
-    graphsVornoiDir = Path(os.path.join(outdir, "GraphsVornoi"))
-    graphsVornoiDir.mkdir(exist_ok=True)
-    visibilityDir = Path(os.path.join(outdir, "Visibility"))
-    visibilityDir.mkdir(exist_ok=True)
-    resultsDir = Path(os.path.join(outdir, "Results"))
-    resultsDir.mkdir(exist_ok=True)
-    lineageDir = Path(os.path.join(outdir, "Lineages"))
-    lineageDir.mkdir(exist_ok=True)
+    output_dirs = get_output_dirs(outdir)
+    for output_dir in output_dirs:
+        output_dir.mkdir(exist_ok=True)
+    resultsDir = output_dirs[6]
 
     # Load archive data
     df = ArchiveDataFrame(pd.read_csv(archiveDir / "archive.csv"))
@@ -437,53 +540,79 @@ def analyze_archive(
     meas_1 = df.get_field("measures_1")
     iterations = df.get_field("iterations")
     individual_numbers = df.get_field("individual_numbers")
-    
-    cumulative_dataset = None
+
+    # Load the results of the iterations of the elites
+    results = load_results(folder_name, sorted(set(int(iteration) for iteration in iterations)))
 
     # Load lineages
     lineage_file = open(os.path.join(archiveDir, 'lineages.pkl'), 'rb')
     lineages = pickle.load(lineage_file)
     lineage_file.close()
 
-    # Analyze each solution
-    for idx in tqdm.trange(0, len(solutions)):
-        skip = False
-        sol = solutions[idx]
-        experiment_name = str(int(iterations[idx])) + "_" + str(int(individual_numbers[idx]))
-        if representation == constants.SMT_NAME:
-            try:
-                phenotype_file = open(os.path.join(exportDir, 'phenotype_' + experiment_name + '.pkl'), 'rb')
-                phenotype = pickle.load(phenotype_file)
-                phenotype_file.close()
-            except:
-                skip = True
-        else:
-            phenotype = get_phenotype_from_solution(sol, representation)
-        try:
-            sol_map_matrix = read_map(
-                str(int(iterations[idx])) + "_" + str(int(individual_numbers[idx])), folder_name)
-        except:
-            skip = True
-        if not skip:
-            map_scale = get_map_scale(representation)
-            
-            save_image_map(mapsDir, experiment_name, sol_map_matrix,
-                           indexes[idx], obj[idx], meas_0[idx], meas_1[idx])
-            if representation == constants.SMT_NAME:
-                genotype = SMTGenome.array_as_genome(list(map(int, sol.tolist())))
-                save_image_map_lines(mapsDir, experiment_name, phenotype, genotype.lines,
-                                     indexes[idx], obj[idx], meas_0[idx], meas_1[idx])
-            save_bot_positions_heatmap(exportDir, positionDir, experiment_name, sol_map_matrix,
-                                      indexes[idx], obj[idx], meas_0[idx], meas_1[idx], map_scale)
-            save_deaths_and_kills_map(exportDir, deathsDir, experiment_name, sol_map_matrix,
-                                        indexes[idx], obj[idx], meas_0[idx], meas_1[idx], map_scale)
-            save_graphs(graphsDir, experiment_name, phenotype, indexes[idx], obj[idx], meas_0[idx], meas_1[idx])
-            save_graphs_vornoi(graphsVornoiDir, experiment_name, phenotype, indexes[idx], obj[idx], meas_0[idx], meas_1[idx])
-            save_visibility_maps(visibilityDir, experiment_name, phenotype, indexes[idx], obj[idx], meas_0[idx], meas_1[idx])
-            cumulative_dataset = save_results(resultsDir, exportDir, int(iterations[idx]), int(individual_numbers[idx]), cumulative_dataset)
-            save_lineage_map(lineageDir, lineages[indexes[idx]], experiment_name, indexes[idx], obj[idx], meas_0[idx], meas_1[idx])
+    # Elite analyzed in each cell of the archive by the previous runs
+    analyzed_path = outdir / "analyzed_elites.json"
+    try:
+        with open(analyzed_path, "r") as f:
+            analyzed = json.load(f)
+    except (FileNotFoundError, ValueError):
+        analyzed = {}
+
+    def elite_key(idx):
+        return str(int(indexes[idx])), str(int(iterations[idx])) + "_" + str(int(individual_numbers[idx]))
+
+    def has_results(idx):
+        return (int(iterations[idx]), int(individual_numbers[idx])) in results.index
+
+    def is_analyzed(idx):
+        cell, experiment_name = elite_key(idx)
+        if analyzed.get(cell) != experiment_name:
+            return False
+        outputs = get_elite_outputs(outdir, representation, indexes[idx], int(iterations[idx]), int(individual_numbers[idx]), lineages[indexes[idx]])
+        return all(path.exists() for path in outputs)
+
+    def elite_dataset(idx):
+        return results.loc[(int(iterations[idx]), int(individual_numbers[idx]))]
+
+    def elite_args(idx):
+        return (representation, folder_name, outdir, solutions[idx], indexes[idx], obj[idx], meas_0[idx], meas_1[idx],
+                int(iterations[idx]), int(individual_numbers[idx]), lineages[indexes[idx]], elite_dataset(idx))
+
+    # The up-to-date elites are filtered out first, so that the arguments are only built for the ones to analyze
+    with_results = [idx for idx in range(0, len(solutions)) if has_results(idx)]
+    if len(with_results) < len(solutions):
+        tqdm.tqdm.write(f"Skipping {len(solutions) - len(with_results)} elites without results")
+    up_to_date = set(idx for idx in with_results if is_analyzed(idx))
+    to_analyze = [idx for idx in with_results if idx not in up_to_date]
+    tqdm.tqdm.write(f"Analyzing {len(to_analyze)} elites, {len(up_to_date)} are up to date")
 
-    
+    # Analyze each solution
+    if client is None:
+        completed = ((idx, analyze_elite(*elite_args(idx))) for idx in to_analyze)
+    else:
+        futures = {client.submit(analyze_elite, *elite_args(idx), pure=False): idx for idx in to_analyze}
+        completed = ((futures[future], future.result()) for future in as_completed(futures))
+    num_unsaved = 0
+    try:
+        for idx, done in tqdm.tqdm(completed, total=len(to_analyze)):
+            if done:
+                cell, experiment_name = elite_key(idx)
+                analyzed[cell] = experiment_name
+                up_to_date.add(idx)
+                num_unsaved += 1
+                if num_unsaved >= ANALYZED_SAVE_FREQ:
+                    __save_analyzed(analyzed_path, analyzed)
+                    num_unsaved = 0
+    finally:
+        # Also saved if the analysis is interrupted, so that it can be resumed
+        if num_unsaved > 0:
+            __save_analyzed(analyzed_path, analyzed)
+
+    # Results of the elites that were analyzed, in the order of their cells
+    datasets = [elite_dataset(idx) for idx in sorted(up_to_date)]
+    if len(datasets) == 0:
+        tqdm.tqdm.write("No elite was analyzed, the final results are not saved")
+        return
+    cumulative_dataset = pd.concat(datasets, ignore_index=True)
     cumulative_dataset.to_json(os.path.join(resultsDir, "_final_results.json"), orient='columns', indent=4)
     aggregate_dataset = pd.DataFrame()
     for column in cumulative_dataset.columns:
@@ -506,7 +635,10 @@ if __name__ == "__main__":
     folder_name = args.folder_name if args.folder_name != "" else conf.folder_name()
 
 
-    analyze_archive(
-        representation=conf.REPRESENTATION_NAME,
-        folder_name=folder_name
-    )
+    # Each elite is analyzed by a worker process, since the figures are drawn with pyplot which is not thread-safe
+    with LocalCluster(processes=True, n_workers=args.workers, threads_per_worker=1) as cluster, Client(cluster) as client:
+        analyze_archive(
+            representation=conf.REPRESENTATION_NAME,
+            folder_name=folder_name,
+            client=client
+        )
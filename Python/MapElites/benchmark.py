@@ -0,0 +1,279 @@
+"""
+Benchmark of the Python hot paths of the evaluation, for each map representation.
+
+Every stage is timed on the same fixed-seed genomes: decoding the genome array (as a list and as a batch of records),
+building the phenotype and its map matrix, the Voronoi topology graph, the visibility matrices (grid and DDA), the graph
+analysis, the heatmap features and the symmetry. The stages that work on the map are also timed on maps scaled by the
+given factors, to see how they grow with the size of the map. For each stage the time per call, the throughput and the
+peak memory allocated are saved as JSON, so that results of different commits can be compared with --compare.
+"""
+import argparse
+import datetime
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+import tqdm
+
+import internals.constants as constants
+import internals.result_extractor as result_extractor
+from internals.area import scale_area
+from internals.config import NUM_PARALLEL_SIMULATIONS
+from internals.constants import BENCHMARK_OUTPUT_FOLDER
+from internals.genomes import GENOME_CLASSES, records_as_genomes, solutions_as_records
+from internals.phenotype import Phenotype
+
+
+# Walls added by the game around the map, as read by the result extractor
+MAP_BORDER = 5
+# Positions logged by the game for each bot in a 600 seconds match, and an average number of deaths
+POSITIONS_PER_SIMULATION = 1200
+DEATHS_PER_SIMULATION = 30
+
+
+def scale_phenotype(phenotype, scale):
+    """Scale the map of a phenotype by an integer factor, keeping its layout."""
+    if scale == 1:
+        return phenotype
+    return Phenotype(phenotype.mapWidth * scale, phenotype.mapHeight * scale, phenotype.mapScale,
+                     [scale_area(area, scale) for area in phenotype.areas])
+
+
+def sample_match_positions(rng, map_matrix, num_positions, num_simulations=NUM_PARALLEL_SIMULATIONS):
+    """
+    Sample positions on the walkable tiles of a map, in the format given by load_match_exports.
+
+    Returns:
+        tuple: p_x, p_y with one list per bot with one array of coordinates per simulation
+    """
+    floor = np.argwhere(map_matrix == 0)
+    p_x, p_y = [], []
+    for _ in range(result_extractor.BOT_NUM):
+        tiles = [floor[rng.integers(0, len(floor), num_positions)] + rng.random((num_positions, 2)) for _ in range(num_simulations)]
+        p_x.append([t[:, 1].astype(np.float32) for t in tiles])
+        p_y.append([t[:, 0].astype(np.float32) for t in tiles])
+    return p_x, p_y
+
+
+def get_stages(genome_class):
+    """
+    Get the stages to benchmark. Each stage is (name, setup, run, on_map): setup prepares the input of a stage from a
+    genome array and a map scale, out of the timed section, and run executes the stage on it. Stages with on_map set
+    are run for every scale.
+    """
+    def genome_input(array, scale):
+        return array
+
+    def solution_input(array, scale):
+        # As returned by the scheduler
+        return np.asarray([array], dtype=np.float64)
+
+    def genome_phenotype_input(array, scale):
+        return genome_class.array_as_genome(array)
+
+    def phenotype_input(array, scale):
+        return scale_phenotype(genome_class.array_as_genome(array).phenotype(), scale)
+
+    def topology_input(array, scale):
+        graph, _, _ = phenotype_input(array, scale).to_topology_graph_vornoi()
+        rooms = [v for v in graph.vs if v['region']]
+        chokepoints = [v for v in graph.vs if v['chokepoint']]
+        return graph, rooms, chokepoints
+
+    def heatmaps_input(array, scale):
+        map_matrix = np.pad(phenotype_input(array, scale).map_matrix(), MAP_BORDER, constant_values=1)
+        # Seeded by the genome, so that every run gets the same positions
+        rng = np.random.default_rng(abs(hash(tuple(array))) % (2 ** 32))
+        positions = sample_match_positions(rng, map_matrix, POSITIONS_PER_SIMULATION)
+        kills = sample_match_positions(rng, map_matrix, DEATHS_PER_SIMULATION)
+        deaths = sample_match_positions(rng, map_matrix, DEATHS_PER_SIMULATION)
+        features = [("Position", *positions), ("Kill", *kills), ("Death", *deaths)]
+        return features, map_matrix
+
+    def graph_analysis(graph_rooms_chokepoints):
+        graph, rooms, chokepoints = graph_rooms_chokepoints
+        dataset = pd.DataFrame(index=range(NUM_PARALLEL_SIMULATIONS))
+        result_extractor.graph_analysis(graph, rooms, dataset, chokepoints)
+
+    def heatmaps(features_map):
+        features, map_matrix = features_map
+        dataset = pd.DataFrame(index=range(NUM_PARALLEL_SIMULATIONS))
+        result_extractor.analyze_heatmaps(dataset, features, result_extractor.BOT_NUM, map_matrix)
+
+    return [
+        ("array_as_genome", genome_input, genome_class.array_as_genome, False),
+        ("records_as_genomes", solution_input, lambda solutions: records_as_genomes(genome_class, solutions_as_records(genome_class, solutions)), False),
+        ("phenotype", genome_phenotype_input, lambda genome: genome.phenotype(), False),
+        ("map_matrix", phenotype_input, lambda phenotype: phenotype.map_matrix(), True),
+        ("topology_vornoi", phenotype_input, lambda phenotype: phenotype.to_topology_graph_vornoi(), True),
+        ("visibility_grid", phenotype_input, lambda phenotype: phenotype.to_visibility_matrix_grid(), True),
+        ("visibility_DDA", phenotype_input, lambda phenotype: phenotype.to_visibility_matrix_DDA(), True),
+        ("graph_analysis", topology_input, graph_analysis, True),
+        ("heatmaps", heatmaps_input, heatmaps, True),
+        ("symmetry", phenotype_input, lambda phenotype: result_extractor.compute_symmetry([phenotype.map_matrix()]), True),
+    ]
+
+
+def get_genome_arrays(genome_class, num_genomes, seed):
+    """
+    Create random genomes with a fixed seed. Genomes whose phenotype can't be built (e.g. unsolvable SMT genomes) are
+    skipped, so that every stage runs on the same genomes.
+
+    Returns:
+        list: The arrays of the genomes
+    """
+    random.seed(seed)
+    np.random.seed(seed)
+    arrays = []
+    attempts = 0
+    while len(arrays) < num_genomes and attempts < num_genomes * 10:
+        attempts += 1
+        # Solutions are cast to int before being decoded, as done by solution_to_phenotype
+        array = list(map(int, genome_class.create_random_genome().to_array()))
+        try:
+            if genome_class.array_as_genome(array).phenotype() is not None:
+                arrays.append(array)
+        except Exception:
+            continue
+    return arrays
+
+
+def benchmark_stage(setup, run, arrays, scale, repeats):
+    """
+    Time a stage on all the genomes. The first call is a warm up (e.g. for numba compilation) and is not timed. Peak
+    memory is measured in a separate pass with tracemalloc, since tracing slows down the stage.
+
+    Returns:
+        dict: Timings in seconds per call, throughput in calls per second and peak memory in bytes
+    """
+    inputs = [setup(array, scale) for array in arrays]
+    run(inputs[0])
+
+    times = []
+    for _ in range(repeats):
+        for stage_input in inputs:
+            start = time.perf_counter()
+            run(stage_input)
+            times.append(time.perf_counter() - start)
+
+    peak_memory = 0
+    for stage_input in inputs:
+        tracemalloc.start()
+        run(stage_input)
+        peak_memory = max(peak_memory, tracemalloc.get_traced_memory()[1])
+        tracemalloc.stop()
+
+    times = np.array(times)
+    return {
+        "calls": len(times),
+        "mean_s": float(np.mean(times)),
+        "median_s": float(np.median(times)),
+        "min_s": float(np.min(times)),
+        "std_s": float(np.std(times)),
+        "throughput_per_s": float(len(times) / np.sum(times)),
+        "peak_memory_bytes": int(peak_memory),
+    }
+
+
+def run_benchmark(representations, stages=None, scales=(1,), num_genomes=10, repeats=3, seed=0):
+    """
+    Run the benchmark of the given representations.
+
+    Args:
+        representations (list): The names of the map representations. See constants.py for possible values
+        stages (list): The names of the stages to run, all of them if None
+        scales (list): The factors by which the maps are scaled for the stages that work on the map
+        num_genomes (int): The number of genomes of each representation
+        repeats (int): The number of times each stage is run on each genome
+        seed (int): The seed used to create the genomes
+
+    Returns:
+        list: One record for each representation, stage and scale
+    """
+    results = []
+    for representation in representations:
+        genome_class = GENOME_CLASSES[representation]
+        arrays = get_genome_arrays(genome_class, num_genomes, seed)
+        if len(arrays) == 0:
+            tqdm.tqdm.write(f"No valid genome for {representation}, skipping it")
+            continue
+        for name, setup, run, on_map in get_stages(genome_class):
+            if stages is not None and name not in stages:
+                continue
+            for scale in (scales if on_map else [1]):
+                record = {"representation": representation, "stage": name, "scale": scale, "genomes": len(arrays)}
+                record.update(benchmark_stage(setup, run, arrays, scale, repeats))
+                tqdm.tqdm.write(f"{representation:>8} {name:>16} x{scale}: {record['median_s'] * 1000:10.3f} ms, "
+                                f"{record['throughput_per_s']:10.2f}/s, {record['peak_memory_bytes'] / 2 ** 20:8.2f} MB")
+                results.append(record)
+    return results
+
+
+def get_metadata(args):
+    try:
+        commit = subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        "commit": commit,
+        "date": datetime.datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "platform": platform.platform(),
+        "processor": platform.processor(),
+        "seed": args.seed,
+        "genomes": args.genomes,
+        "repeats": args.repeats,
+        "scales": args.scales,
+    }
+
+
+def compare_results(old_results, new_results):
+    """Print the speedup and memory ratio of each stage with respect to an older run."""
+    old = {(r["representation"], r["stage"], r["scale"]): r for r in old_results}
+    for r in new_results:
+        key = (r["representation"], r["stage"], r["scale"])
+        if key not in old:
+            continue
+        speedup = old[key]["median_s"] / r["median_s"]
+        memory_ratio = r["peak_memory_bytes"] / max(1, old[key]["peak_memory_bytes"])
+        print(f"{key[0]:>8} {key[1]:>16} x{key[2]}: {speedup:6.2f}x speedup, {memory_ratio:6.2f}x memory")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Benchmark the evaluation stages.')
+
+    parser.add_argument("--representations", default=constants.GENOME_NAMES, nargs="+", choices=constants.GENOME_NAMES, dest="representations")
+    parser.add_argument("--stages", default=None, nargs="+", dest="stages")
+    parser.add_argument("--scales", default=[1, 2, 4], type=int, nargs="+", dest="scales")
+    parser.add_argument("--genomes", default=10, type=int, dest="genomes")
+    parser.add_argument("--repeats", default=3, type=int, dest="repeats")
+    parser.add_argument("--seed", default=0, type=int, dest="seed")
+    parser.add_argument("--output", default="", type=str, dest="output")
+    # A previous output of the benchmark to compare the results with
+    parser.add_argument("--compare", default="", type=str, dest="compare")
+
+    args = parser.parse_args(sys.argv[1:])
+
+    results = run_benchmark(args.representations, args.stages, args.scales, args.genomes, args.repeats, args.seed)
+    benchmark = {"metadata": get_metadata(args), "results": results}
+
+    output = args.output
+    if output == "":
+        os.makedirs(BENCHMARK_OUTPUT_FOLDER, exist_ok=True)
+        commit = benchmark["metadata"]["commit"][:8] if benchmark["metadata"]["commit"] is not None else "nocommit"
+        output = os.path.join(BENCHMARK_OUTPUT_FOLDER, f"benchmark_{commit}_{datetime.datetime.now():%Y%m%d_%H%M%S}.json")
+    with open(output, "w") as file:
+        json.dump(benchmark, file, indent=2)
+    print(f"Results saved to {output}")
+
+    if args.compare != "":
+        with open(args.compare, "r") as file:
+            compare_results(json.load(file)["results"], results)
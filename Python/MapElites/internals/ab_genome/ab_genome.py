@@ -4,11 +4,15 @@ import numpy
 
 from internals.area import Area
 from internals.phenotype import Phenotype
+from internals.genome_layout import array_as_record
 from internals.ab_genome import mutation, crossover, generation, constants
 from internals.ab_genome.constants import AB_SQUARE_SIZE, AB_NUM_ROOMS, AB_NUM_CORRIDORS, AB_MAX_MAP_WIDTH, AB_MAX_MAP_HEIGHT, \
     AB_CORRIDOR_WIDTH, AB_MAP_SCALE
 
 class ABGenome:
+    # Fields of the array of the genome, in order, with their shape. See genomes.solutions_as_records
+    ARRAY_LAYOUT = [("rooms", (AB_NUM_ROOMS, 3)), ("corridors", (AB_NUM_CORRIDORS, 3))]
+
     def __init__(self, rooms, corridors):
         self.rooms = rooms
         self.corridors = corridors
@@ -44,15 +48,15 @@ class ABGenome:
     def array_as_genome(array):
         if len(array) != (AB_NUM_ROOMS + AB_NUM_CORRIDORS) * 3:
             raise ValueError(
-                f"Expected genome to have {AB_NUM_ROOMS + AB_NUM_CORRIDORS} rooms and corridors, but it had {array.size // 3}.")
+                f"Expected genome to have {AB_NUM_ROOMS + AB_NUM_CORRIDORS} rooms and corridors, but it had {len(array) // 3}.")
         
-        rooms = []
-        corridors = []
-        for i in range(0, AB_NUM_ROOMS * 3, 3):
-            rooms.append(ABRoom(array[i], array[i + 1], array[i + 2]))
-        for i in range(AB_NUM_ROOMS * 3, (AB_NUM_ROOMS + AB_NUM_CORRIDORS) * 3, 3):
-            corridors.append(ABCorridor(array[i], array[i + 1], array[i + 2]))
-            
+        return ABGenome.record_as_genome(array_as_record(ABGenome.ARRAY_LAYOUT, array))
+
+    @staticmethod
+    def record_as_genome(record):
+        """Builds a genome from a record of a batch, with its fields as lists. See genomes.records_as_genomes"""
+        rooms = [ABRoom(*room) for room in record["rooms"]]
+        corridors = [ABCorridor(*corridor) for corridor in record["corridors"]]
         return ABGenome(rooms, corridors)
 
 
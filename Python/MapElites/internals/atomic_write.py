@@ -0,0 +1,31 @@
+import os
+import uuid
+
+
+def atomic_write(path, write_fn, mode="wb"):
+    """
+    Write a file through a temporary file in the same folder, which is then moved in place, so that readers never see
+    a partially written file. Temporary files start with a dot and end with .tmp, so that they are ignored by the
+    readers of the folder, and are removed if the write fails.
+
+    Args:
+        path (str): The path of the file
+        write_fn (callable): Function writing the content to the open file it is given
+        mode (str): The mode the temporary file is opened with
+
+    Returns:
+        The value returned by write_fn
+    """
+    # Unique for each call, so that processes and threads writing the same file don't write to the same temporary file
+    temp_path = os.path.join(os.path.dirname(path), f".{os.path.basename(path)}.{uuid.uuid4().hex}.tmp")
+    try:
+        with open(temp_path, mode) as f:
+            result = write_fn(f)
+        os.replace(temp_path, path)
+    except BaseException:
+        try:
+            os.remove(temp_path)
+        except FileNotFoundError:
+            pass
+        raise
+    return result
@@ -0,0 +1,299 @@
+import glob
+import io
+import os
+import pickle
+import queue
+import random
+import threading
+
+import numpy as np
+import tqdm
+
+import internals.config as conf
+from internals.atomic_write import atomic_write
+
+CHECKPOINT_FOLDER_NAME = "checkpoint"
+LOG_CHUNK_PREFIX = "tells_"
+SNAPSHOT_PREFIX = "snapshot_"
+# Keys of the objects of a snapshot that are pickled on their own, so that they can also be saved as they are
+ARCHIVE_KEY = "archive"
+LINEAGES_KEY = "lineages"
+
+
+class _SnapshotPickler(pickle.Pickler):
+    """Pickler that replaces the given objects with a reference to their key."""
+
+    def __init__(self, file, shared):
+        super().__init__(file)
+        self.__shared = {id(obj): key for key, obj in shared.items()}
+
+    def persistent_id(self, obj):
+        return self.__shared.get(id(obj))
+
+
+class _SnapshotUnpickler(pickle.Unpickler):
+    """Unpickler that resolves the references of _SnapshotPickler to the given objects."""
+
+    def __init__(self, file, shared):
+        super().__init__(file)
+        self.__shared = shared
+
+    def persistent_load(self, pid):
+        return self.__shared[pid]
+
+
+class CheckpointLog:
+    """
+    Incremental checkpoint of a MAP-Elites search.
+
+    Every result told to the scheduler is recorded, and at each log step the recorded results are appended to the log
+    as a new chunk, a NPZ file with one array per field (solution, objective, measures, ...). Every snapshot_freq
+    iterations the whole scheduler (archive, emitters and lineage table) is saved as a snapshot, which replaces the
+    previous one together with the chunks before it. The state of the search at any logged iteration after the latest
+    snapshot is the snapshot plus the chunks after it, see load_checkpoint.
+
+    Serialization happens on the calling thread, so that the saved state is consistent, while all the writes to disk
+    are done by a background thread, so that the search loop never waits for I/O.
+    """
+
+    def __init__(self, folder, snapshot_freq=None, start_iteration=0):
+        self.folder = folder
+        self.snapshot_freq = snapshot_freq if snapshot_freq is not None else conf.CHECKPOINT_SNAPSHOT_FREQ
+        self.last_snapshot_iteration = start_iteration
+        self.__rows = []
+        self.__error = None
+        os.makedirs(self.folder, exist_ok=True)
+
+        self.__queue = queue.Queue()
+        self.__writer = threading.Thread(target=self.__write_loop, daemon=True)
+        self.__writer.start()
+
+    def record(self, solutions, objectives, measures, iterations, individual_numbers, failed, lineages):
+        """
+        Record the results told to the scheduler, they are written to the log at the next flush.
+
+        Args:
+            lineages (list): Lineage of each solution if it is the elite of its cell after being told, otherwise None
+        """
+        for i in range(len(solutions)):
+            self.__rows.append((
+                np.asarray(solutions[i]),
+                objectives[i],
+                np.asarray(measures[i]),
+                iterations[i],
+                individual_numbers[i],
+                failed[i],
+                lineages[i],
+            ))
+
+    def flush(self, iteration):
+        """Append the recorded results to the log, as the chunk of the given number of completed iterations."""
+        if len(self.__rows) == 0:
+            return
+        solutions, objectives, measures, iterations, individual_numbers, failed, lineages = zip(*self.__rows)
+        self.__rows = []
+        lineages = [[] if lineage is None else lineage for lineage in lineages]
+        chunk = {
+            "solution": np.stack(solutions),
+            "objective": np.asarray(objectives, dtype=np.float64),
+            "measures": np.stack(measures).astype(np.float64),
+            "iterations": np.asarray(iterations, dtype=np.float32),
+            "individual_numbers": np.asarray(individual_numbers, dtype=np.float32),
+            "failed": np.asarray(failed, dtype=np.float32),
+            # Lineages are stored flattened, a length of 0 means that the solution did not become an elite
+            "lineage_lengths": np.asarray([len(lineage) for lineage in lineages], dtype=np.int64),
+            "lineage_values": np.asarray([cell for lineage in lineages for cell in lineage], dtype=np.int64),
+        }
+        self.__queue.put((self.__save_chunk, (chunk_path(self.folder, iteration), chunk)))
+
+    def snapshot_due(self, iteration):
+        return iteration - self.last_snapshot_iteration >= self.snapshot_freq
+
+    def snapshot(self, iteration, scheduler, metrics, num_failed, search_state=None):
+        """
+        Save the whole state of the search, replacing the previous snapshot. The recorded results are flushed first, so
+        that the log chunks after the snapshot are exactly the ones to replay on top of it.
+
+        The archive and the lineage table are pickled on their own and the rest of the state refers to them, so that
+        the returned bytes can also be saved as the intermediate results without pickling them again.
+
+        Args:
+            search_state (dict): Any other state of the search loop needed to resume it
+
+        Returns:
+            dict: The pickled archive and lineage table, under ARCHIVE_KEY and LINEAGES_KEY
+        """
+        self.flush(iteration)
+        shared = {ARCHIVE_KEY: scheduler.archive, LINEAGES_KEY: scheduler.get_lineage_table()}
+        blobs = {key: pickle.dumps(obj) for key, obj in shared.items()}
+        buffer = io.BytesIO()
+        _SnapshotPickler(buffer, shared).dump({
+            "iteration": iteration,
+            "scheduler": scheduler,
+            "metrics": metrics,
+            "num_failed": num_failed,
+            "search_state": search_state,
+            # The genome operators use the global random generators
+            "random_state": random.getstate(),
+            "numpy_random_state": np.random.get_state(),
+        })
+        state = pickle.dumps({"state": buffer.getvalue(), **blobs})
+        self.last_snapshot_iteration = iteration
+        self.__queue.put((self.__save_snapshot, (iteration, state)))
+        return blobs
+
+    def submit(self, function, *args):
+        """Run a function on the background writer thread, e.g. to save other intermediate results."""
+        self.__queue.put((function, args))
+
+    def close(self):
+        """Wait for all the pending writes to be done."""
+        self.__queue.put(None)
+        self.__writer.join()
+        if self.__error is not None:
+            raise self.__error
+
+    def __write_loop(self):
+        while True:
+            task = self.__queue.get()
+            if task is None:
+                return
+            function, args = task
+            try:
+                function(*args)
+            except Exception as e:
+                tqdm.tqdm.write(f"Error while writing checkpoint: {e}")
+                self.__error = e
+
+    def __save_chunk(self, path, chunk):
+        atomic_write(path, lambda f: np.savez(f, **chunk))
+
+    def __save_snapshot(self, iteration, state):
+        atomic_write(snapshot_path(self.folder, iteration), lambda f: f.write(state))
+        # Compact: only the latest snapshot and the chunks after it are needed
+        for old_iteration in _list_iterations(self.folder, SNAPSHOT_PREFIX, ".pkl"):
+            if old_iteration != iteration:
+                os.remove(snapshot_path(self.folder, old_iteration))
+        for chunk_iteration in _list_iterations(self.folder, LOG_CHUNK_PREFIX, ".npz"):
+            if chunk_iteration <= iteration:
+                os.remove(chunk_path(self.folder, chunk_iteration))
+
+
+def chunk_path(folder, iteration):
+    return os.path.join(folder, f"{LOG_CHUNK_PREFIX}{iteration:06d}.npz")
+
+def snapshot_path(folder, iteration):
+    return os.path.join(folder, f"{SNAPSHOT_PREFIX}{iteration:06d}.pkl")
+
+def _list_iterations(folder, prefix, extension):
+    iterations = []
+    for path in glob.glob(os.path.join(folder, prefix + "*" + extension)):
+        name = os.path.basename(path)[len(prefix):-len(extension)]
+        if name.isdigit():
+            iterations.append(int(name))
+    return sorted(iterations)
+
+def get_elite_lineages(scheduler, solutions, measures):
+    """
+    Get the lineage of each solution that is the elite of its cell after being told to the scheduler, to be recorded.
+
+    Returns:
+        list: The lineage of each solution, or None if the solution is not an elite
+    """
+    lineage_table = scheduler.get_lineage_table()
+    lineages = []
+    for solution, measure in zip(solutions, measures):
+        occupied, elite = scheduler.archive.retrieve_single(measure)
+        if occupied and np.array_equal(elite["solution"], solution):
+            lineages.append(list(lineage_table[scheduler.archive.index_of_single(measure)]))
+        else:
+            lineages.append(None)
+    return lineages
+
+def __read_snapshot(path):
+    with open(path, "rb") as f:
+        blobs = pickle.load(f)
+    shared = {key: pickle.loads(blobs[key]) for key in (ARCHIVE_KEY, LINEAGES_KEY)}
+    return _SnapshotUnpickler(io.BytesIO(blobs["state"]), shared).load()
+
+def load_checkpoint(folder, scheduler=None, iteration=None):
+    """
+    Reconstruct the state of a search from its checkpoint log: the latest snapshot is loaded and the results logged
+    after it are added to its archive and lineage table.
+
+    Args:
+        folder (str): The folder of the checkpoint log
+        scheduler (SchedulerLineage): A new scheduler, used if there is no snapshot. In that case the archive and the
+            lineage table are rebuilt from the whole log, but the emitters keep their initial state
+        iteration (int): Reconstruct the state after this number of iterations instead of the latest one. It can't be
+            before the latest snapshot, since the chunks before it are removed
+
+    Returns:
+        dict: The state of the search, with the scheduler, the iteration, the metrics, the number of failed 
+            individuals and the search_state given to the snapshot. metrics and search_state are None if there is no 
+            snapshot
+    """
+    snapshots = [i for i in _list_iterations(folder, SNAPSHOT_PREFIX, ".pkl") if iteration is None or i <= iteration]
+    state = {"scheduler": scheduler, "iteration": 0, "metrics": None, "num_failed": 0, "search_state": None}
+    if len(snapshots) > 0:
+        state = __read_snapshot(snapshot_path(folder, snapshots[-1]))
+    elif scheduler is None:
+        raise FileNotFoundError(f"No snapshot in {folder} and no scheduler to rebuild the archive into")
+
+    scheduler = state["scheduler"]
+    lineage_table = scheduler.get_lineage_table()
+    for chunk_iteration in _list_iterations(folder, LOG_CHUNK_PREFIX, ".npz"):
+        if chunk_iteration <= state["iteration"] or (iteration is not None and chunk_iteration > iteration):
+            continue
+        with np.load(chunk_path(folder, chunk_iteration)) as chunk:
+            lineage_ends = np.cumsum(chunk["lineage_lengths"])
+            for i in range(len(chunk["objective"])):
+                if chunk["failed"][i] == 1:
+                    state["num_failed"] += 1
+                    continue
+                single_data = {name: chunk[name][i] for name in ("solution", "objective", "measures", "iterations", "individual_numbers", "failed")}
+                scheduler.archive.add_single(**single_data)
+                if scheduler._result_archive is not None:
+                    scheduler._result_archive.add_single(**single_data)
+                if chunk["lineage_lengths"][i] > 0:
+                    lineage = chunk["lineage_values"][lineage_ends[i] - chunk["lineage_lengths"][i]:lineage_ends[i]].tolist()
+                    lineage_table[lineage[-1]] = lineage
+        state["iteration"] = chunk_iteration
+
+    return state
+
+def clear_checkpoint(folder):
+    """
+    Remove the snapshots and the log chunks of a previous search from a checkpoint folder, so that a new search started
+    in it is never resumed from them or mixed with them.
+    """
+    if not os.path.isdir(folder):
+        return
+    for entry in os.scandir(folder):
+        if entry.name.startswith((SNAPSHOT_PREFIX, LOG_CHUNK_PREFIX, ".")):
+            os.remove(entry.path)
+
+def resume_checkpoint(folder, scheduler):
+    """
+    Load the state to resume a search from. If there is a snapshot, the search resumes from it and the log chunks after
+    it are removed, since they will be written again: the restored emitters and global random generators ask again for
+    the same solutions, whose evaluations can then be reused. Otherwise, the archive and the lineage table are rebuilt
+    from the whole log.
+
+    Args:
+        scheduler (SchedulerLineage): A new scheduler, used if there is no snapshot
+
+    Returns:
+        dict: The state of the search, as returned by load_checkpoint
+    """
+    snapshots = _list_iterations(folder, SNAPSHOT_PREFIX, ".pkl")
+    if len(snapshots) == 0:
+        return load_checkpoint(folder, scheduler)
+
+    for chunk_iteration in _list_iterations(folder, LOG_CHUNK_PREFIX, ".npz"):
+        if chunk_iteration > snapshots[-1]:
+            os.remove(chunk_path(folder, chunk_iteration))
+    state = load_checkpoint(folder, scheduler, snapshots[-1])
+    random.setstate(state["random_state"])
+    np.random.set_state(state["numpy_random_state"])
+    return state
@@ -6,6 +6,34 @@ NUM_PARALLEL_SIMULATIONS = 5 # Numer of matches that are parallely started when
 NUM_MATCHES_PER_SIMULATION = 1 # Number of matches that are played in a single simulation. If we start multiple parallel simulation, each is gonna play this many matches
 # Note that the framework does not distinguish the end of one match from another in the "position" file extracted, so NUM_MATCHES_PER_SIMULATION should be set to 1 to avoid problems
 
+# If set to True, the results of the evaluations are cached on disk, keyed by the map matrix of the phenotype, and
+# phenotypes with the same map are not simulated again. The cache is shared by all workers and runs. Since the
+# simulations are noisy, a repeated map then keeps the results of its first evaluation instead of new ones.
+EVALUATION_CACHE = False
+EVALUATION_CACHE_MAX_SIZE_MB = 1024 # Least recently used entries are removed when the cache grows larger than this
+
+# Backend that runs the simulations. See constants.py for possible values. The synthetic backend writes realistic exports
+# without running the game, to test and profile the rest of the pipeline on any machine.
+SIMULATION_BACKEND = constants.UNITY_BACKEND_NAME
+SYNTHETIC_POSITIONS_PER_SECOND = 2 # Positions logged for each bot per second of game, as done by the game
+SYNTHETIC_KILLS_PER_MINUTE = 6 # Average number of kills per minute of game, of both bots
+
+# The time and memory of each stage of the evaluations are logged with the metrics. Memory is the growth of the resident
+# set size during each stage. If set to True, it's the peak of the memory allocated by Python instead, which is exact
+# but slows down the evaluations.
+PROFILE_TRACE_MEMORY = False
+
+# If set to True, importing internals.visibility makes numba prefer the OpenMP and workqueue threading layers to TBB,
+# which hangs the process at exit when started by a Dask worker thread. The priority of the layers is global, so it
+# applies to all the numba code of the process. It is not changed if the layer was already chosen, with the
+# NUMBA_THREADING_LAYER or NUMBA_THREADING_LAYER_PRIORITY environment variables or by setting numba.config.THREADING_LAYER
+# before the import.
+AVOID_TBB_THREADING_LAYER = True
+
+# If set to True, the topology graph and the visibility matrix computed when evaluating each individual are saved next
+# to its results, and the analysis tools load them instead of computing them again from the phenotype.
+SAVE_MAP_INTERMEDIATES = True
+
 """ Game variables """
 GAME_LENGTH = 600
 
@@ -28,6 +56,10 @@ N_EMITTERS = 10
 
 NUMBER_OF_INITAL_SOLUTIONS = 20
 
+# If set to True, the search is steady-state: results are told to the archive as soon as they arrive and emitters are
+# asked for new solutions as soon as their batch is evaluated, instead of waiting for the whole iteration.
+ASYNC_SEARCH = False
+
 MEASURES_BINS_NUMBER = [10,10]
 MEASURES_RANGES = [(0,1),(0,1)]
 
@@ -40,6 +72,15 @@ POINT_STANDARD_CROSSOVER_CHANCE = 0.3
 POINT_AD_STANDARD_CROSSOVER_CHANCE = 0.3
 CMA_ME_SIGMA0 = 0.01
 
+# Timeout of the SMT solver for each genome, in milliseconds. Genomes that can't be solved within it fail
+SMT_SOLVER_TIMEOUT = 600
+# If set to True, each thread keeps a SMT solver with the constraints shared by all genomes loaded, and solves genomes
+# incrementally. The rooms that a genome shares with a recently solved one, usually its parent, are first kept where
+# they were placed, which is much faster if it succeeds, before searching the whole layout. The layout of a genome then
+# depends on which genomes the worker building it solved before, so the phenotypes, and the runs, can't be reproduced.
+SMT_INCREMENTAL_SOLVER = False
+SMT_HINT_TIMEOUT = 50 # Timeout of the check that keeps the rooms of the parent in place, in milliseconds
+
 # These names are used to generate the folder name and the image captions
 OBJECTIVE_NAME = "entropy"
 MEASURES_NAMES = ["area", "maxSymmetry"]
@@ -54,6 +95,12 @@ EXPERIMENT_NAME = "Fin"
 
 """ Miscellaneous variables """
 SAVE_INTERMEDIATE_RESULTS = True
+# If set to True, the results told to the archive are appended to a checkpoint log at every log step, and the whole 
+# scheduler is saved every CHECKPOINT_SNAPSHOT_FREQ iterations, replacing the log before it. All the writes are done by
+# a background thread, and the intermediate results above are saved, and their plots drawn, only with the snapshots.
+CHECKPOINT = True
+# A resumed search restarts from the latest snapshot, so up to this many iterations are evaluated again
+CHECKPOINT_SNAPSHOT_FREQ = 50
 
 def folder_name(test = False):
     if test:
@@ -7,6 +7,9 @@ GAME_DATA_FOLDER = os.path.join (os.getcwd(), "Data")
 MAP_ELITES_OUTPUT_FOLDER = os.path.join (GAME_DATA_FOLDER, "MapElitesOutput")
 ARCHIVE_ANALYSIS_OUTPUT_FOLDER = os.path.join (GAME_DATA_FOLDER, "ArchiveAnalysis")
 ANALYSIS_OUTPUT_FOLDER = os.path.join (GAME_DATA_FOLDER, "AnalysisOutput")
+EVALUATION_CACHE_FOLDER = os.path.join (GAME_DATA_FOLDER, "EvaluationCache")
+BENCHMARK_OUTPUT_FOLDER = os.path.join (GAME_DATA_FOLDER, "Benchmarks")
+RESULTS_STORE_NAME = "Results" # Folder of the results store, inside the export folder of each experiment
 
 """ Genome names """
 ALL_BLACK_NAME = "AB"
@@ -17,6 +20,12 @@ POINT_AD_NAME = "PointAD"
 
 GENOME_NAMES = [ALL_BLACK_NAME, GRID_GRAPH_NAME, POINT_NAME, POINT_AD_NAME, SMT_NAME]
     
+""" Simulation backend names """
+UNITY_BACKEND_NAME = "Unity"
+SYNTHETIC_BACKEND_NAME = "Synthetic"
+
+SIMULATION_BACKEND_NAMES = [UNITY_BACKEND_NAME, SYNTHETIC_BACKEND_NAME]
+
 """ Archive names """
 SLIDING_BOUNDARIES_ARCHIVE_NAME = "SB"
 GRID_ARCHIVE_NAME = "Grid"
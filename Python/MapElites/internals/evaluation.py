@@ -1,16 +1,31 @@
+import hashlib
 import os
 from pathlib import Path
+import pickle
 import random
-import subprocess
+import shutil
 from math import log2
 
 import numpy
 import pandas
 import tqdm
 
+from internals.atomic_write import atomic_write
 from internals.constants import GAME_DATA_FOLDER,EXPERIMENT_RUNNER_PATH, EXPERIMENT_RUNNER_FILE
-from internals.config import NUM_PARALLEL_SIMULATIONS, NUM_MATCHES_PER_SIMULATION
-from internals.result_extractor import extract_match_data
+from internals.config import NUM_PARALLEL_SIMULATIONS, NUM_MATCHES_PER_SIMULATION, EVALUATION_CACHE, EVALUATION_CACHE_MAX_SIZE_MB, SIMULATION_BACKEND, \
+    PROFILE_TRACE_MEMORY, SAVE_MAP_INTERMEDIATES
+from internals.evaluation_cache import EvaluationCache
+from internals.genomes import solution_to_phenotype
+from internals.map_intermediates import intermediates_path
+from internals.profiling import StageProfile
+from internals.result_extractor import extract_match_data, BOT_NUM
+from internals.results_store import append_results, read_results
+from internals.simulation import get_simulation_backend
+
+# Cache of the evaluations, created the first time it's needed in each process
+__evaluation_cache = None
+# Backend running the simulations, created the first time it's needed in each process
+__simulation_backend = None
 
 
 
@@ -24,7 +39,8 @@ def evaluate(
         folder_name='genome_evolution', 
         experiment_name=None, 
         num_parallel_simulations = NUM_PARALLEL_SIMULATIONS, 
-        num_matches_per_simulation = NUM_MATCHES_PER_SIMULATION):
+        num_matches_per_simulation = NUM_MATCHES_PER_SIMULATION,
+        skip_existing = False):
     """
     Evaluate the given phenotype by running simulations
 
@@ -37,36 +53,221 @@ def evaluate(
         game_length (int): The length of the game in seconds
         folder_name (str): The name of the folder to store the results in
         experiment_name (str): The name of the experiment. Defaults to iteration and individual_batch_num. It's used to name the genome file and the simulation results.
+        skip_existing (bool): Whether to reuse the results of an experiment with the same name and phenotype, if already completed (e.g. when resuming a search)
     
     Returns:
-        pandas.DataFrame: The dataset with the results of the simulation
+        tuple: (dataset, failed, profile), the dataset with the results of the simulation, whether the evaluation 
+            failed and the StageProfile with the time and memory of each stage of the evaluation
     """
+    profile = StageProfile(PROFILE_TRACE_MEMORY)
+    dataset, failed = __evaluate(phenotype, iteration, individual_batch_num, bot1_data, bot2_data, game_length, folder_name, 
+                                 experiment_name, num_parallel_simulations, num_matches_per_simulation, skip_existing, profile)
+    return dataset, failed, profile
+
+
+def evaluate_solution(
+        solution,
+        representation,
+        iteration,
+        individual_batch_num,
+        bot1_data,
+        bot2_data,
+        game_length=120,
+        folder_name='genome_evolution',
+        experiment_name=None,
+        num_parallel_simulations = NUM_PARALLEL_SIMULATIONS,
+        num_matches_per_simulation = NUM_MATCHES_PER_SIMULATION,
+        skip_existing = False):
+    """
+    Evaluate a solution returned by the scheduler. Its phenotype is built here, so that it's built by the worker running
+    the evaluation instead of the driver. Solutions whose phenotype can't be built (e.g. unsolvable SMT genomes) fail.
+
+    Args:
+        solution (array-like): The solution to evaluate
+        representation (str): The name of the map representation of the solution. See constants.py for possible values
+        The other arguments are the same as evaluate
+
+    Returns:
+        tuple: (dataset, failed, profile), as returned by evaluate
+    """
+    profile = StageProfile(PROFILE_TRACE_MEMORY)
+    experiment_name = __experiment_name(experiment_name, iteration, individual_batch_num)
+    digest = solution_digest(solution)
+    if skip_existing:
+        # Matched on the solution, so that the phenotype isn't built again, and a phenotype built differently (e.g. by
+        # the incremental SMT solver) doesn't discard the results
+        with profile.stage("completed_read"):
+            dataset = __read_completed_evaluation(folder_name, experiment_name, iteration, individual_batch_num, digest=digest)
+        if dataset is not None:
+            return dataset, False, profile
+
+    with profile.stage("phenotype"):
+        phenotype = solution_to_phenotype(representation, solution)
+    dataset, failed = __evaluate(phenotype, iteration, individual_batch_num, bot1_data, bot2_data, game_length, folder_name,
+                                 experiment_name, num_parallel_simulations, num_matches_per_simulation, False, profile)
+    if not failed:
+        # Written last, so that it exists only if the evaluation was completed
+        atomic_write(__solution_digest_path(folder_name, experiment_name), lambda f: f.write(digest), mode='w')
+    return dataset, failed, profile
+
 
+def solution_digest(solution):
+    """Returns a digest of a solution returned by the scheduler, stored with its results to recognize it when resuming"""
+    return hashlib.sha256(numpy.ascontiguousarray(solution, dtype=numpy.float64).tobytes()).hexdigest()
+
+
+def __experiment_name(experiment_name, iteration, individual_batch_num):
+    return experiment_name if experiment_name is not None else str(iteration) + '_' + str(individual_batch_num)
+
+
+def __solution_digest_path(folder_name, experiment_name):
+    return os.path.join(GAME_DATA_FOLDER, 'Export', folder_name, 'solution_' + experiment_name + '.sha256')
+
+
+def __evaluate(phenotype, iteration, individual_batch_num, bot1_data, bot2_data, game_length, folder_name, experiment_name, 
+               num_parallel_simulations, num_matches_per_simulation, skip_existing, profile):
     if phenotype is None:
         tqdm.tqdm.write("Phenotype is None, skipping evaluation")
         return __blank_dataset(), True
 
-    if experiment_name is None :
-        experiment_name = str(iteration) + '_' + str(individual_batch_num)
+    experiment_name = __experiment_name(experiment_name, iteration, individual_batch_num)
     complete_name = os.path.join(folder_name, experiment_name)
 
+    if skip_existing:
+        with profile.stage("completed_read"):
+            dataset = __read_completed_evaluation(folder_name, experiment_name, iteration, individual_batch_num, phenotype=phenotype)
+        if dataset is not None:
+            return dataset, False
+
     # Export genome to file
-    phenotype.write_to_file(os.path.join(GAME_DATA_FOLDER, 'Import', 'Genomes', complete_name + '.json'))
+    with profile.stage("genome_write"):
+        phenotype.write_to_file(os.path.join(GAME_DATA_FOLDER, 'Import', 'Genomes', complete_name + '.json'))
+
+    if not EVALUATION_CACHE:
+        return __run_evaluation(phenotype, folder_name, experiment_name, iteration, individual_batch_num, bot1_data, bot2_data, game_length, num_parallel_simulations, num_matches_per_simulation, profile)
+
+    # Reuse the results of a previous evaluation of the same map, if any
+    with profile.stage("cache_read"):
+        cache = get_evaluation_cache()
+        key = cache.key(phenotype, bot1_data, bot2_data, game_length, num_parallel_simulations, num_matches_per_simulation, SIMULATION_BACKEND)
+        entry = cache.get(key)
+        if entry is not None and not __restore_cached_evaluation(entry, phenotype, folder_name, experiment_name, iteration, individual_batch_num):
+            # The exports of the cached evaluation are gone, it is simulated again and replaces the entry
+            cache.mark_miss()
+            entry = None
+    if entry is not None:
+        return entry["dataset"], False
+
+    dataset, failed = __run_evaluation(phenotype, folder_name, experiment_name, iteration, individual_batch_num, bot1_data, bot2_data, game_length, num_parallel_simulations, num_matches_per_simulation, profile)
+    if not failed:
+        with profile.stage("cache_write"):
+            cache.put(key, {
+                "dataset": dataset,
+                "folder_name": folder_name,
+                "experiment_name": experiment_name,
+                "num_simulations": num_parallel_simulations,
+            })
+    return dataset, failed
+
+
+def get_evaluation_cache():
+    """Returns the evaluation cache of this process"""
+    global __evaluation_cache
+    if __evaluation_cache is None:
+        __evaluation_cache = EvaluationCache(max_size_bytes=EVALUATION_CACHE_MAX_SIZE_MB * 1024 * 1024)
+    return __evaluation_cache
 
 
-    return __run_evaluation(phenotype, folder_name, experiment_name, bot1_data, bot2_data, game_length, num_parallel_simulations, num_matches_per_simulation)
+def get_backend():
+    """Returns the simulation backend of this process"""
+    global __simulation_backend
+    if __simulation_backend is None:
+        __simulation_backend = get_simulation_backend(SIMULATION_BACKEND)
+    return __simulation_backend
+
+
+def __restore_cached_evaluation(entry, phenotype, folder_name, experiment_name, iteration, individual_number):
+    """
+    Write the files of a cached evaluation under the new experiment name, as if the simulations had been run again.
+    The raw exports of the game and the map intermediates are copied from the original experiment, so that the
+    individual can still be analyzed later.
+
+    Returns:
+        bool: True if the evaluation was restored, False if any file of the original experiment no longer exists, in
+            which case the evaluation must be run again
+    """
+    source_dir = os.path.join(GAME_DATA_FOLDER, 'Export', entry["folder_name"])
+    export_dir = os.path.join(GAME_DATA_FOLDER, 'Export', folder_name)
+    source_name = entry["experiment_name"]
+    files = []
+    for i in range(entry["num_simulations"]):
+        file_names = ['final_results_{}_' + str(i) + '.json']
+        if i == 0:
+            # Only the first simulation exports the map
+            file_names.append('map_{}_' + str(i) + '.txt')
+        for bot_num in range(1, BOT_NUM + 1):
+            file_names.append('position_{}_' + str(i) + '_bot' + str(bot_num) + '.csv')
+            file_names.append('death_positions_{}_' + str(i) + '_bot' + str(bot_num) + '.csv')
+        for file_name in file_names:
+            files.append((os.path.join(source_dir, file_name.format(source_name)), os.path.join(export_dir, file_name.format(experiment_name))))
+    if SAVE_MAP_INTERMEDIATES:
+        files.append((intermediates_path(entry["folder_name"], source_name), intermediates_path(folder_name, experiment_name)))
+
+    if not all(os.path.exists(source) for source, _ in files):
+        return False
+    for source, destination in files:
+        try:
+            shutil.copyfile(source, destination)
+        except shutil.SameFileError:
+            pass
+        except FileNotFoundError:
+            # Removed after it was checked
+            return False
+
+    append_results(folder_name, iteration, individual_number, entry["dataset"])
+    atomic_write(os.path.join(export_dir, 'phenotype_' + experiment_name + '.pkl'), lambda f: pickle.dump(phenotype, f))
+    return True
+
+
+def __read_completed_evaluation(folder_name, experiment_name, iteration, individual_number, phenotype=None, digest=None):
+    """
+    Read the results of an experiment that was already completed with the same solution, if its digest is given, or
+    otherwise with the same phenotype.
+
+    Returns:
+        pandas.DataFrame: The dataset of the experiment, or None if it was not completed or its solution or phenotype
+            is different
+    """
+    export_dir = os.path.join(GAME_DATA_FOLDER, 'Export', folder_name)
+    try:
+        if digest is not None:
+            with open(__solution_digest_path(folder_name, experiment_name), 'r') as digest_file:
+                if digest_file.read() != digest:
+                    return None
+        else:
+            # The phenotype is written after the results are stored, so both exist only if the evaluation was completed
+            with open(os.path.join(export_dir, 'phenotype_' + experiment_name + '.pkl'), 'rb') as phenotype_file:
+                if pickle.load(phenotype_file) != phenotype:
+                    return None
+        return read_results(folder_name, iteration, individual_number)
+    except (OSError, EOFError, pickle.UnpicklingError, ValueError):
+        return None
 
 
 def __run_evaluation(
         phenotype, 
         folder_name, 
         experiment_name, 
+        iteration, 
+        individual_number, 
         bot1_data, 
         bot2_data, 
         game_length, 
         num_parallel_simulations = NUM_PARALLEL_SIMULATIONS,
-        num_matches_per_simulation = NUM_MATCHES_PER_SIMULATION
+        num_matches_per_simulation = NUM_MATCHES_PER_SIMULATION,
+        profile = None
     ):
+    profile = profile if profile is not None else StageProfile()
     rel_std_dev_entropy = 100
     dataset = None
     repeat_count = 0
@@ -74,24 +275,26 @@ def __run_evaluation(
         if dataset is not None:
             tqdm.tqdm.write("Had to repeat experiment because std dev of entropy is " + str(rel_std_dev_entropy))
         # run the simulation with a proper experiment name (generation_individual)
-        processes = []
-        received_error = False
-        for i in range(num_parallel_simulations):
-            #processes.append(__run_simulation(folder_name, experiment_name, experiment_name + '.json', game_length,
-            #                                  repeat_count * num_parallel_simulations + i,
-            #                                  num_matches_per_simulation, bot1_data, bot2_data, False, i == 0))
-            elem = __run_simulation(folder_name, experiment_name, experiment_name + '.json', game_length,
-                                              repeat_count * num_parallel_simulations + i,
-                                              num_matches_per_simulation, bot1_data, bot2_data, False, i == 0)
-            try:
-                received_error = received_error or (elem.wait(timeout=(game_length+10)*num_matches_per_simulation) != 0) # TODO: serially waits for each process to finish, want to do it parallely
-                elem.kill()  
-            except subprocess.TimeoutExpired as e:
-                elem.kill()  
-        # Wait for a timeout for each process before killing all processes
-        #for elem in processes:
-
+        # Start all the simulations first, so that they actually run in parallel
+        backend = get_backend()
+        with profile.stage("simulation"):
+            simulations = []
+            for i in range(num_parallel_simulations):
+                simulations.append(backend.start(folder_name, experiment_name, experiment_name + '.json', game_length,
+                                                 repeat_count * num_parallel_simulations + i,
+                                                 num_matches_per_simulation, bot1_data, bot2_data, False, i == 0))
 
+            # Wait for all of them with a single shared deadline
+            return_codes = backend.wait(simulations, timeout=(game_length+10)*num_matches_per_simulation)
+        received_error = False
+        for i, return_code in enumerate(return_codes):
+            if return_code is None:
+                # Its exports are incomplete, or left by a previous attempt of the same experiment
+                tqdm.tqdm.write(f"Simulation {i} of {experiment_name} timed out and was killed")
+                received_error = True
+            elif return_code != 0:
+                tqdm.tqdm.write(f"Simulation {i} of {experiment_name} exited with code {return_code}")
+                received_error = True
 
         if received_error:
             tqdm.tqdm.write(f"Error in simulation, skipping evaluation of {experiment_name}")
@@ -103,7 +306,10 @@ def __run_evaluation(
             phenotype,
             folder_name,
             experiment_name,
-            repeat_count * num_parallel_simulations
+            iteration,
+            individual_number,
+            repeat_count * num_parallel_simulations,
+            profile
         )
         if dataset is None:
             return __blank_dataset(), True
@@ -114,55 +320,6 @@ def __run_evaluation(
     return dataset, False
 
 
-def __run_simulation(folder_name, experiment_name, map_genome_name, game_length, experiment_part, num_simulations, bot1_data, bot2_data, log=False, save_map=False):
-    """
-    Run a simulation with the given parameters
-    
-    Args:
-        folder_name (str): The folder name to store the results in
-        experiment_name (str): The name of the experiment
-        map_genome_name (str): The name of the map genome
-        game_length (int): The length of the game in seconds
-        experiment_part (int): The part of the experiment
-        num_simulations (int): The number of simulations to run
-        bot1_data (dict): The data of the first bot
-        bot2_data (dict): The data of the second bot
-        log (bool): Whether to log the results
-        save_map (bool): Whether to save the map
-    """
-    cmd = [os.path.join(EXPERIMENT_RUNNER_PATH, EXPERIMENT_RUNNER_FILE),
-           "-experimentType=BOT_GENOME_TESTER",
-           "-batchmode",
-           #"-nographics",
-           "-gameLength=" + str(game_length),
-           "-dataFolderPath=" + GAME_DATA_FOLDER,
-           "-folderName=" + folder_name,
-           "-experimentName=" + experiment_name + "_" + str(experiment_part),
-           "-numExperiments=" + str(num_simulations),
-           "-areaFilename=" + map_genome_name,
-           "-bot1file=" + bot1_data["file"],
-           "-bot1skill=" + bot1_data["skill"],
-           "-bot2file=" + bot2_data["file"],
-           "-bot2skill=" + bot2_data["skill"],
-           "-logPositions",
-           "-logDeathPositions"
-           ]
-    if save_map:
-        cmd.append("-saveMap"),
-
-    if log:
-        cmd.append("-logFile")
-        cmd.append(
-            os.path.join(GAME_DATA_FOLDER, "Log", folder_name, experiment_name + "_" + str(experiment_part) + ".txt"))
-    else:
-        cmd.append("-nolog")
-    # Run the process with a timeout
-    rtn = subprocess.Popen(cmd,
-                           cwd=EXPERIMENT_RUNNER_PATH,
-                           stdout=subprocess.DEVNULL,
-                           bufsize=0)
-    return rtn
-
 def __blank_dataset():
     """Create a blank dataset with all values set to 0"""
 
@@ -0,0 +1,198 @@
+import hashlib
+import json
+import os
+import pickle
+import socket
+
+import numpy
+
+from internals.atomic_write import atomic_write
+from internals.constants import EVALUATION_CACHE_FOLDER, UNITY_BACKEND_NAME
+
+STATS_FOLDER_NAME = "stats"
+# Fraction of max_size_bytes the cache is reduced to when it is evicted, so that it is not scanned again at every write
+EVICTION_TARGET = 0.9
+
+
+class EvaluationCache:
+    """
+    Persistent cache of evaluation results, stored on disk so that it is shared by all the Dask workers and across runs.
+
+    Entries are keyed by a hash of the map matrix of the phenotype together with everything else that changes the
+    outcome of the simulations (bots, game length, number of simulations). Each entry is a pickle file, written
+    atomically so that concurrent workers never read a partial entry. The modification time of an entry is updated on
+    every hit, and when the total size of the cache exceeds max_size_bytes the least recently used entries are evicted.
+    Each process keeps a running total of the size of the cache, which is only measured again by scanning the cache
+    when the total exceeds max_size_bytes. Entries written by other processes in the meantime are not counted, so the
+    cache can temporarily grow larger than max_size_bytes.
+
+    Hits and misses are counted in a small file per process, so that statistics can be aggregated from any process.
+    """
+
+    def __init__(self, folder=EVALUATION_CACHE_FOLDER, max_size_bytes=1024 * 1024 * 1024):
+        self.folder = folder
+        self.max_size_bytes = max_size_bytes
+        self.hits = 0
+        self.misses = 0
+        # Measured by the first write
+        self.__size_bytes = None
+        os.makedirs(os.path.join(self.folder, STATS_FOLDER_NAME), exist_ok=True)
+        self.__stats_file = os.path.join(self.folder, STATS_FOLDER_NAME, f"{socket.gethostname()}_{os.getpid()}.json")
+
+    @staticmethod
+    def key(phenotype, bot1_data, bot2_data, game_length, num_parallel_simulations, num_matches_per_simulation, backend_name=UNITY_BACKEND_NAME):
+        """
+        Compute the key of an evaluation.
+
+        Args:
+            phenotype (Phenotype): The phenotype to evaluate
+            bot1_data (dict): The data of the first bot
+            bot2_data (dict): The data of the second bot
+            game_length (int): The length of the game in seconds
+            num_parallel_simulations (int): The number of parallel simulations
+            num_matches_per_simulation (int): The number of matches per simulation
+            backend_name (str): The name of the simulation backend
+
+        Returns:
+            str: The hexadecimal digest identifying the evaluation
+        """
+        map_matrix = numpy.ascontiguousarray(phenotype.map_matrix(), dtype=numpy.int8)
+        h = hashlib.sha256()
+        h.update(str(map_matrix.shape).encode())
+        h.update(map_matrix.tobytes())
+        h.update(json.dumps([
+            phenotype.mapScale,
+            bot1_data,
+            bot2_data,
+            game_length,
+            num_parallel_simulations,
+            num_matches_per_simulation,
+        ], sort_keys=True).encode())
+        # Results of other backends must never be mixed with the ones of the game, whose keys stay the same as before
+        if backend_name != UNITY_BACKEND_NAME:
+            h.update(backend_name.encode())
+        return h.hexdigest()
+
+    def get(self, key):
+        """
+        Get the entry with the given key.
+
+        Returns:
+            dict: The stored entry, or None if the key is not in the cache
+        """
+        path = self.__entry_path(key)
+        try:
+            with open(path, "rb") as f:
+                entry = pickle.load(f)
+            # Mark the entry as recently used
+            os.utime(path)
+        except (FileNotFoundError, EOFError, pickle.UnpicklingError):
+            # Missing, or evicted by another process while being read
+            self.misses += 1
+            self.__write_stats()
+            return None
+        self.hits += 1
+        self.__write_stats()
+        return entry
+
+    def put(self, key, entry):
+        """Store an entry in the cache, evicting the least recently used entries if the cache grows too large."""
+        if self.__size_bytes is None:
+            self.__size_bytes = self.__scan()[1]
+        path = self.__entry_path(key)
+        try:
+            replaced_size = os.stat(path).st_size
+        except FileNotFoundError:
+            replaced_size = 0
+        def write_entry(f):
+            pickle.dump(entry, f)
+            return f.tell()
+        entry_size = atomic_write(path, write_entry)
+        self.__size_bytes += entry_size - replaced_size
+        if self.__size_bytes > self.max_size_bytes:
+            self.evict()
+
+    def mark_miss(self):
+        """Count the last hit as a miss, if its entry could not be used."""
+        self.hits -= 1
+        self.misses += 1
+        self.__write_stats()
+
+    def evict(self):
+        """
+        Remove the least recently used entries until the cache is within EVICTION_TARGET of max_size_bytes. The size
+        of the cache is measured by scanning it, as other processes may have added or removed entries.
+        """
+        entries, total_size = self.__scan()
+        entries.sort()
+        for _, size, path in entries:
+            if total_size <= self.max_size_bytes * EVICTION_TARGET:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                # Already evicted by another process
+                pass
+            total_size -= size
+        self.__size_bytes = total_size
+
+    def stats(self):
+        """
+        Aggregate the statistics of all the processes that used the cache.
+
+        Returns:
+            dict: Number of hits, misses, hit rate, number of entries and size in bytes of the cache
+        """
+        hits, misses = 0, 0
+        for e in os.scandir(os.path.join(self.folder, STATS_FOLDER_NAME)):
+            try:
+                with open(e.path, "r") as f:
+                    process_stats = json.load(f)
+            except (FileNotFoundError, json.JSONDecodeError):
+                continue
+            hits += process_stats["hits"]
+            misses += process_stats["misses"]
+
+        entries, size = self.__scan()
+
+        return {
+            "hits": hits,
+            "misses": misses,
+            "hit_rate": hits / (hits + misses) if hits + misses > 0 else 0,
+            "entries": len(entries),
+            "size_bytes": size,
+        }
+
+    def reset_stats(self):
+        """Delete the statistics of all the processes, e.g. at the beginning of a new run."""
+        for e in os.scandir(os.path.join(self.folder, STATS_FOLDER_NAME)):
+            try:
+                os.remove(e.path)
+            except FileNotFoundError:
+                pass
+        self.hits = 0
+        self.misses = 0
+
+    def __scan(self):
+        """
+        Returns:
+            tuple: (entries, total_size) where entries is a list of (mtime, size, path) of the entries of the cache
+        """
+        entries = []
+        total_size = 0
+        for e in os.scandir(self.folder):
+            if not e.name.endswith(".pkl"):
+                continue
+            try:
+                stat = e.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, e.path))
+            total_size += stat.st_size
+        return entries, total_size
+
+    def __entry_path(self, key):
+        return os.path.join(self.folder, key + ".pkl")
+
+    def __write_stats(self):
+        atomic_write(self.__stats_file, lambda f: json.dump({"hits": self.hits, "misses": self.misses}, f), mode="w")
@@ -0,0 +1,26 @@
+from math import prod
+
+
+def array_as_record(layout, array):
+    """
+    Split the array of a genome into the fields of its ARRAY_LAYOUT, nested as lists like the fields of a record
+    converted with tolist(), so that array_as_genome and records_as_genomes build genomes in the same way.
+
+    Args:
+        layout (list): The ARRAY_LAYOUT of the genome class, as (name, shape) pairs
+        array (array-like): The array of the genome
+
+    Returns:
+        dict: The value of each field, as nested lists or as a single value if its shape is ()
+    """
+    values = list(array)
+    record = {}
+    index = 0
+    for name, shape in layout:
+        size = prod(shape)
+        field = values[index:index + size]
+        index += size
+        for dim in reversed(shape[1:]):
+            field = [field[i:i + dim] for i in range(0, len(field), dim)]
+        record[name] = field if len(shape) > 0 else field[0]
+    return record
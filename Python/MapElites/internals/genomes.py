@@ -0,0 +1,92 @@
+import functools
+
+import numpy as np
+
+import internals.constants as constants
+from internals.ab_genome.ab_genome import ABGenome
+from internals.graph_genome.gg_genome import GraphGenome
+from internals.smt_genome.smt_genome import SMTGenome
+from internals.point_genome.point_genome import PointGenome
+from internals.point_ad_genome.point_ad_genome import PointAdGenome
+
+GENOME_CLASSES = {
+    constants.ALL_BLACK_NAME: ABGenome,
+    constants.GRID_GRAPH_NAME: GraphGenome,
+    constants.SMT_NAME: SMTGenome,
+    constants.POINT_NAME: PointGenome,
+    constants.POINT_AD_NAME: PointAdGenome,
+}
+
+
+@functools.lru_cache(maxsize=None)
+def record_dtype(genome_class, base_dtype=np.int64):
+    """Get the dtype of the records of a genome type, with one field for each field of its ARRAY_LAYOUT."""
+    return np.dtype([(name, base_dtype, shape) for name, shape in genome_class.ARRAY_LAYOUT])
+
+
+def solutions_as_records(genome_class, solutions, dtype=np.int64):
+    """
+    Decode a batch of solutions as a record array, with one record per solution and one field per part of the genome
+    (e.g. the rooms of an AB genome as a (AB_NUM_ROOMS, 3) array). Records are a view of the solutions, which are only
+    copied if they must be converted to the given dtype. Converting to int truncates the values as int() does, which
+    is how solutions are decoded before building their phenotypes.
+
+    Args:
+        genome_class (type): The class of the genomes
+        solutions (array-like): (batch_size, solution_dim) array of solutions
+        dtype (numpy.dtype): The dtype of the values of the records
+
+    Returns:
+        numpy.ndarray: (batch_size,) record array, see records_as_genomes
+    """
+    solutions = np.ascontiguousarray(solutions, dtype=dtype)
+    records_dtype = record_dtype(genome_class, solutions.dtype)
+    if solutions.ndim != 2 or solutions.shape[1] * solutions.itemsize != records_dtype.itemsize:
+        raise ValueError(
+            f"Expected solutions of {records_dtype.itemsize // solutions.itemsize} values, but they have shape {solutions.shape}.")
+    return solutions.view(records_dtype)[:, 0]
+
+
+def records_as_genomes(genome_class, records):
+    """
+    Build the genomes of a batch of records. Each field is converted to lists once for the whole batch, and each genome
+    is built from its lists by genome_class.record_as_genome, which still creates one object per room, line or corridor
+    of the genome. Only the int cast and the split of the solutions into fields are done for the whole batch.
+
+    Returns:
+        list: The genomes, one for each record
+    """
+    names = [name for name, _ in genome_class.ARRAY_LAYOUT]
+    fields = [records[name].tolist() for name in names]
+    return [genome_class.record_as_genome(dict(zip(names, values))) for values in zip(*fields)]
+
+
+def genomes_as_solutions(genomes, dtype=np.float64):
+    """
+    Encode a list of genomes as a (batch_size, solution_dim) array of solutions, as expected by the archive. Each genome
+    is encoded by its to_array, the arrays are only stacked together.
+    """
+    return np.array([genome.to_array() for genome in genomes], dtype=dtype)
+
+
+def solution_to_phenotype(representation, solution):
+    """
+    Converts a solution returned by the scheduler to its phenotype.
+
+    SMT genomes may not be solvable, in that case their phenotype is None and the evaluation will report them as failed.
+
+    Args:
+        representation (str): The name of the map representation. See constants.py for possible values
+        solution (array-like): The solution, as returned by the scheduler
+
+    Returns:
+        Phenotype: The phenotype of the solution, or None if it can't be built
+    """
+    genome_class = GENOME_CLASSES[representation]
+    genome = records_as_genomes(genome_class, solutions_as_records(genome_class, [solution]))[0]
+    if representation != constants.SMT_NAME:
+        return genome.phenotype()
+    try:
+        return genome.phenotype()
+    except Exception:
+        return None
@@ -132,7 +132,8 @@ import numpy as np
 import igraph as ig
 import pyvoronoi
 from matplotlib import cm
-from shapely import Polygon, Point, distance, transform
+from scipy.spatial import cKDTree
+from shapely import Polygon, STRtree, contains_xy, points, transform
 
 
 # Note that vertices of polygons have their x and y coordinates inverted with respect to the map matrix
@@ -325,27 +326,35 @@ def filter_vornoi_edges(pv, outer_shell, obstacles):
     vertices = pv.GetVertices()
 
     # Filter out edges that are not primary, or that are not inside the outer wall, or that are inside an obstacle (within a small epsilon of it)
-    actual_edges = []
     epsilon = 1e-15
-    for edge in edges:
-        if edge.start != -1 and\
-            edge.end != -1 and\
-            edge.is_primary and\
-            outer_shell.contains(Point(vertices[edge.start].X, vertices[edge.start].Y)) and\
-            outer_shell.contains(Point(vertices[edge.end].X, vertices[edge.end].Y)) and\
-            not any(Point(vertices[edge.start].X, vertices[edge.start].Y).distance(obstacle) < epsilon or Point(vertices[edge.end].X, vertices[edge.end].Y).distance(obstacle) < epsilon for obstacle in obstacles):
-                actual_edges.append(edge)
+    starts = np.array([edge.start for edge in edges], dtype=np.int64)
+    ends = np.array([edge.end for edge in edges], dtype=np.int64)
+    is_primary = np.array([edge.is_primary for edge in edges], dtype=bool)
+    candidates = (starts != -1) & (ends != -1) & is_primary
+
+    # Check each vertex used by a candidate edge only once
+    used_vertices_idxs = np.unique(np.concatenate((starts[candidates], ends[candidates])))
+    used_vertices_coords = np.array([[vertices[i].X, vertices[i].Y] for i in used_vertices_idxs]).reshape(-1, 2)
+    valid = contains_xy(outer_shell, used_vertices_coords[:, 0], used_vertices_coords[:, 1])
+    if len(obstacles) > 0:
+        # The nearest obstacle of each vertex, searched only within epsilon
+        (vertices_near, _), obstacle_distances = STRtree(obstacles).query_nearest(
+            points(used_vertices_coords), max_distance=epsilon, return_distance=True)
+        valid[vertices_near[obstacle_distances < epsilon]] = False
+    is_valid_vertex = np.zeros(len(vertices), dtype=bool)
+    is_valid_vertex[used_vertices_idxs[valid]] = True
+    actual = candidates.copy()
+    actual[candidates] = is_valid_vertex[starts[candidates]] & is_valid_vertex[ends[candidates]]
 
-    
     # Create the graph from the edges
     
     # Get the vertices indexes actually to be used in the graph. These are all the vertices that are part of the actual edges.
-    actual_vertices_idxs = sorted(list(set([edge.start for edge in actual_edges] + [edge.end for edge in actual_edges])))
+    actual_vertices_idxs = np.unique(np.concatenate((starts[actual], ends[actual])))
 
     # Create edges that use the vertices position in the actual vertices, instead of their index
-    actual_edges = [(actual_vertices_idxs.index(edge.start), actual_vertices_idxs.index(edge.end)) for edge in actual_edges]
+    actual_edges = np.stack((np.searchsorted(actual_vertices_idxs, starts[actual]), np.searchsorted(actual_vertices_idxs, ends[actual])), axis=1)
 
-    return actual_vertices_idxs, actual_edges
+    return actual_vertices_idxs.tolist(), [tuple(edge) for edge in actual_edges.tolist()]
 
 def create_graph_from_voronoi_diagram(vertices, actual_vertices_idxs, actual_edges):
 
@@ -365,18 +374,23 @@ def prune_graph(graph):
         graph.delete_vertices(leafs)
 
 def identify_regions(graph, radius_region_threshold):
-    region_nodes = [False for i in range(len(graph.vs))]
-    for i in range(len(graph.vs)):
-        degree = len(graph.vs[i].neighbors())
-        if degree > 2:
-            region_nodes[i] = True
-        elif degree == 1:
-            region_nodes[i] = True
-        else:
-            nodes_in_radius = [v.index for v in graph.vs if v.index != i and distance(Point(graph.vs[i]['coords'][0], graph.vs[i]['coords'][1]), Point(v['coords'][0], v['coords'][1])) < graph.vs[i]['radius']]
-            if graph.vs[i]['radius'] > radius_region_threshold and all([graph.vs[i]['radius'] > graph.vs[n]['radius'] for n in nodes_in_radius]):
-                region_nodes[i] = True
-    graph.vs['region'] = region_nodes
+    degrees = np.array(graph.degree(), dtype=int)
+    radius = np.array(graph.vs['radius'], dtype=float)
+    region_nodes = (degrees > 2) | (degrees == 1)
+
+    # The other nodes are regions if their radius is above the threshold and larger than the one of all the nodes within it
+    candidates = np.flatnonzero(~region_nodes & (radius > radius_region_threshold))
+    if len(candidates) > 0:
+        coords = np.array(graph.vs['coords'], dtype=float).reshape(-1, 2)
+        tree = cKDTree(coords)
+        # The radius of the query is slightly enlarged, the exact (strict) distance check is done on the returned nodes
+        neighborhoods = tree.query_ball_point(coords[candidates], radius[candidates] * (1 + 1e-9))
+        for i, nodes in zip(candidates, neighborhoods):
+            nodes = np.array(nodes, dtype=int)
+            deltas = coords[nodes] - coords[i]
+            nodes = nodes[(nodes != i) & (np.sqrt(deltas[:, 0] * deltas[:, 0] + deltas[:, 1] * deltas[:, 1]) < radius[i])]
+            region_nodes[i] = np.all(radius[i] > radius[nodes])
+    graph.vs['region'] = region_nodes.tolist()
 
 def identify_chokepoints(graph, remove_non_chokepoints=False):
     added_edges = []
@@ -384,25 +398,28 @@ def identify_chokepoints(graph, remove_non_chokepoints=False):
 
     visited = [False for i in range(len(graph.vs))]
     is_chockepoint = [False for i in range(len(graph.vs))]
+    region = graph.vs['region']
+    radius = graph.vs['radius']
+    adjacency = graph.get_adjlist()
     
-    region_nodes = [v.index for v in graph.vs if v['region']]
+    region_nodes = [v for v in range(len(region)) if region[v]]
     for r in region_nodes:
-        neighbors = [v.index for v in graph.vs[r].neighbors()]
+        neighbors = adjacency[r]
         path = [r]
         for n in neighbors:
             if visited[n]:
                 continue
             # Walk to the next region node
             next = n
-            while graph.vs[next]['region'] == False:
+            while region[next] == False:
                 visited[next] = True
                 path.append(next)
-                next = [v.index for v in graph.vs[next].neighbors() if v.index != path[-2]][0]
+                next = [v for v in adjacency[next] if v != path[-2]][0]
 
             if len(path) > 1:
                 path.pop(0) # Remove region node, chokepoint will be one non region node
-                min_radius = min([graph.vs[i]['radius'] for i in path])
-                chokepoints = [i for i in path if graph.vs[i]['radius'] == min_radius]
+                min_radius = min([radius[i] for i in path])
+                chokepoints = [i for i in path if radius[i] == min_radius]
                 chokepoint = chokepoints[int(len(chokepoints)/2)]
 
                 added_edges.append((r, chokepoint))
@@ -422,28 +439,30 @@ def identify_chokepoints(graph, remove_non_chokepoints=False):
 def merge_adjacent_regions_no_chokepoint(graph):
     # First, we merge regions that are connected by a single edge, with no chokepoint in between
     merge_groups = []
-    region_nodes = [v for v in graph.vs if v['region']]
-    region_nodes = [v.index for v in region_nodes]
-    visited = [False for i in range(len(region_nodes))]
+    region = graph.vs['region']
+    radius = graph.vs['radius']
+    adjacency = graph.get_adjlist()
+    region_nodes = [v for v in range(len(region)) if region[v]]
+    visited = [False for i in range(len(region))]
 
     # Find groups of directly connected regions to be merged
     for r in region_nodes:
-        if visited[region_nodes.index(r)]:
+        if visited[r]:
             continue
         path = [r]
-        visited[region_nodes.index(r)] = True
-        neighbors = [v.index for v in graph.vs[r].neighbors() if v['region'] and not visited[region_nodes.index(v.index)]]
+        visited[r] = True
+        neighbors = [v for v in adjacency[r] if region[v] and not visited[v]]
         while len(neighbors) > 0:
             new_neighbors = []
             for n in neighbors:
                 path.append(n)
-                visited[region_nodes.index(n)] = True
-                new_neighbors += [v.index for v in graph.vs[n].neighbors() if v['region'] and not visited[region_nodes.index(v.index)]]                
+                visited[n] = True
+                new_neighbors += [v for v in adjacency[n] if region[v] and not visited[v]]
             neighbors = new_neighbors
         if len(path) > 1:
             merge_groups.append(path)
     # Sort each merge group by decreasing radius
-    merge_groups = [[i for i in sorted(g, key=lambda x: graph.vs[x]['radius'], reverse=True)] for g in merge_groups]
+    merge_groups = [[i for i in sorted(g, key=lambda x: radius[x], reverse=True)] for g in merge_groups]
     nodes_to_delete = []
     edges_to_add = []
     for group in merge_groups:
@@ -451,13 +470,33 @@ def merge_adjacent_regions_no_chokepoint(graph):
         delete = group[1:]
         nodes_to_delete += delete
         for d in delete:
-            neighbors = [v.index for v in graph.vs[d].neighbors() if d != keep]
+            neighbors = [v for v in adjacency[d] if d != keep]
             for n in neighbors:
                 edges_to_add.append((keep, n))
     graph.add_edges(edges_to_add)
     graph.delete_vertices(nodes_to_delete)
     graph.simplify()
 
+def __walk_to_region(adjacency, region, start, path, excluded):
+    """
+    Walk from start along non region nodes, appending them to path, until a region node is reached.
+
+    Args:
+        excluded (set): Nodes that cannot be walked to, updated with the walked nodes
+
+    Returns:
+        tuple: The reached node, and whether the walk got stuck before reaching a region node
+    """
+    node = start
+    while not region[node]:
+        path.append(node)
+        excluded.add(node)
+        next_nodes = [v for v in adjacency[node] if v not in excluded]
+        if len(next_nodes) == 0:
+            return node, True
+        node = next_nodes[0]
+    return node, False
+
 # TODO: Unmergiable regions sometimes happpen, they actually could be merged, but require a more complex algorithm for a rare case.
 def merge_adjacent_regions_first_criterion(graph, r_smaller_coeff, r_bigger_coeff):
     #First, two regions are merged if the radius of the choke point connecting them is larger 
@@ -467,45 +506,33 @@ def merge_adjacent_regions_first_criterion(graph, r_smaller_coeff, r_bigger_coef
     while nodes_to_delete is None or len(nodes_to_delete) > 0:
         nodes_to_delete = []
         edges_to_add = []
+        region = graph.vs['region']
+        radius = graph.vs['radius']
+        chokepoint = graph.vs['chokepoint']
+        adjacency = graph.get_adjlist()
 
-        chokepoint_nodes = [v for v in graph.vs if v['chokepoint'] if len(v.neighbors()) == 2]
+        chokepoint_nodes = [v for v in range(len(region)) if chokepoint[v] if len(adjacency[v]) == 2]
         # Sort the chokepoint nodes by decreasing radius
-        chokepoint_nodes = sorted(chokepoint_nodes, key=lambda x: x['radius'], reverse=True)
-        chokepoint_nodes = [v.index for v in chokepoint_nodes]
+        chokepoint_nodes = sorted(chokepoint_nodes, key=lambda x: radius[x], reverse=True)
         for c in chokepoint_nodes:
-            unmergiable = False
             path = [c]
-            neighbors = [v.index for v in graph.vs[c].neighbors()]
-            n1 = neighbors[0]
-            while not graph.vs[n1]['region'] and not unmergiable:
-                path.append(n1)
-                n1_list = [v.index for v in graph.vs[n1].neighbors() if v.index not in path]
-                if len(n1_list) == 0:
-                    unmergiable = True
-                else:
-                    n1 = n1_list[0]
-            r1 = n1
-
-            n2 = neighbors[1]
-            while not graph.vs[n2]['region'] and not unmergiable:
-                path.append(n2)
-                n2_list = [v.index for v in graph.vs[n2].neighbors() if v.index not in path]
-                if len(n2_list) == 0:
-                    unmergiable = True
-                else:
-                    n2 = n2_list[0]
-            r2 = n2
+            in_path = {c}
+            neighbors = adjacency[c]
+            r1, unmergiable = __walk_to_region(adjacency, region, neighbors[0], path, in_path)
+            r2 = neighbors[1]
+            if not unmergiable:
+                r2, unmergiable = __walk_to_region(adjacency, region, neighbors[1], path, in_path)
 
             if unmergiable:
                 continue
 
-            r_greater = r1 if graph.vs[r1]['radius'] > graph.vs[r2]['radius'] else r2
-            r_smaller = r1 if graph.vs[r1]['radius'] <= graph.vs[r2]['radius'] else r2
+            r_greater = r1 if radius[r1] > radius[r2] else r2
+            r_smaller = r1 if radius[r1] <= radius[r2] else r2
             path.append(r_smaller)
+            in_path.add(r_smaller)
 
-            if graph.vs[c]['radius'] > r_smaller_coeff * graph.vs[r_smaller]['radius'] or graph.vs[c]['radius'] > r_bigger_coeff * graph.vs[r_greater]['radius']:
-                nodes_to_delete += path
-                neighbors_r_smaller = [v.index for v in graph.vs[r_smaller].neighbors() if v.index not in path]
+            if radius[c] > r_smaller_coeff * radius[r_smaller] or radius[c] > r_bigger_coeff * radius[r_greater]:
+                neighbors_r_smaller = [v for v in adjacency[r_smaller] if v not in in_path]
                 for n in neighbors_r_smaller:
                     edges_to_add.append((r_greater, n))
                 nodes_to_delete = path
@@ -526,55 +553,45 @@ def merge_adjacent_regions_second_criterion(graph, coeff):
     while nodes_to_delete is None or len(nodes_to_delete) > 0:
         nodes_to_delete = []
         edges_to_add = []
+        region = graph.vs['region']
+        radius = graph.vs['radius']
+        chokepoint = graph.vs['chokepoint']
+        adjacency = graph.get_adjlist()
 
-        region_nodes = [v.index for v in graph.vs if v['region']] 
+        region_nodes = [v for v in range(len(region)) if region[v]] 
         if len(region_nodes) < 2:
             break
-        region_nodes_two_chokepoints = [v.index for v in graph.vs if v['region'] and len(v.neighbors()) == 2]
+        region_nodes_two_chokepoints = [v for v in region_nodes if len(adjacency[v]) == 2]
+        # The chokepoint of each path is the last one walked, and it is kept from the previous paths if none is walked.
+        # They are not kept from the previous passes, whose nodes were renumbered by the deletion of the merged ones.
+        c1, c2 = None, None
         for r in region_nodes_two_chokepoints:
-            unmergiable = False
-            neighbors = [v.index for v in graph.vs[r].neighbors()]
+            neighbors = adjacency[r]
             
-            n1 = neighbors[0]
             path1 = []
-            while not graph.vs[n1]['region'] and not unmergiable:
-                path1.append(n1)
-                if graph.vs[n1]['chokepoint']:
-                    c1 = n1
-                n1_list = [v.index for v in graph.vs[n1].neighbors() if v.index not in path1 and v.index != r]
-                if len(n1_list) == 0:
-                    unmergiable = True
-                else:
-                    n1 = n1_list[0]
-                
-            r1 = n1
-
-            n2 = neighbors[1]
+            r1, unmergiable = __walk_to_region(adjacency, region, neighbors[0], path1, {r})
+            c1 = next((n for n in reversed(path1) if chokepoint[n]), c1)
+            r2 = neighbors[1]
             path2 = []
-            while not graph.vs[n2]['region'] and not unmergiable:
-                path2.append(n2)
-                if graph.vs[n2]['chokepoint']:
-                    c2 = n2
-                n2_list = [v.index for v in graph.vs[n2].neighbors() if v.index not in path2 and v.index != r]
-                if len(n2_list) == 0:
-                    unmergiable = True
-                else:
-                    n2 = n2_list[0]
-            r2 = n2
+            if not unmergiable:
+                r2, unmergiable = __walk_to_region(adjacency, region, neighbors[1], path2, {r})
+                c2 = next((n for n in reversed(path2) if chokepoint[n]), c2)
 
-            if unmergiable:
+            if unmergiable or c1 is None or c2 is None:
+                # No chokepoint was walked yet to compare the paths with
                 continue
 
-            c_greater = c1 if graph.vs[c1]['radius'] > graph.vs[c2]['radius'] else c2
+            c_greater = c1 if radius[c1] > radius[c2] else c2
             path_greater = path1 if c1 == c_greater else path2
             r_merge = r1 if c1 == c_greater else r2
 
-            if graph.vs[c_greater]['radius'] > coeff * graph.vs[r]['radius']:
-                r_greater = r if graph.vs[r]['radius'] > graph.vs[r_merge]['radius'] else r_merge
-                r_smaller = r if graph.vs[r]['radius'] <= graph.vs[r_merge]['radius'] else r_merge
+            if radius[c_greater] > coeff * radius[r]:
+                r_greater = r if radius[r] > radius[r_merge] else r_merge
+                r_smaller = r if radius[r] <= radius[r_merge] else r_merge
                 path_greater.append(r_smaller)
                 nodes_to_delete = path_greater
-                neighbors_r_smaller = [v.index for v in graph.vs[r_smaller].neighbors() if v.index not in path_greater]
+                in_path_greater = set(path_greater)
+                neighbors_r_smaller = [v for v in adjacency[r_smaller] if v not in in_path_greater]
                 for n in neighbors_r_smaller:
                     edges_to_add.append((r_greater, n))
             
@@ -639,8 +656,12 @@ def to_topology_graph_vornoi(phenotype):
     actual_vertices_idxs, actual_edges = filter_vornoi_edges(pv, outer_shell, obstacles)
     graph = create_graph_from_voronoi_diagram(pv.GetVertices(), actual_vertices_idxs, actual_edges)
 
-    # Calculate the radius of each vertex
-    graph.vs['radius'] = [min([distance(Point(v['coords'][0], v['coords'][1]), p) for p in all_polygons]) for v in graph.vs]
+    # Calculate the radius of each vertex, as the distance from the nearest polygon
+    (vertices_idxs, _), distances = STRtree(all_polygons).query_nearest(
+        points(np.array(graph.vs['coords']).reshape(-1, 2)), return_distance=True, all_matches=False)
+    radius = np.empty(len(graph.vs))
+    radius[vertices_idxs] = distances
+    graph.vs['radius'] = radius.tolist()
 
     # Prune the graph by removing leafs with a radius smaller than the parent's
     prune_graph(graph)
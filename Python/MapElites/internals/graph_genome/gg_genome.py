@@ -1,5 +1,6 @@
 from internals.area import Area, scale_area
 from internals.phenotype import Phenotype
+from internals.genome_layout import array_as_record
 from internals.graph_genome.room import Room
 from internals.graph_genome import mutation, crossover, generation, constants
 from internals.graph_genome.constants import GG_NUM_COLUMNS, GG_NUM_ROWS, GG_MAX_ROOM_WIDTH, GG_MAX_ROOM_HEIGHT, \
@@ -7,6 +8,13 @@ from internals.graph_genome.constants import GG_NUM_COLUMNS, GG_NUM_ROWS, GG_MAX
 
 
 class GraphGenome:
+    # Fields of the array of the genome, in order, with their shape. See genomes.solutions_as_records
+    ARRAY_LAYOUT = [
+        ("rooms", (GG_NUM_ROWS, GG_NUM_COLUMNS, 4)),
+        ("vertical_corridors", (GG_NUM_ROWS - 1, GG_NUM_COLUMNS)),
+        ("horizontal_corridors", (GG_NUM_ROWS, GG_NUM_COLUMNS - 1)),
+    ]
+
     def __init__(self, rooms, vertical_corridors, horizontal_corridors, map_scale):
         self.mapScale = map_scale
         self.rooms = rooms
@@ -67,35 +75,14 @@ class GraphGenome:
     
     @staticmethod
     def array_as_genome(array):
-        rooms = []
-        vertical_corridors = []
-        horizontal_corridors = []
-        index = 0
-        for _ in range(GG_NUM_ROWS):
-            rooms.append([])
-            for _ in range(GG_NUM_COLUMNS):
-                left_col = array[index]
-                index += 1
-                right_col = array[index]
-                index += 1
-                bottom_row = array[index]
-                index += 1
-                top_row = array[index]
-                index += 1
-                if left_col == 0 and right_col == 0 and bottom_row == 0 and top_row == 0:
-                    rooms[-1].append(None)
-                else:
-                    rooms[-1].append(Room(left_col, right_col, bottom_row, top_row))
-        for _ in range(GG_NUM_ROWS - 1):
-            vertical_corridors.append([])
-            for _ in range(GG_NUM_COLUMNS):
-                vertical_corridors[-1].append(array[index] == 1)
-                index += 1
-        for _ in range(GG_NUM_ROWS):
-            horizontal_corridors.append([])
-            for _ in range(GG_NUM_COLUMNS - 1):
-                horizontal_corridors[-1].append(array[index] == 1)
-                index += 1
+        return GraphGenome.record_as_genome(array_as_record(GraphGenome.ARRAY_LAYOUT, array))
+
+    @staticmethod
+    def record_as_genome(record):
+        """Builds a genome from a record of a batch, with its fields as lists. See genomes.records_as_genomes"""
+        rooms = [[None if room == [0, 0, 0, 0] else Room(*room) for room in row] for row in record["rooms"]]
+        vertical_corridors = [[corridor == 1 for corridor in row] for row in record["vertical_corridors"]]
+        horizontal_corridors = [[corridor == 1 for corridor in row] for row in record["horizontal_corridors"]]
         return GraphGenome(rooms, vertical_corridors, horizontal_corridors, GG_MAP_SCALE)
 
     def phenotype(self):
@@ -0,0 +1,122 @@
+import hashlib
+import os
+import zipfile
+
+import igraph as ig
+import numpy as np
+import shapely
+
+from internals.atomic_write import atomic_write
+from internals.constants import GAME_DATA_FOLDER
+
+
+def intermediates_path(folder_name, experiment_name):
+    """Returns the path of the intermediates of an experiment"""
+    return os.path.join(GAME_DATA_FOLDER, 'Export', folder_name, 'intermediates_' + experiment_name + '.npz')
+
+
+def __map_hash(phenotype):
+    """Get the SHA-256 digest of the map matrix of a phenotype, as an array of bytes"""
+    map_matrix = np.ascontiguousarray(phenotype.map_matrix(), dtype=np.int8)
+    h = hashlib.sha256()
+    h.update(str(map_matrix.shape).encode())
+    h.update(map_matrix.tobytes())
+    return np.frombuffer(h.digest(), dtype=np.uint8)
+
+
+def save_intermediates(folder_name, experiment_name, phenotype, topology, visibility_matrix):
+    """
+    Save the topology graph and the visibility matrix computed when evaluating an experiment, so that the analysis
+    tools can load them instead of computing them again from the phenotype.
+
+    They are saved in a compressed NPZ file that can be read without pickle: the graph as its edge list and one array
+    for each attribute of its vertices and edges, the outer shell and the obstacles as WKB, and the visibility matrix as
+    the smallest unsigned integer type that holds its counts. A hash of the map matrix of the phenotype is saved with
+    them, so that they are only loaded for the same map.
+
+    Args:
+        folder_name (str): The name of the experiment folder
+        experiment_name (str): The name of the experiment
+        phenotype (Phenotype): The phenotype of the experiment
+        topology (tuple): (graph, outer_shell, obstacles) as returned by phenotype.to_topology_graph_vornoi()
+        visibility_matrix (numpy.ndarray): The visibility matrix, as returned by phenotype.to_visibility_matrix_grid()
+    """
+    graph, outer_shell, obstacles = topology
+    arrays = {
+        "map_size": np.array([phenotype.mapWidth, phenotype.mapHeight]),
+        "map_hash": __map_hash(phenotype),
+        "num_vertices": np.array(graph.vcount()),
+        "edges": np.array(graph.get_edgelist(), dtype=np.int32).reshape(-1, 2),
+        "shapes": np.frombuffer(shapely.to_wkb(shapely.GeometryCollection([outer_shell] + list(obstacles))), dtype=np.uint8),
+    }
+    for name in graph.vertex_attributes():
+        arrays["vertex_" + name] = np.array(graph.vs[name])
+    for name in graph.edge_attributes():
+        arrays["edge_" + name] = np.array(graph.es[name])
+    if any(array.dtype == object for array in arrays.values()):
+        # Attributes that are missing for some vertices or edges would need pickle, the graph is computed again instead
+        arrays = {name: array for name, array in arrays.items() if name in ("map_size", "map_hash")}
+
+    visibility_matrix = np.asarray(visibility_matrix)
+    if visibility_matrix.size > 0 and visibility_matrix.min() >= 0 and np.array_equal(visibility_matrix, np.round(visibility_matrix)):
+        arrays["visibility"] = visibility_matrix.astype(np.min_scalar_type(int(visibility_matrix.max())))
+    else:
+        arrays["visibility"] = visibility_matrix
+
+    atomic_write(intermediates_path(folder_name, experiment_name), lambda f: np.savez_compressed(f, **arrays))
+
+
+def __load_intermediates(folder_name, experiment_name, phenotype, required):
+    """
+    Load the intermediates of an experiment if they were saved for the given phenotype.
+
+    Returns:
+        dict: The arrays of the intermediates, or None if they were not saved, can't be read, don't have the required
+            array or were saved for a different map
+    """
+    try:
+        with np.load(intermediates_path(folder_name, experiment_name), allow_pickle=False) as data:
+            if required not in data.files or tuple(data["map_size"]) != (phenotype.mapWidth, phenotype.mapHeight):
+                return None
+            # The files of the experiment may have been overwritten by another map of the same size
+            if "map_hash" not in data.files or not np.array_equal(data["map_hash"], __map_hash(phenotype)):
+                return None
+            return {name: data[name] for name in data.files}
+    except (OSError, ValueError, KeyError, zipfile.BadZipFile):
+        return None
+
+
+def load_topology_graph(folder_name, experiment_name, phenotype):
+    """
+    Get the topology graph of an experiment, loaded from its intermediates if they were saved or computed from its
+    phenotype otherwise.
+
+    Returns:
+        tuple: (graph, outer_shell, obstacles) as returned by phenotype.to_topology_graph_vornoi()
+    """
+    data = __load_intermediates(folder_name, experiment_name, phenotype, "edges")
+    if data is None:
+        return phenotype.to_topology_graph_vornoi()
+
+    graph = ig.Graph(n=int(data["num_vertices"]), edges=data["edges"].tolist())
+    for name, array in data.items():
+        if name.startswith("vertex_"):
+            graph.vs[name[len("vertex_"):]] = array.tolist()
+        elif name.startswith("edge_"):
+            graph.es[name[len("edge_"):]] = array.tolist()
+    shapes = list(shapely.from_wkb(data["shapes"].tobytes()).geoms)
+    return graph, shapes[0], shapes[1:]
+
+
+def load_visibility_matrix(folder_name, experiment_name, phenotype):
+    """
+    Get the visibility matrix of an experiment, loaded from its intermediates if they were saved or computed from its
+    phenotype otherwise.
+
+    Returns:
+        numpy.ndarray: The visibility matrix as returned by phenotype.to_visibility_matrix_grid()
+    """
+    data = __load_intermediates(folder_name, experiment_name, phenotype, "visibility")
+    if data is None:
+        return phenotype.to_visibility_matrix_grid()
+    return data["visibility"].astype(np.float64)
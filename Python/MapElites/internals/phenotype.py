@@ -4,7 +4,8 @@ from internals import area
 from internals.area import contains_area
 import matplotlib.pyplot as plt
 from internals.graph import to_topology_graph_naive, to_topology_graph_vornoi
-from internals.visibility import create_visibility_graph_DDA, create_visibility_matrix_grid, create_visibility_matrix_DDA
+from internals.visibility import create_visibility_graph_DDA, create_visibility_matrix_grid, create_visibility_matrix_grid_batched, create_visibility_matrix_DDA, \
+    create_visibility_edges_DDA, create_visibility_matrix_from_edges, create_visibility_graph_from_edges
 
 
 class Phenotype:
@@ -59,8 +60,15 @@ class Phenotype:
         return to_topology_graph_vornoi(self)
     
     # Returns both a graph and a convenient matrix form
-    def to_visibility_matrix_DDA(self, return_graph=False):
+    # The compact version builds the same graph using much less memory and time
+    def to_visibility_matrix_DDA(self, return_graph=False, compact=True):
         map_matrix = self.map_matrix()
+        if compact:
+            coords, edges = create_visibility_edges_DDA(map_matrix)
+            matrix = create_visibility_matrix_from_edges(coords, edges, map_matrix)
+            if return_graph:
+                return matrix, create_visibility_graph_from_edges(coords, edges)
+            return matrix
         graph = create_visibility_graph_DDA(map_matrix)
         matrix = create_visibility_matrix_DDA(graph, map_matrix)
         if return_graph:
@@ -68,8 +76,12 @@ class Phenotype:
         else:
             return matrix
             
-    def to_visibility_matrix_grid(self):
-        return create_visibility_matrix_grid(self.map_matrix())
+    # The batched version gives the same result, but is much faster
+    def to_visibility_matrix_grid(self, batched=True):
+        if batched:
+            return create_visibility_matrix_grid_batched(self.map_matrix())
+        else:
+            return create_visibility_matrix_grid(self.map_matrix())
         
 
 
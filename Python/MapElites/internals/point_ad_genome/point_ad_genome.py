@@ -5,11 +5,15 @@ import tqdm
 
 from internals.area import Area
 from internals.phenotype import Phenotype
+from internals.genome_layout import array_as_record
 from internals.point_ad_genome import mutation, crossover, generation, constants
 from internals.point_ad_genome.constants import POINT_AD_SQUARE_SIZE, POINT_AD_NUM_POINT_COUPLES, POINT_AD_MAX_MAP_WIDTH, POINT_AD_MAX_MAP_HEIGHT, \
     POINT_AD_CORRIDOR_WIDTH, POINT_AD_MAP_SCALE
 
 class PointAdGenome:
+    # Fields of the array of the genome, in order, with their shape. See genomes.solutions_as_records
+    ARRAY_LAYOUT = [("point_couples", (POINT_AD_NUM_POINT_COUPLES, 7))]
+
     def __init__(self, point_couples):
         self.point_couples = point_couples
         self.mapScale = POINT_AD_MAP_SCALE
@@ -62,20 +66,19 @@ class PointAdGenome:
                 "The array must have a length of " + str(POINT_AD_NUM_POINT_COUPLES * 7) + " but has a length of " + str(len(array))
             )
         
+        return PointAdGenome.record_as_genome(array_as_record(PointAdGenome.ARRAY_LAYOUT, array))
+
+    @staticmethod
+    def record_as_genome(record):
+        """Builds a genome from a record of a batch, with its fields as lists. See genomes.records_as_genomes"""
         points = []
-        for i in range(0, POINT_AD_NUM_POINT_COUPLES * 7, 7):
-            point_one = (array[i], array[i + 1])
-            point_two = (array[i + 2], array[i + 3])
-            room_left = array[i + 4]
-            room_right = array[i + 5]
-            connection = array[i + 6]
-            if point_one == (0, 0) and point_two == (0, 0) and connection == 0:
+        for left_x, left_y, right_x, right_y, room_left, room_right, connection in record["point_couples"]:
+            if (left_x, left_y, right_x, right_y, connection) == (0, 0, 0, 0, 0):
                 points.append(None)
             else:
-                room_left = None if room_left == 0 else PointAdRoom(point_one[0] - room_left, point_one[1] - room_left, 2 * room_left)
-                room_right = None if room_right == 0 else PointAdRoom(point_two[0] - room_right, point_two[1] - room_right, 2 * room_right)
-                points.append(PointAdPointCouple(point_one, point_two, room_left, room_right, connection))
-            
+                room_left = None if room_left == 0 else PointAdRoom(left_x - room_left, left_y - room_left, 2 * room_left)
+                room_right = None if room_right == 0 else PointAdRoom(right_x - room_right, right_y - room_right, 2 * room_right)
+                points.append(PointAdPointCouple((left_x, left_y), (right_x, right_y), room_left, room_right, connection))
         return PointAdGenome(points)
 
 
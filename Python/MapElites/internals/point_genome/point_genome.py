@@ -4,11 +4,15 @@ import numpy
 
 from internals.area import Area
 from internals.phenotype import Phenotype
+from internals.genome_layout import array_as_record
 from internals.point_genome import mutation, crossover, generation, constants
 from internals.point_genome.constants import POINT_SQUARE_SIZE, POINT_NUM_ROOMS, POINT_NUM_POINT_COUPLES, POINT_MAX_MAP_WIDTH, POINT_MAX_MAP_HEIGHT, \
     POINT_CORRIDOR_WIDTH, POINT_MAP_SCALE
 
 class PointGenome:
+    # Fields of the array of the genome, in order, with their shape. See genomes.solutions_as_records
+    ARRAY_LAYOUT = [("point_couples", (POINT_NUM_POINT_COUPLES, 5)), ("rooms", (POINT_NUM_ROOMS, 3))]
+
     def __init__(self, point_couples, rooms):
         self.point_couples = point_couples
         self.rooms = rooms
@@ -61,25 +65,18 @@ class PointGenome:
                 "The array must have a length of " + str(POINT_NUM_POINT_COUPLES * 5 + POINT_NUM_ROOMS * 3) + " but has a length of " + str(len(array))
             )
         
+        return PointGenome.record_as_genome(array_as_record(PointGenome.ARRAY_LAYOUT, array))
+
+    @staticmethod
+    def record_as_genome(record):
+        """Builds a genome from a record of a batch, with its fields as lists. See genomes.records_as_genomes"""
         points = []
-        rooms = []
-        for i in range(0, POINT_NUM_POINT_COUPLES * 5, 5):
-            point_one = (array[i], array[i + 1])
-            point_two = (array[i + 2], array[i + 3])
-            connection = array[i + 4]
-            if point_one == (0, 0) and point_two == (0, 0) and connection == 0:
+        for left_x, left_y, right_x, right_y, connection in record["point_couples"]:
+            if (left_x, left_y, right_x, right_y, connection) == (0, 0, 0, 0, 0):
                 points.append(None)
             else:
-                points.append(PointPointCouple(point_one, point_two, connection))
-        for i in range(POINT_NUM_POINT_COUPLES * 5, POINT_NUM_POINT_COUPLES * 5 + POINT_NUM_ROOMS * 3, 3):
-            left_col = array[i]
-            bottom_row = array[i + 1]
-            size = array[i + 2]
-            if left_col == 0 and bottom_row == 0 and size == 0:
-                rooms.append(None)
-            else:
-                rooms.append(PointRoom(array[i], array[i + 1], array[i + 2]))
-            
+                points.append(PointPointCouple((left_x, left_y), (right_x, right_y), connection))
+        rooms = [None if room == [0, 0, 0] else PointRoom(*room) for room in record["rooms"]]
         return PointGenome(points, rooms)
 
 
@@ -0,0 +1,77 @@
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+import psutil
+
+
+class StageProfile:
+    """
+    Wall time and memory of the stages of one evaluation.
+
+    A new profile is created for every evaluation and passed explicitly to the functions it profiles, so that it works
+    the same in any process or thread, and it is returned with the results of the evaluation. Memory is the growth of
+    the resident set size of the process during the stage, which is cheap to measure. If trace_memory is set, it is the
+    peak of the memory allocated during the stage as traced by tracemalloc instead, which is exact but slows down the
+    stages. Stages are not nested, and a stage run more than once accumulates its time and keeps its largest memory.
+    """
+
+    def __init__(self, trace_memory=False):
+        self.trace_memory = trace_memory
+        self.times = {}
+        self.memory = {}
+        self.__process = psutil.Process()
+
+    @contextmanager
+    def stage(self, name):
+        """Profile the code run inside the with statement as the given stage."""
+        if self.trace_memory:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+            tracemalloc.reset_peak()
+            start_memory = tracemalloc.get_traced_memory()[0]
+        else:
+            start_memory = self.__process.memory_info().rss
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            if self.trace_memory:
+                memory = tracemalloc.get_traced_memory()[1] - start_memory
+            else:
+                memory = self.__process.memory_info().rss - start_memory
+            self.times[name] = self.times.get(name, 0) + elapsed
+            self.memory[name] = max(self.memory.get(name, 0), max(0, memory))
+
+    def total_time(self):
+        return sum(self.times.values())
+
+    def __getstate__(self):
+        # The process can't be sent to other processes, the profile is recreated there
+        state = self.__dict__.copy()
+        del state["_StageProfile__process"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.__process = psutil.Process()
+
+
+def aggregate_profiles(profiles):
+    """
+    Aggregate the profiles of many evaluations.
+
+    Returns:
+        tuple: (times, memory), where times holds the mean time of each stage per evaluation, in seconds, and memory
+            the largest memory of each stage, in bytes. Stages are in the order in which they were first run.
+    """
+    times, memory = {}, {}
+    for profile in profiles:
+        for name, elapsed in profile.times.items():
+            times[name] = times.get(name, 0) + elapsed
+        for name, stage_memory in profile.memory.items():
+            memory[name] = max(memory.get(name, 0), stage_memory)
+    if len(profiles) > 0:
+        times = {name: elapsed / len(profiles) for name, elapsed in times.items()}
+    return times, memory
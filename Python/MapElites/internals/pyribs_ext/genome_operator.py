@@ -4,6 +4,8 @@ import numpy as np
 
 from ribs.emitters.operators._operator_base import OperatorBase
 
+from internals.genomes import genomes_as_solutions, records_as_genomes, solutions_as_records
+
 class GenomeOperator(OperatorBase):
     """Adds Gaussian noise to solutions.
 
@@ -53,7 +55,8 @@ class GenomeOperator(OperatorBase):
                 parents[index_sol1] = mut1.to_array()
                 parents[index_sol2] = mut2.to_array()
 
-        # Get the ABGenome from the array, mutate it and then store the array representation
-        mutated_solutions = [self._genome_type.mutate(self._genome_type.array_as_genome(sol)).to_array() for sol in parents]
+        # Get the genomes from the whole batch, mutate them and then store their array representation
+        genomes = records_as_genomes(self._genome_type, solutions_as_records(self._genome_type, parents, parents.dtype))
+        mutated_solutions = genomes_as_solutions([self._genome_type.mutate(genome) for genome in genomes], parents.dtype)
 
         return np.clip(mutated_solutions, self._lower_bounds, self._upper_bounds)
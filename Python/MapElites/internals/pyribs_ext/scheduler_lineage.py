@@ -122,6 +122,10 @@ class SchedulerLineage:
         # The number of solutions created by each emitter.
         self._num_emitted = [None for _ in self._emitters]
 
+        # Batches asked with ask_emitter() that have not been fully told yet.
+        self._pending_batches = {}
+        self._next_batch_id = 0
+
     @property
     def archive(self):
         """ribs.archives.ArchiveBase: Archive for storing solutions found in
@@ -415,5 +419,150 @@ class SchedulerLineage:
                 new_lineage.append(cell)
                 self._lineage_table[cell] = new_lineage
 
+    def ask_emitter(self, emitter_idx, info=None):
+        """Generates a batch of solutions from a single emitter.
+
+        This is the asynchronous counterpart of :meth:`ask`: instead of asking
+        all the emitters at once, each emitter is asked separately and the
+        results of its solutions can be returned one at a time, in any order,
+        with :meth:`tell_single`. An emitter should not be asked again until
+        all the solutions of its previous batch have been told, since emitters
+        such as :class:`ribs.emitters.EvolutionStrategyEmitter` expect to
+        receive their whole batch at once.
+
+        The lineages of the parents are copied when the batch is created, so
+        that the lineage of a solution is correct even if its parents are
+        replaced in the archive before the solution is told.
+
+        .. note:: Do not mix this method with :meth:`ask` and :meth:`tell`.
+
+        Args:
+            emitter_idx (int): Index of the emitter to ask.
+            info: Arbitrary data kept with the batch until it is fully told,
+                e.g. to resubmit its solutions after restoring the scheduler
+                (see :meth:`get_pending_batches`).
+        Returns:
+            tuple: ``(batch_id, solutions)``, where ``batch_id`` identifies the
+            batch in :meth:`tell_single` and ``solutions`` is a
+            ``(batch_size, dim)`` array of solutions to evaluate.
+        """
+        emitter = self._emitters[emitter_idx]
+        solutions = np.asarray(emitter.ask())
+
+        parents = [None] * len(solutions)
+        if getattr(emitter, "get_last_asked_indexes", None) is not None:
+            emitter_parents = emitter.get_last_asked_indexes()
+            if emitter_parents is not None:
+                parents = list(emitter_parents)
+        parent_lineages = [
+            None if p is None else self._lineage_table[p].copy()
+            for p in parents
+        ]
+
+        batch_id = self._next_batch_id
+        self._next_batch_id += 1
+        self._pending_batches[batch_id] = {
+            "emitter_idx": emitter_idx,
+            "solutions": solutions,
+            "parent_lineages": parent_lineages,
+            "data": [None] * len(solutions),
+            "add_info": [None] * len(solutions),
+            "remaining": len(solutions),
+            "info": info,
+        }
+        return batch_id, solutions
+
+    def tell_single(self, batch_id, solution_idx, objective, measures,
+                    **fields):
+        """Returns info for one solution from :meth:`ask_emitter`.
+
+        The solution is inserted into the archive (and its lineage recorded)
+        immediately. Once all the solutions of the batch have been told, the
+        emitter that created them is told the whole batch.
+
+        Args:
+            batch_id (int): Batch identifier returned by :meth:`ask_emitter`.
+            solution_idx (int): Position of the solution in its batch.
+            objective (float): Objective function evaluation of the solution.
+            measures (array-like): Coordinates of the solution in measure
+                space.
+            fields (keyword arguments): Additional data for the solution.
+        Returns:
+            bool: True if this was the last pending solution of the batch, i.e.
+            the emitter can be asked again.
+        Raises:
+            ValueError: The batch does not exist or the solution was already
+                told.
+        """
+        if batch_id not in self._pending_batches:
+            raise ValueError(f"Batch {batch_id} is not pending.")
+        batch = self._pending_batches[batch_id]
+        if batch["data"][solution_idx] is not None:
+            raise ValueError(f"Solution {solution_idx} of batch {batch_id} "
+                             "was already told.")
+
+        solution = batch["solutions"][solution_idx]
+        single_data = {
+            "solution": solution,
+            "objective": objective,
+            "measures": np.asarray(measures),
+            **fields,
+        }
+
+        if "failed" in single_data and single_data["failed"] == 1:
+            single_info = {"status": 0, "value": 0}
+        else:
+            single_info = self.archive.add_single(**single_data)
+        if self._result_archive is not None:
+            self._result_archive.add_single(**single_data)
+
+        if single_info["status"] != 0:
+            elite = self.archive.retrieve_single(
+                single_data["measures"])[1]['solution']
+            if all(solution == elite):
+                cell = self.archive.index_of_single(single_data["measures"])
+                parent_lineage = batch["parent_lineages"][solution_idx]
+                if parent_lineage is None:
+                    self._lineage_table[cell] = [cell]
+                else:
+                    self._lineage_table[cell] = parent_lineage + [cell]
+
+        batch["data"][solution_idx] = single_data
+        batch["add_info"][solution_idx] = single_info
+        batch["remaining"] -= 1
+        if batch["remaining"] > 0:
+            return False
+
+        # The whole batch has been evaluated, so the emitter can be told.
+        del self._pending_batches[batch_id]
+        data = {
+            name: np.asarray([d[name] for d in batch["data"]])
+            for name in batch["data"][0]
+        }
+        add_info = {
+            name: np.asarray([info[name] for info in batch["add_info"]])
+            for name in batch["add_info"][0]
+        }
+        self._emitters[batch["emitter_idx"]].tell(**data, add_info=add_info)
+        return True
+
+    def get_pending_batches(self):
+        """Returns the batches asked with :meth:`ask_emitter` that have not
+        been fully told yet.
+
+        Returns:
+            dict: Maps each ``batch_id`` to a tuple ``(emitter_idx, solutions,
+            untold_idxs, info)``, where ``untold_idxs`` are the positions of the
+            solutions of the batch that have not been told yet.
+        """
+        return {
+            batch_id: (
+                batch["emitter_idx"],
+                batch["solutions"],
+                [i for i, d in enumerate(batch["data"]) if d is None],
+                batch["info"],
+            ) for batch_id, batch in self._pending_batches.items()
+        }
+
     def get_lineage_table(self):
-        return self._lineage_table
\ No newline at end of file
+        return self._lineage_table
@@ -1,4 +1,5 @@
 from math import floor, sqrt
+from itertools import accumulate
 import os
 import numpy as np
 import pandas
@@ -8,8 +9,12 @@ from skimage.feature import peak_local_max
 import igraph as ig
 import tqdm
 
+from internals.atomic_write import atomic_write
 from internals.constants import GAME_DATA_FOLDER
-from internals.config import NUM_PARALLEL_SIMULATIONS, NUM_MATCHES_PER_SIMULATION
+from internals.config import NUM_PARALLEL_SIMULATIONS, NUM_MATCHES_PER_SIMULATION, SAVE_MAP_INTERMEDIATES
+from internals.map_intermediates import save_intermediates
+from internals.profiling import StageProfile
+from internals.results_store import append_results
 
 import pickle
 
@@ -18,21 +23,35 @@ warnings.simplefilter(action='ignore', category=pandas.errors.PerformanceWarning
 
 BOT_NUM = 2
 
-def extract_match_data(phenotype, folder_name, experiment_name, num_simulations=NUM_PARALLEL_SIMULATIONS):
+def extract_match_data(phenotype, folder_name, experiment_name, iteration, individual_number, num_simulations=NUM_PARALLEL_SIMULATIONS, profile=None):
+    """
+    Extract the features of an experiment from the exports of its simulations and save them in the results store.
+
+    Args:
+        iteration (int): The iteration of the individual, under which its results are stored
+        individual_number (int): The number of the individual in its iteration
+        profile (StageProfile): If given, the time and memory of each stage of the extraction are recorded in it
+
+    Returns:
+        pandas.DataFrame: The dataset with one row per simulation, or None if the results of a simulation are missing
+    """
+    profile = profile if profile is not None else StageProfile()
+
     # MATCH RESULT READING
     # Read the match results from the files
-    frames = []
-    for i in range(num_simulations):
-        file_name = os.path.join(GAME_DATA_FOLDER, 'Export', folder_name, 'final_results_' + experiment_name + '_' + str(i) + '.json')
-
-        try :
-            data = pandas.read_json(file_name)
-            frames.append(data)
-        except FileNotFoundError:
-            tqdm.tqdm.write("Results file not found: " + file_name)
-            return None
-
-    dataset = pandas.concat(frames)
+    with profile.stage("results_read"):
+        frames = []
+        for i in range(num_simulations):
+            file_name = os.path.join(GAME_DATA_FOLDER, 'Export', folder_name, 'final_results_' + experiment_name + '_' + str(i) + '.json')
+
+            try :
+                data = pandas.read_json(file_name)
+                frames.append(data)
+            except FileNotFoundError:
+                tqdm.tqdm.write("Results file not found: " + file_name)
+                return None
+
+        dataset = pandas.concat(frames)
     dataset.index = range(num_simulations * NUM_MATCHES_PER_SIMULATION)
 
     # Add ratio and killDiff columns
@@ -52,54 +71,42 @@ def extract_match_data(phenotype, folder_name, experiment_name, num_simulations=
     # MATCH RESULT ANALYSIS
 
     # Read resulting map
-    map_matrix = read_map(experiment_name, folder_name)
-    mask = np.matrix(map_matrix)
-    num_walkable_tiles = np.count_nonzero(mask == 0)
-    dataset["area"] = num_walkable_tiles / (len(map_matrix) * len(map_matrix[0]))
+    with profile.stage("map_read"):
+        map_matrix = read_map(experiment_name, folder_name)
+        mask = np.matrix(map_matrix)
+        num_walkable_tiles = np.count_nonzero(mask == 0)
+        dataset["area"] = num_walkable_tiles / (len(map_matrix) * len(map_matrix[0]))
 
     initial_path = os.path.join(GAME_DATA_FOLDER, "Export", folder_name)
-    # Analyze positions
-    positions_x = [[] for _ in range(BOT_NUM)]
-    positions_y = [[] for _ in range(BOT_NUM)]
-    for num_sim in range(num_simulations):
-        pos_x, pos_y = extract_data(extract_bot_positions, initial_path, experiment_name, BOT_NUM, phenotype.mapScale, num_sim)
-        for bot_num in range(BOT_NUM):
-            positions_x[bot_num].append(pos_x[bot_num])
-            positions_y[bot_num].append(pos_y[bot_num])
-    
-    dataset = __analyze_heatmap(dataset, positions_x, positions_y, "Position", BOT_NUM, map_matrix, num_simulations)
-    
-    # Analyze kill positions
-    kills_x  = [[] for _ in range(BOT_NUM)]
-    kills_y = [[] for _ in range(BOT_NUM)]
-    for num_sim in range(num_simulations):
-        k_x, k_y = extract_data(extract_kill_positions, initial_path, experiment_name, BOT_NUM, phenotype.mapScale, num_sim)
-        for bot_num in range(BOT_NUM):
-            kills_x[bot_num].append(k_x[bot_num])
-            kills_y[bot_num].append(k_y[bot_num])
-    dataset = __analyze_heatmap(dataset, kills_x, kills_y, "Kill", BOT_NUM, map_matrix, num_simulations)
-    
-    # Analyze death positions
-    deaths_x = [[] for _ in range(BOT_NUM)]
-    deaths_y = [[] for _ in range(BOT_NUM)]
-    for num_sim in range(num_simulations):
-        d_x, d_y = extract_data(extract_death_positions, initial_path, experiment_name, BOT_NUM, phenotype.mapScale, num_sim)
-        for bot_num in range(BOT_NUM):
-            deaths_x[bot_num].append(d_x[bot_num])
-            deaths_y[bot_num].append(d_y[bot_num])
-    dataset = __analyze_heatmap(dataset, deaths_x, deaths_y, "Death", BOT_NUM, map_matrix, num_simulations)
+    # Read all the position, kill and death exports at once
+    with profile.stage("csv_load"):
+        positions_x, positions_y, kills_x, kills_y, deaths_x, deaths_y = load_match_exports(initial_path, experiment_name, BOT_NUM, phenotype.mapScale, num_simulations)
+
+    # Analyze positions, kill positions and death positions
+    with profile.stage("heatmaps"):
+        dataset = analyze_heatmaps(
+            dataset,
+            [("Position", positions_x, positions_y), ("Kill", kills_x, kills_y), ("Death", deaths_x, deaths_y)],
+            BOT_NUM,
+            map_matrix,
+            num_simulations
+        )
 
     # Analyze kill traces
-    dataset = __analyze_traces(dataset, kills_x, kills_y, deaths_x, deaths_y, BOT_NUM, num_simulations)
+    with profile.stage("traces"):
+        dataset = __analyze_traces(dataset, kills_x, kills_y, deaths_x, deaths_y, BOT_NUM, num_simulations)
 
     # GRAPH ANALYSIS
 
     #graph, _ = phenotype.to_graph_naive()
     #rooms = [v for v in graph.vs if not v['isCorridor']]
-    graph, _, _ = phenotype.to_topology_graph_vornoi()
-    rooms = [v for v in graph.vs if v['region']]
-    chokepoints = [v for v in graph.vs if v['chokepoint']]
-    __graph_analysis(graph, rooms, dataset, chokepoints)
+    with profile.stage("topology_graph"):
+        topology = phenotype.to_topology_graph_vornoi()
+        graph = topology[0]
+    with profile.stage("graph_analysis"):
+        rooms = [v for v in graph.vs if v['region']]
+        chokepoints = [v for v in graph.vs if v['chokepoint']]
+        graph_analysis(graph, rooms, dataset, chokepoints)
 
     # VISIBILITY GRAPH
     # Remove border from the map
@@ -107,13 +114,15 @@ def extract_match_data(phenotype, folder_name, experiment_name, num_simulations=
     no_border_map_matrix = map_matrix[border:-border]
     no_border_map_matrix = [row[border:-border] for row in no_border_map_matrix]
 
-    #visibility_matrix = phenotype.to_visibility_matrix_DDA()
-    visibility_matrix = phenotype.to_visibility_matrix_grid()
+    with profile.stage("visibility"):
+        #visibility_matrix = phenotype.to_visibility_matrix_DDA()
+        visibility_matrix = phenotype.to_visibility_matrix_grid()
 
-    dataset = __analyze_visibility(visibility_matrix, no_border_map_matrix, num_walkable_tiles, dataset)
+        dataset = __analyze_visibility(visibility_matrix, no_border_map_matrix, num_walkable_tiles, dataset)
 
     # SYMMETRY
-    dataset = __analyze_symmetry(no_border_map_matrix, num_walkable_tiles, dataset)
+    with profile.stage("symmetry"):
+        dataset = __analyze_symmetry(no_border_map_matrix, num_walkable_tiles, dataset)
 
 
     # TODO: Add graph analysis based on match data?
@@ -146,88 +155,87 @@ def extract_match_data(phenotype, folder_name, experiment_name, num_simulations=
 
 
 
-    # Rewrite the dataset to include the new columns
-    dataset.to_json(os.path.join(GAME_DATA_FOLDER, 'Export', folder_name, 'final_results_' + experiment_name + '.json'))
-
-    phenotype_file = open(os.path.join(GAME_DATA_FOLDER, 'Export', folder_name, 'phenotype_' + experiment_name + '.pkl'), 'wb')
-    pickle.dump(phenotype, phenotype_file)
-    phenotype_file.close()
+    # Store the topology and visibility for the analysis tools, before the phenotype that marks the evaluation as completed
+    if SAVE_MAP_INTERMEDIATES:
+        with profile.stage("intermediates_write"):
+            save_intermediates(folder_name, experiment_name, phenotype, topology, visibility_matrix)
 
-    return dataset
+    # Store the dataset with the new columns
+    with profile.stage("results_write"):
+        append_results(folder_name, iteration, individual_number, dataset)
 
-def extract_data(extract_function, initial_path, experiment_name, bot_num,map_scale,num_sim):
-    p_x = [[] for _ in range(bot_num)]
-    p_y = [[] for _ in range(bot_num)]
-    for bot_n in range(0, bot_num):
-        (positions_x, positions_y) = extract_function(initial_path, experiment_name, bot_n, num_sim)
-        positions_x = [x / map_scale for x in positions_x]
-        positions_y = [y / map_scale for y in positions_y]
-        p_x[bot_n] = positions_x
-        p_y[bot_n] = positions_y
-    return p_x, p_y
-
-def __analyze_heatmap(dataset, p_x, p_y, feature_name, bot_num, map_matrix, num_simulations=NUM_PARALLEL_SIMULATIONS):
-    for bot_n in range(0, bot_num):
-        positions_x_bot = p_x[bot_n]
-        positions_y_bot = p_y[bot_n]
-        maxValue = []
-        localMaximaNumber = []
-        localMaximaTopDistance = []
-        localMaximaAverageDistance = []
-        averageLocalMaximaValue = []
-        stdLocalMaximaValue = []
-        quantile25 = []
-        quantile50 = []
-        quantile75 = []
-        coverage = []
+        atomic_write(os.path.join(GAME_DATA_FOLDER, 'Export', folder_name, 'phenotype_' + experiment_name + '.pkl'),
+                     lambda f: pickle.dump(phenotype, f))
 
-        for num_sim in range(num_simulations):
-            positions_x = positions_x_bot[num_sim]
-            positions_y = positions_y_bot[num_sim]
-
-            heatmap = __get_heatmap(positions_x, positions_y, map_matrix)
-            filtered_heatmap = gaussian_filter(heatmap, sigma=3.0)
-            masked_heatmap = __mask_heatmap(filtered_heatmap, map_matrix)
-
-            max_value = np.max(masked_heatmap.compressed())
-            local_maxima = __get_heatmap_local_maxima(masked_heatmap)
-            local_maxima_values = [masked_heatmap[local_max[0], local_max[1]] for local_max in local_maxima]
-            distances = __get_local_maxima_distances(masked_heatmap, local_maxima)
-            q25, q50, q75 = __get_heatmap_quantiles(masked_heatmap)
-            coverage = __get_heatmap_coverage(masked_heatmap, map_matrix, 0.1)
-
-            maxValue.append(max_value)
-            localMaximaNumber.append(len(local_maxima))
-            localMaximaTopDistance.append(distances[0])
-            localMaximaAverageDistance.append(np.mean(distances))
-            averageLocalMaximaValue.append(np.mean(local_maxima_values) if len(local_maxima) > 0 else 0)
-            stdLocalMaximaValue.append(np.std(local_maxima_values) if len(local_maxima) > 0 else 0)
-            quantile25.append(q25 / max_value)
-            quantile50.append(q50 / max_value)
-            quantile75.append(q75 / max_value)
-
-        dataset["maxValue" + feature_name + "Bot" + str(bot_n)] = maxValue
-        dataset["localMaximaNumber" + feature_name + "Bot" + str(bot_n)] = localMaximaNumber
-        dataset["localMaximaTopDistance" + feature_name + "Bot" + str(bot_n)] = localMaximaTopDistance
-        dataset["localMaximaAverageDistance" + feature_name + "Bot" + str(bot_n)] = localMaximaAverageDistance
-        dataset["averageLocalMaximaValue" + feature_name + "Bot" + str(bot_n)] = averageLocalMaximaValue
-        dataset["stdLocalMaximaValue" + feature_name + "Bot" + str(bot_n)] = stdLocalMaximaValue
-        dataset["quantile25" + feature_name + "Bot" + str(bot_n)] = quantile25
-        dataset["quantile50" + feature_name + "Bot" + str(bot_n)] = quantile50
-        dataset["quantile75" + feature_name + "Bot" + str(bot_n)] = quantile75
-        dataset["coverage" + feature_name + "Bot" + str(bot_n)] = coverage
+    return dataset
 
-    # Average the values of the bot_num bots
-    dataset["maxValue" + feature_name] = sum([dataset["maxValue" + feature_name + "Bot" + str(i)] for i in range(bot_num)]) / bot_num
-    dataset["localMaximaNumber" + feature_name] = sum([dataset["localMaximaNumber" + feature_name + "Bot" + str(i)] for i in range(bot_num)]) / bot_num
-    dataset["localMaximaTopDistance" + feature_name] = sum([dataset["localMaximaTopDistance" + feature_name + "Bot" + str(i)] for i in range(bot_num)]) / bot_num
-    dataset["localMaximaAverageDistance" + feature_name] = sum([dataset["localMaximaAverageDistance" + feature_name + "Bot" + str(i)] for i in range(bot_num)]) / bot_num
-    dataset["averageLocalMaximaValue" + feature_name] = sum([dataset["averageLocalMaximaValue" + feature_name + "Bot" + str(i)] for i in range(bot_num)]) / bot_num
-    dataset["stdLocalMaximaValue" + feature_name] = sum([dataset["stdLocalMaximaValue" + feature_name + "Bot" + str(i)] for i in range(bot_num)]) / bot_num
-    dataset["quantile25" + feature_name] = sum([dataset["quantile25" + feature_name + "Bot" + str(i)] for i in range(bot_num)]) / bot_num
-    dataset["quantile50" + feature_name] = sum([dataset["quantile50" + feature_name + "Bot" + str(i)] for i in range(bot_num)]) / bot_num
-    dataset["quantile75" + feature_name] = sum([dataset["quantile75" + feature_name + "Bot" + str(i)] for i in range(bot_num)]) / bot_num
-    dataset["coverage" + feature_name] = sum([dataset["coverage" + feature_name + "Bot" + str(i)] for i in range(bot_num)]) / bot_num
+HEATMAP_FEATURES = [
+    "maxValue",
+    "localMaximaNumber",
+    "localMaximaTopDistance",
+    "localMaximaAverageDistance",
+    "averageLocalMaximaValue",
+    "stdLocalMaximaValue",
+    "quantile25",
+    "quantile50",
+    "quantile75",
+    "coverage",
+]
+
+def analyze_heatmaps(dataset, features, bot_num, map_matrix, num_simulations=NUM_PARALLEL_SIMULATIONS):
+    """
+    Compute the heatmap features of all the bots and simulations of each of the given features.
+    All the heatmaps are stacked in a single 3-D array, so that they are built, filtered and masked at once.
+
+    Args:
+        features (list): List of (feature_name, p_x, p_y), where p_x and p_y have one list per bot with one array of 
+            coordinates per simulation
+    """
+    map_matrix = np.asarray(map_matrix)
+    walkable = map_matrix == 0
+    num_walkable_tiles = np.count_nonzero(walkable)
+
+    xs = [p_x[bot_n][num_sim] for _, p_x, _ in features for bot_n in range(bot_num) for num_sim in range(num_simulations)]
+    ys = [p_y[bot_n][num_sim] for _, _, p_y in features for bot_n in range(bot_num) for num_sim in range(num_simulations)]
+    heatmaps = __get_heatmaps(xs, ys, map_matrix.shape)
+    filtered_heatmaps = gaussian_filter(heatmaps, sigma=3.0, axes=(1, 2))
+    # Zero the walls, as done by __mask_heatmap
+    filtered_heatmaps[:, ~walkable] = 0
+    walkable_values = filtered_heatmaps[:, walkable]
+
+    max_values = np.max(walkable_values, axis=1)
+    quantiles = np.percentile(walkable_values, [25, 50, 75], axis=1)
+    coverages = np.count_nonzero(walkable_values >= 0.1, axis=1) / num_walkable_tiles
+    # Position of the maximum, considering only walkable tiles
+    max_idxs = np.argmax(np.where(walkable, filtered_heatmaps, -np.inf).reshape(len(heatmaps), -1), axis=1)
+
+    results = {name: np.empty(len(heatmaps)) for name in HEATMAP_FEATURES}
+    for k in range(len(heatmaps)):
+        local_maxima = __get_heatmap_local_maxima(filtered_heatmaps[k])
+        local_maxima_values = filtered_heatmaps[k][local_maxima[:, 0], local_maxima[:, 1]]
+        distances = __get_local_maxima_distances_from_max(local_maxima, local_maxima_values, np.unravel_index(max_idxs[k], map_matrix.shape))
+
+        results["maxValue"][k] = max_values[k]
+        results["localMaximaNumber"][k] = len(local_maxima)
+        results["localMaximaTopDistance"][k] = distances[0]
+        results["localMaximaAverageDistance"][k] = np.mean(distances)
+        results["averageLocalMaximaValue"][k] = np.mean(local_maxima_values) if len(local_maxima) > 0 else 0
+        results["stdLocalMaximaValue"][k] = np.std(local_maxima_values) if len(local_maxima) > 0 else 0
+    results["quantile25"] = quantiles[0] / max_values
+    results["quantile50"] = quantiles[1] / max_values
+    results["quantile75"] = quantiles[2] / max_values
+    # The coverage of each bot has always been the one of its last simulation, keep it to preserve the features
+    results["coverage"] = np.repeat(coverages[num_simulations - 1::num_simulations], num_simulations)
+
+    for f, (feature_name, _, _) in enumerate(features):
+        for bot_n in range(bot_num):
+            start = (f * bot_num + bot_n) * num_simulations
+            for name in HEATMAP_FEATURES:
+                dataset[name + feature_name + "Bot" + str(bot_n)] = results[name][start:start + num_simulations]
+
+        # Average the values of the bot_num bots
+        for name in HEATMAP_FEATURES:
+            dataset[name + feature_name] = sum([dataset[name + feature_name + "Bot" + str(i)] for i in range(bot_num)]) / bot_num
 
     return dataset
 
@@ -290,14 +298,24 @@ def __analyze_traces(dataset, kills_x, kills_y, deaths_x, deaths_y, bot_num, num
 
 
 
-def __get_heatmap(x, y, map_matrix):
-    heatmap, xedges, yedges = np.histogram2d(
-        x,
-        y,
-        bins=[[i for i in range(len(map_matrix[0]) + 1)],
-              [i for i in range(len(map_matrix) + 1)]]
-    )
-    return heatmap.T # Transpose to match map_matrix shape
+def __get_heatmaps(xs, ys, shape):
+    """
+    Compute the 2-D histograms of the given coordinates on the tiles of a map, with the same result of histogram2d
+    with unit bins (the last bin includes its right edge).
+
+    Returns:
+        numpy.ndarray: (len(xs), height, width) array of heatmaps
+    """
+    height, width = shape
+    heatmaps = np.zeros((len(xs), height, width))
+    for k, (x, y) in enumerate(zip(xs, ys)):
+        x = np.asarray(x, dtype=np.float64)
+        y = np.asarray(y, dtype=np.float64)
+        inside = (x >= 0) & (x <= width) & (y >= 0) & (y <= height)
+        col = np.minimum(np.floor(x[inside]).astype(np.intp), width - 1)
+        row = np.minimum(np.floor(y[inside]).astype(np.intp), height - 1)
+        heatmaps[k] = np.bincount(row * width + col, minlength=height * width).reshape(height, width)
+    return heatmaps
 
 def __mask_heatmap(heatmap, map_matrix, invert=True):
     # Multiply the heatmap by the inverted map_matrix to mask the walls
@@ -328,6 +346,14 @@ def __get_local_maxima_distances(heatmap, local_maxima):
 
     return distances
 
+def __get_local_maxima_distances_from_max(local_maxima, local_maxima_values, max_idx):
+    # Same as __get_local_maxima_distances, with the values of the local maxima and the maximum already computed
+    if(len(local_maxima) < 2):
+        return 0, 0
+    sorted_idxs = np.argsort(local_maxima_values)[::-1]
+    others = local_maxima[sorted_idxs[1:]]
+    return np.sqrt(np.power(others[:, 0] - others[:, 1], 2) + pow(max_idx[0] - max_idx[1], 2))
+
 def __get_heatmap_quantiles(heatmap):
     q1 = np.percentile(heatmap.compressed(), 25)
     q2 = np.percentile(heatmap.compressed(), 50)
@@ -340,19 +366,28 @@ def __get_heatmap_coverage(heatmap, map_matrix, threshold=0.1):
     walked_spaces = np.count_nonzero(heatmap.compressed() >= threshold)
     return walked_spaces / walkable_spaces
 
-def __graph_analysis(graph: ig.Graph, rooms, dataset, chokepoints=None):
+def graph_analysis(graph: ig.Graph, rooms, dataset, chokepoints=None):
+    """
+    Compute the features of the topology graph of a map and store them in the dataset.
+
+    Args:
+        graph (ig.Graph): The topology graph of the map
+        rooms (list): The vertices of the graph that are rooms
+        dataset (pandas.DataFrame): The dataset of the simulations, updated in place
+        chokepoints (list): The vertices of the graph that are chokepoints
+    """
+    room_idxs = [r.index for r in rooms]
+
     # Rooms number
     dataset["roomNumber"] = len(rooms)
 
-    # Rooms distance
-    all_distances = []
-    exclusive_distances = []
-    for i in range(len(rooms)):
-        new_distances = graph.distances(source=rooms[i], target=[rooms[j] for j in range(len(rooms)) if i != j], weights=graph.es['weight'])
-        all_distances.extend(new_distances)
-        exclusive_distances.extend(new_distances[0][i+1:])
+    # Rooms distance, from a single distance matrix. Each row excludes the distance of the room from itself
+    room_distances = np.array(graph.distances(source=room_idxs, target=room_idxs, weights=graph.es['weight']), dtype=float).reshape(len(rooms), len(rooms))
+    all_distances = [np.delete(room_distances[i], i) for i in range(len(rooms))]
+    # The distances of each room from the rooms after it, skipping the first one as it always did
+    exclusive_distances = np.concatenate([all_distances[i][i+1:] for i in range(len(rooms))]) if len(rooms) > 0 else np.array([])
 
-    exclusive_distances = [exclusive_distances[i] if np.isfinite(exclusive_distances[i]) else 0 for i in range(len(exclusive_distances))]
+    exclusive_distances = np.where(np.isfinite(exclusive_distances), exclusive_distances, 0)
     dataset["averageRoomMinDistance"] = np.mean(exclusive_distances) if len(exclusive_distances) > 0 else 0
     dataset["stdRoomMinDistance"] = np.std(exclusive_distances) if len(exclusive_distances) > 0 else 0
 
@@ -378,16 +413,19 @@ def __graph_analysis(graph: ig.Graph, rooms, dataset, chokepoints=None):
     dataset["averageRoomCloseness"] = np.mean(closeness) if len(closeness) > 0 else 0
     dataset["stdRoomCloseness"] = np.std(closeness) if len(closeness) > 0 else 0
 
-    # Mincut
-    mincut = [len(graph.mincut(source=rooms[i].index, target=rooms[j].index, capacity=None).cut) for i in range(len(rooms)) for j in range(i+1, len(rooms))]
-    mincut = [mincut[i] if np.isfinite(mincut[i]) else 0 for i in range(len(mincut))]
+    # Mincut of each pair of rooms
+    room_mincuts = __get_rooms_mincuts(graph, room_idxs)
+    mincut = [int(room_mincuts[i, j]) for i in range(len(rooms)) for j in range(i+1, len(rooms))]
     dataset["averageMincut"] = np.mean(mincut) if len(mincut) > 0 else 0
     dataset["stdMincut"] = np.std(mincut) if len(mincut) > 0 else 0
     dataset["maxMincut"] = max(mincut) if len(mincut) > 0 else 0
     dataset["minMincut"] = min(mincut) if len(mincut) > 0 else 0
 
-    # Connectivity
-    dataset["vertexConnectivity"] = graph.vertex_connectivity()
+    # Connectivity. A connected graph with an articulation point has connectivity 1, which avoids the flow computations
+    if graph.vcount() > 2 and graph.is_connected() and len(graph.articulation_points()) > 0:
+        dataset["vertexConnectivity"] = 1
+    else:
+        dataset["vertexConnectivity"] = graph.vertex_connectivity()
 
     # Ecceentricity, diameter and radius
     eccentricities = [max(d) if len(d) > 0 else 0 for d in all_distances]
@@ -412,26 +450,50 @@ def __graph_analysis(graph: ig.Graph, rooms, dataset, chokepoints=None):
 
     # Fundamental cycles. We consider cycles with at least one room and at least two rooms
     cycles = graph.fundamental_cycles()
-    vertices_in_cycles = []
-    for cycle in cycles:
-        vertices_in_cycles.append([])
-        for i in cycle:
-            if graph.es[i].source not in vertices_in_cycles[-1] and (not graph.vs[graph.es[i].source] in rooms):
-                vertices_in_cycles[-1].append(graph.es[i].source)
-            if graph.es[i].target not in vertices_in_cycles[-1] and (not graph.vs[graph.es[i].target] in rooms):
-                vertices_in_cycles[-1].append(graph.es[i].target)
-    cycles_one_room = [cycles[i] for i in range(len(cycles)) if len(vertices_in_cycles[i]) > 0]
-    cor_length = [sum([graph.es[i]['weight'] for i in range(len(cycle))]) for cycle in cycles_one_room]
-    cycles_two_rooms = [cycles[i] for i in range(len(cycles)) if len(vertices_in_cycles[i]) > 1]
-    ctr_length = [sum([graph.es[i]['weight'] for i in range(len(cycle))]) for cycle in cycles_two_rooms]
-
-    dataset["numberCyclesOneRoom"] = len(cycles_one_room)
+    rooms_set = set(room_idxs)
+    edges = graph.get_edgelist()
+    # Number of distinct vertices of each cycle that are not rooms
+    vertices_in_cycles = [len({v for e in cycle for v in edges[e]} - rooms_set) for cycle in cycles]
+    # The length of a cycle has always been the total weight of the first len(cycle) edges of the graph
+    cumulative_weights = list(accumulate(graph.es['weight'], initial=0))
+    cor_length = [cumulative_weights[len(cycles[i])] for i in range(len(cycles)) if vertices_in_cycles[i] > 0]
+    ctr_length = [cumulative_weights[len(cycles[i])] for i in range(len(cycles)) if vertices_in_cycles[i] > 1]
+
+    dataset["numberCyclesOneRoom"] = len(cor_length)
     dataset["averageLengthCyclesOneRoom"] = np.mean(cor_length) if len(cor_length) > 0 else 0
     dataset["stdLengthCyclesOneRoom"] = np.std(cor_length) if len(cor_length) > 0 else 0
-    dataset["numberCyclesTwoRooms"] = len(cycles_two_rooms)
+    dataset["numberCyclesTwoRooms"] = len(ctr_length)
     dataset["averageLengthCyclesTwoRooms"] = np.mean(ctr_length) if len(ctr_length) > 0 else 0
     dataset["stdLengthCyclesTwoRooms"] = np.std(ctr_length) if len(ctr_length) > 0 else 0
 
+def __get_rooms_mincuts(graph: ig.Graph, room_idxs):
+    """
+    Compute the mincut (number of edges) between each pair of rooms, with Gusfield's algorithm restricted to the rooms:
+    only len(room_idxs) - 1 max-flow computations build a tree over the rooms that is flow equivalent to the graph, 
+    i.e. the mincut of two rooms is the minimum capacity along the path connecting them in the tree.
+
+    Returns:
+        numpy.ndarray: Symmetric matrix with the mincut of each pair of rooms
+    """
+    num_rooms = len(room_idxs)
+    parent = [0 for _ in range(num_rooms)]
+    flow = [0 for _ in range(num_rooms)]
+    for i in range(1, num_rooms):
+        cut = graph.mincut(source=room_idxs[i], target=room_idxs[parent[i]], capacity=None)
+        flow[i] = len(cut.cut)
+        side = cut.membership
+        for j in range(i + 1, num_rooms):
+            if parent[j] == parent[i] and side[room_idxs[j]] == side[room_idxs[i]]:
+                parent[j] = i
+
+    # Each room is connected to a parent that comes before it, so the path to any previous room passes through the parent
+    mincuts = np.zeros((num_rooms, num_rooms), dtype=int)
+    for i in range(1, num_rooms):
+        for j in range(i):
+            mincuts[i, j] = flow[i] if j == parent[i] else min(flow[i], mincuts[parent[i], j])
+            mincuts[j, i] = mincuts[i, j]
+    return mincuts
+
 def __analyze_visibility(visibility_matrix, map_matrix, num_walkable_tiles, dataset):
     masked_heatmap = __mask_heatmap(visibility_matrix, map_matrix)
 
@@ -460,50 +522,58 @@ def __analyze_visibility(visibility_matrix, map_matrix, num_walkable_tiles, data
     return dataset
 
 def __analyze_symmetry(map_matrix, num_walkable_tiles, dataset):
-    x_len = len(map_matrix)
-    y_len = len(map_matrix[0])
-
-    # Get minimum and maximum coordinates that hold 1
-    min_x, max_x, min_y, max_y = x_len, 0, x_len, 0
-    for x in range(len(map_matrix)):
-        for y in range(len(map_matrix[0])):
-            if map_matrix[x][y] == 1:
-                min_x = min(min_x, x)
-                max_x = max(max_x, x)
-                min_y = min(min_y, y)
-                max_y = max(max_y, y)
-    x_len = max_x - min_x
-    y_len = max_y - min_y
-
-    num_walkable_tiles = np.count_nonzero(map_matrix)
-
-    x_symmetry = 0
-    y_mid_point = int(np.floor(y_len/2))
-    for x in range(min_x, max_x + 1):
-        for y in range(min_y, min_y + y_mid_point + 1):
-            opposite_y = max_y - (y - min_y)
-            if map_matrix[x][y] == map_matrix[x][opposite_y]:
-                if map_matrix[x][y] != 0:
-                    x_symmetry += 2 if y != opposite_y else 1
-
-    y_symmetry = 0
-    x_mid_point = int(np.floor(x_len/2))
-    for y in range(min_y, max_y + 1):
-        for x in range(min_x, min_x + x_mid_point + 1):
-            opposite_x = max_x - (x - min_x)
-            if map_matrix[x][y] == map_matrix[opposite_x][y]:
-                if map_matrix[x][y] != 0:
-                    y_symmetry += 2 if x != opposite_x else 1
-
-    x_symmetry /= num_walkable_tiles
-    y_symmetry /= num_walkable_tiles
-    max_symmetry = max(x_symmetry, y_symmetry)
-    dataset["xSymmetry"] = x_symmetry
-    dataset["ySymmetry"] = y_symmetry
-    dataset["maxSymmetry"] = max_symmetry
+    x_symmetry, y_symmetry, max_symmetry = compute_symmetry([map_matrix])
+    dataset["xSymmetry"] = float(x_symmetry[0])
+    dataset["ySymmetry"] = float(y_symmetry[0])
+    dataset["maxSymmetry"] = float(max_symmetry[0])
 
     return dataset
 
+def compute_symmetry(map_matrices):
+    """
+    Compute the symmetry of a batch of maps with the same shape, i.e. the fraction of tiles holding 1 whose mirrored 
+    tile, with respect to the middle of the bounding box of the tiles holding 1, also holds 1.
+    The x symmetry mirrors each row (the vertical axis in an image), the y symmetry mirrors each column.
+
+    Args:
+        map_matrices (array-like): Maps of shape (rows, cols), or a single (num_maps, rows, cols) array
+
+    Returns:
+        tuple: Arrays with the x symmetry, y symmetry and maximum symmetry of each map
+    """
+    maps = np.asarray(map_matrices)
+    num_maps, x_len, y_len = maps.shape
+    ones = maps == 1
+    rows = np.arange(x_len)
+    cols = np.arange(y_len)
+
+    # Bounding box of the tiles holding 1. The minimum column starts from the number of rows, as it always did
+    any_row = ones.any(axis=2)
+    any_col = ones.any(axis=1)
+    min_x = np.where(any_row, rows, x_len).min(axis=1)
+    max_x = np.where(any_row, rows, 0).max(axis=1)
+    min_y = np.minimum(np.where(any_col, cols, y_len).min(axis=1), x_len)
+    max_y = np.where(any_col, cols, 0).max(axis=1)
+
+    # Mirror of each row and column inside the bounding box, clipped outside of it
+    in_rows = (rows >= min_x[:, None]) & (rows <= max_x[:, None])
+    in_cols = (cols >= min_y[:, None]) & (cols <= max_y[:, None])
+    opposite_rows = np.clip((min_x + max_x)[:, None] - rows, 0, x_len - 1)
+    opposite_cols = np.clip((min_y + max_y)[:, None] - cols, 0, y_len - 1)
+    x_mirrored = np.take_along_axis(maps, opposite_cols[:, None, :], axis=2)
+    y_mirrored = np.take_along_axis(maps, opposite_rows[:, :, None], axis=1)
+
+    # Counting the whole bounding box counts mirrored pairs twice and the middle line once
+    in_box = in_rows[:, :, None] & in_cols[:, None, :]
+    nonzero = maps != 0
+    x_symmetry = np.count_nonzero(in_box & nonzero & (maps == x_mirrored), axis=(1, 2))
+    y_symmetry = np.count_nonzero(in_box & nonzero & (maps == y_mirrored), axis=(1, 2))
+
+    num_walkable_tiles = np.count_nonzero(maps.reshape(num_maps, -1), axis=1)
+    x_symmetry = x_symmetry / num_walkable_tiles
+    y_symmetry = y_symmetry / num_walkable_tiles
+    return x_symmetry, y_symmetry, np.maximum(x_symmetry, y_symmetry)
+
 
 
 
@@ -529,48 +599,64 @@ def read_map(experiment_name, folder_name):
         map_matrix.append(map_row)
     return map_matrix
 
+def read_export_csv(path, num_columns):
+    """
+    Read a csv file exported by the game.
+
+    Returns:
+        numpy.ndarray: float32 array of shape (rows, num_columns). Files without data (e.g. no deaths) give 0 rows.
+    """
+    with warnings.catch_warnings():
+        # An empty file is expected if there are no deaths
+        warnings.simplefilter("ignore", UserWarning)
+        data = np.loadtxt(path, delimiter=',', dtype=np.float32, ndmin=2, usecols=range(num_columns))
+    if data.size == 0:
+        return np.empty((0, num_columns), dtype=np.float32)
+    return data
+
+def load_match_exports(initial_path, experiment_name, bot_num, map_scale, num_simulations=NUM_PARALLEL_SIMULATIONS):
+    """
+    Read the position and death exports of all the simulations of an experiment, reading each file only once.
+    Death files contain both the position of the death (first two columns) and of the killer (last two columns).
+
+    Returns:
+        tuple: positions_x, positions_y, kills_x, kills_y, deaths_x, deaths_y. Each is a list with one element per bot, 
+        which is a list with one float32 array per simulation, with coordinates already divided by map_scale.
+    """
+    positions_x = [[] for _ in range(bot_num)]
+    positions_y = [[] for _ in range(bot_num)]
+    kills_x = [[] for _ in range(bot_num)]
+    kills_y = [[] for _ in range(bot_num)]
+    deaths_x = [[] for _ in range(bot_num)]
+    deaths_y = [[] for _ in range(bot_num)]
+    for bot_n in range(bot_num):
+        for num_sim in range(num_simulations):
+            positions = read_export_csv(os.path.join(initial_path, "position_" + experiment_name + "_" + str(num_sim) + "_bot" + str(bot_n+1) + ".csv"), 2)
+            positions /= map_scale
+            positions_x[bot_n].append(positions[:, 0])
+            positions_y[bot_n].append(positions[:, 1])
+
+            deaths_and_kills = read_export_csv(os.path.join(initial_path, "death_positions_" + experiment_name + "_" + str(num_sim) + "_bot" + str(bot_n+1) + ".csv"), 4)
+            deaths_and_kills /= map_scale
+            deaths_x[bot_n].append(deaths_and_kills[:, 0])
+            deaths_y[bot_n].append(deaths_and_kills[:, 1])
+            kills_x[bot_n].append(deaths_and_kills[:, 2])
+            kills_y[bot_n].append(deaths_and_kills[:, 3])
+    return positions_x, positions_y, kills_x, kills_y, deaths_x, deaths_y
+
 def extract_kill_positions(initial_path, experiment_name, bot_num, num_sim=0):
-    positions_x = []
-    positions_y = []
-    try:
-        temp = pandas.read_csv(
-            os.path.join(initial_path, "death_positions_" + experiment_name + "_" + str(num_sim) + "_bot" + str(bot_num+1) + ".csv"),
-            header=None,
-        )
-        positions_x.extend(temp[2])
-        positions_y.extend(temp[3])
-    except pandas.errors.EmptyDataError:
-        # Not a single death, file is empty
-        pass
-    return positions_x, positions_y,
+    data = read_export_csv(os.path.join(initial_path, "death_positions_" + experiment_name + "_" + str(num_sim) + "_bot" + str(bot_num+1) + ".csv"), 4)
+    return data[:, 2].tolist(), data[:, 3].tolist(),
 
 
 def extract_death_positions(initial_path, experiment_name, bot_num, num_sim=0):
-    positions_x = []
-    positions_y = []
-    try:
-        temp = pandas.read_csv(
-            os.path.join(initial_path, "death_positions_" + experiment_name + "_" + str(num_sim) + "_bot" + str(bot_num+1) + ".csv"),
-            header=None,
-        )
-        positions_x.extend(temp[0])
-        positions_y.extend(temp[1])
-    except pandas.errors.EmptyDataError:
-        # Not a single death, file is empty
-        pass
-    return positions_x, positions_y,
+    data = read_export_csv(os.path.join(initial_path, "death_positions_" + experiment_name + "_" + str(num_sim) + "_bot" + str(bot_num+1) + ".csv"), 4)
+    return data[:, 0].tolist(), data[:, 1].tolist(),
 
 
 def extract_bot_positions(initial_path, experiment_name, bot_num, num_sim=0):
-    positions_x = []
-    positions_y = []
-    temp = pandas.read_csv(
-        os.path.join(initial_path, "position_" + experiment_name + "_" + str(num_sim) + "_bot" + str(bot_num+1) + ".csv"),
-        header=None,
-    )
-    positions_x.extend(temp[0])
-    positions_y.extend(temp[1])
-    return positions_x, positions_y,
+    data = read_export_csv(os.path.join(initial_path, "position_" + experiment_name + "_" + str(num_sim) + "_bot" + str(bot_num+1) + ".csv"), 2)
+    return data[:, 0].tolist(), data[:, 1].tolist(),
 
 
 def extract_kill_distance_info(folder_name, experiment_name, bot_num, num_files=NUM_PARALLEL_SIMULATIONS):
@@ -0,0 +1,369 @@
+import json
+import os
+import re
+
+import pandas
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+import tqdm
+
+from internals.atomic_write import atomic_write
+from internals.constants import GAME_DATA_FOLDER, RESULTS_STORE_NAME
+
+# Columns added to the features of each match to identify it, the iteration is the partition of the dataset
+INDEX_COLUMNS = ["iteration", "individual", "match"]
+# File holding the results of all the individuals of an iteration after it has been compacted
+__COMPACTED_FILE = "compacted.parquet"
+# Key of the metadata of a compacted file with the columns and types of the individuals whose schema was different
+__SCHEMAS_METADATA_KEY = b"individual_schemas"
+# Key of the metadata of a compacted file with the numbers of its individuals
+__INDIVIDUALS_METADATA_KEY = b"individuals"
+__INDIVIDUAL_FILE_PATTERN = re.compile(r"(\d+)\.parquet")
+__PARTITION_PATTERN = re.compile(r"iteration=(-?\d+)")
+# Parquet types of the features whose range is computed
+__NUMERIC_TYPES = ("BOOLEAN", "INT32", "INT64", "FLOAT", "DOUBLE")
+# Per-individual results written before the store existed, the results of each simulation have one more number
+__LEGACY_RESULTS_PATTERN = re.compile(r"final_results_(\d+)_(\d+)\.json")
+
+
+def store_path(folder_name):
+    """Returns the directory of the results store of an experiment"""
+    return os.path.join(GAME_DATA_FOLDER, 'Export', folder_name, RESULTS_STORE_NAME)
+
+
+def __partition_path(folder_name, iteration):
+    return os.path.join(store_path(folder_name), f"iteration={int(iteration)}")
+
+
+def __entry_path(folder_name, iteration, individual_number):
+    return os.path.join(__partition_path(folder_name, iteration), f"{int(individual_number)}.parquet")
+
+
+def __list_partitions(folder_name, iterations=None):
+    """
+    List the files of the partitions of a results store.
+
+    Returns:
+        list: (iteration, compacted, individual_files) for each partition, where compacted is the path of the compacted
+            file or None, and individual_files maps the number of each individual with its own file to its path
+    """
+    iterations = set(int(iteration) for iteration in iterations) if iterations is not None else None
+    partitions = []
+    try:
+        partition_entries = list(os.scandir(store_path(folder_name)))
+    except FileNotFoundError:
+        return partitions
+    for partition_entry in partition_entries:
+        match = __PARTITION_PATTERN.fullmatch(partition_entry.name)
+        if match is None or (iterations is not None and int(match.group(1)) not in iterations):
+            continue
+        compacted, individual_files = None, {}
+        for entry in os.scandir(partition_entry.path):
+            if entry.name == __COMPACTED_FILE:
+                compacted = entry.path
+                continue
+            individual_match = __INDIVIDUAL_FILE_PATTERN.fullmatch(entry.name)
+            if individual_match is not None:
+                individual_files[int(individual_match.group(1))] = entry.path
+        partitions.append((int(match.group(1)), compacted, individual_files))
+    return sorted(partitions)
+
+
+def __read_files(folder_name, files, columns=None, individual_filter=None, schema=None):
+    """
+    Read some files of a results store with a single scan, as a DataFrame indexed by INDEX_COLUMNS.
+
+    Args:
+        schema (pyarrow.Schema): The schema the files are read with, without the iteration. If None, the schema of all
+            the files is used
+    """
+    if len(files) == 0:
+        return None
+    # A feature is stored as an integer for the individuals where all its values are integers, and as a float for the
+    # others, and the scanner can't convert between them. The files with the same schema are read with a single scan,
+    # and the tables of the different schemas are merged with the schema of all of them, as pandas.concat would do.
+    files_by_schema = {}
+    for path in files:
+        files_by_schema.setdefault(pq.read_schema(path).remove_metadata(), []).append(path)
+    if columns is not None:
+        columns = INDEX_COLUMNS + [column for column in columns if column not in INDEX_COLUMNS]
+    tables = []
+    for file_schema, schema_files in files_by_schema.items():
+        dataset = ds.dataset(schema_files, format="parquet", partitioning=ds.partitioning(flavor="hive"),
+                             partition_base_dir=store_path(folder_name))
+        schema_columns = [column for column in columns if column in dataset.schema.names] if columns is not None else None
+        tables.append(dataset.to_table(columns=schema_columns, filter=individual_filter))
+    table = pa.concat_tables(tables, promote_options="permissive")
+    if schema is not None:
+        schema = pa.schema([field for field in schema if field.name in table.schema.names])
+        table = table.select(schema.names + ["iteration"]).cast(schema.append(table.schema.field("iteration")))
+    results = table.to_pandas()
+    results["iteration"] = results["iteration"].astype("int64")
+    return results.set_index(INDEX_COLUMNS)
+
+
+def __individual_schema(compacted_schema, individual_number):
+    """Get the schema of the file an individual had before its iteration was compacted into the given schema"""
+    metadata = compacted_schema.metadata or {}
+    differences = json.loads(metadata.get(__SCHEMAS_METADATA_KEY, b"{}")).get(str(int(individual_number)))
+    compacted_schema = compacted_schema.remove_metadata()
+    if differences is None:
+        return compacted_schema
+    names = differences.get("columns", compacted_schema.names)
+    return pa.schema([
+        pa.field(name, pa.type_for_alias(differences["types"][name])) if name in differences["types"] else compacted_schema.field(name)
+        for name in names
+    ])
+
+
+def __schema_differences(compacted_schema, schema):
+    """Get the types and the columns of an individual schema that are different in the compacted schema, or None"""
+    differences = {"types": {field.name: str(field.type) for field in schema if compacted_schema.field(field.name).type != field.type}}
+    if schema.names != compacted_schema.names:
+        differences["columns"] = schema.names
+    return differences if len(differences["types"]) > 0 or "columns" in differences else None
+
+
+def __write_table(path, table):
+    # Temporary files start with a dot, so they are ignored by the store
+    atomic_write(path, lambda f: pq.write_table(table, f))
+
+
+def append_results(folder_name, iteration, individual_number, dataset):
+    """
+    Add the results of an individual to the results store of its experiment, replacing the ones it had.
+
+    The store is a Parquet dataset partitioned by iteration, where each individual is first written to its own file, so
+    that workers can write their results at the same time without coordination. The files of an iteration can then be
+    merged by compact_results.
+
+    Args:
+        folder_name (str): The name of the experiment
+        iteration (int): The iteration of the individual
+        individual_number (int): The number of the individual in its iteration
+        dataset (pandas.DataFrame): The dataset of the individual, with one row per match
+    """
+    path = __entry_path(folder_name, iteration, individual_number)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    table = pa.Table.from_pandas(dataset, preserve_index=False)
+    table = table.add_column(0, "match", pa.array(range(len(dataset)), type=pa.int64()))
+    table = table.add_column(0, "individual", pa.array([int(individual_number)] * len(dataset), type=pa.int64()))
+    __write_table(path, table)
+
+
+def read_results(folder_name, iteration, individual_number):
+    """
+    Read the results of an individual from the results store of its experiment.
+
+    Returns:
+        pandas.DataFrame: The dataset of the individual as it was added, or None if the store has no results for it
+    """
+    path = __entry_path(folder_name, iteration, individual_number)
+    if os.path.exists(path):
+        results = __read_files(folder_name, [path])
+    else:
+        compacted = os.path.join(__partition_path(folder_name, iteration), __COMPACTED_FILE)
+        if not os.path.exists(compacted):
+            return None
+        # Read with the schema the individual was added with, since compacting may have changed the type of its
+        # features or added the features of the other individuals
+        schema = __individual_schema(pq.read_schema(compacted), individual_number)
+        results = __read_files(folder_name, [compacted], individual_filter=ds.field("individual") == int(individual_number),
+                               schema=schema)
+    if len(results) == 0:
+        return None
+    dataset = results.droplevel(["iteration", "individual"])
+    dataset.index = dataset.index.to_numpy()
+    return dataset
+
+
+def load_results(folder_name, iterations=None, columns=None):
+    """
+    Read the results of an experiment with a single scan of its results store. If the experiment has no store but has
+    the per-individual JSON files written before the store existed, they are imported into a new store first.
+
+    Args:
+        folder_name (str): The name of the experiment
+        iterations (list): The iterations to read, all of them if None
+        columns (list): The features to read, all of them if None
+
+    Returns:
+        pandas.DataFrame: The results of all the matches, indexed by iteration, individual and match. Empty if the
+            experiment has no results
+    """
+    if not os.path.isdir(store_path(folder_name)):
+        import_json_results(folder_name)
+
+    partitions = __list_partitions(folder_name, iterations)
+    compacted_files = [compacted for _, compacted, _ in partitions if compacted is not None]
+    individual_files = [path for _, _, files in partitions for path in files.values()]
+    frames = []
+    compacted_results = __read_files(folder_name, compacted_files, columns)
+    if compacted_results is not None:
+        # Individuals added again after their iteration was compacted have their own file, which is more recent
+        replaced = [(iteration, individual) for iteration, _, files in partitions for individual in files]
+        frames.append(compacted_results[~compacted_results.index.droplevel("match").isin(replaced)])
+    individual_results = __read_files(folder_name, individual_files, columns)
+    if individual_results is not None:
+        frames.append(individual_results)
+    if len(frames) == 0:
+        return pandas.DataFrame(index=pandas.MultiIndex.from_arrays([[], [], []], names=INDEX_COLUMNS))
+    # Fragments are read in no particular order
+    return pandas.concat(frames).sort_index()
+
+
+def load_mean_results(folder_name, iterations=None, columns=None):
+    """
+    Read the results of an experiment as in load_results, averaged over the matches of each individual.
+
+    Returns:
+        pandas.DataFrame: The mean results of each individual, indexed by iteration and individual
+    """
+    results = load_results(folder_name, iterations, columns)
+    return results.groupby(level=["iteration", "individual"]).mean()
+
+
+def __file_feature_ranges(path):
+    """Get the minimum and maximum of each feature of a file from the statistics saved in its footer"""
+    metadata = pq.read_metadata(path)
+    mins, maxs = {}, {}
+    for row_group in range(metadata.num_row_groups):
+        for column in range(metadata.num_columns):
+            chunk = metadata.row_group(row_group).column(column)
+            name, statistics = chunk.path_in_schema, chunk.statistics
+            # Missing values are not part of the statistics, as they are skipped by pandas
+            if name in INDEX_COLUMNS or statistics is None or not statistics.has_min_max or \
+                    statistics.physical_type not in __NUMERIC_TYPES:
+                continue
+            mins[name] = min(mins[name], statistics.min) if name in mins else statistics.min
+            maxs[name] = max(maxs[name], statistics.max) if name in maxs else statistics.max
+    return mins, maxs
+
+
+def __compacted_individuals(path):
+    """Get the numbers of the individuals in a compacted file, from its metadata if it has them"""
+    metadata = pq.read_schema(path).metadata or {}
+    if __INDIVIDUALS_METADATA_KEY in metadata:
+        return json.loads(metadata[__INDIVIDUALS_METADATA_KEY])
+    return pc.unique(pq.read_table(path, columns=["individual"])["individual"]).to_pylist()
+
+
+def __table_feature_ranges(path, replaced):
+    """Get the minimum and maximum of each feature of a compacted file, without the rows of the replaced individuals"""
+    table = pq.read_table(path, filters=~pc.field("individual").isin(replaced))
+    mins, maxs = {}, {}
+    for field in table.schema:
+        if field.name in INDEX_COLUMNS or not (pa.types.is_integer(field.type) or pa.types.is_floating(field.type) or
+                                               pa.types.is_boolean(field.type)):
+            continue
+        min_max = pc.min_max(table[field.name])
+        if min_max["min"].is_valid:
+            mins[field.name] = min_max["min"].as_py()
+            maxs[field.name] = min_max["max"].as_py()
+    return mins, maxs
+
+
+def feature_ranges_by_file(folder_name, previous=None):
+    """
+    Get the range of the features in each file of the results store of an experiment. Ranges are read from the
+    statistics that Parquet saves in the footer of each file, without reading the results themselves. If an individual
+    was added again after its iteration was compacted, its previous results in the compacted file are superseded, and
+    the ranges of the compacted file are computed from its results without them until the iteration is compacted again.
+
+    Args:
+        folder_name (str): The name of the experiment
+        previous (dict): The ranges returned by a previous call, which are reused for the files that did not change
+
+    Returns:
+        dict: Maps the path of each file, relative to the store, to a dict with its modification time ("mtime_ns"),
+            its size ("size"), the individuals whose results in it are superseded ("replaced") and the minimum ("min")
+            and maximum ("max") of each feature in it
+    """
+    if not os.path.isdir(store_path(folder_name)):
+        import_json_results(folder_name)
+    previous = previous if previous is not None else {}
+    ranges = {}
+    for _, compacted, individual_files in __list_partitions(folder_name):
+        paths = list(individual_files.values()) + ([compacted] if compacted is not None else [])
+        for path in paths:
+            key = os.path.relpath(path, store_path(folder_name))
+            try:
+                stat = os.stat(path)
+                replaced = []
+                if path == compacted and len(individual_files) > 0:
+                    replaced = sorted(set(individual_files) & set(__compacted_individuals(path)))
+            except FileNotFoundError:
+                # Removed by a compaction after it was listed, its results are in the compacted file
+                continue
+            entry = previous.get(key)
+            if entry is None or (entry["mtime_ns"], entry["size"], entry.get("replaced", [])) != (stat.st_mtime_ns, stat.st_size, replaced):
+                mins, maxs = __table_feature_ranges(path, replaced) if len(replaced) > 0 else __file_feature_ranges(path)
+                entry = {"mtime_ns": stat.st_mtime_ns, "size": stat.st_size, "replaced": replaced, "min": mins, "max": maxs}
+            ranges[key] = entry
+    return ranges
+
+
+def compact_results(folder_name, iterations=None):
+    """
+    Merge the files of the individuals of each iteration of a results store into a single file, since reading many
+    small files is much slower than reading a large one. Individuals added while an iteration is being compacted keep
+    their own file, so it can be done while the experiment is running, as long as the same individuals are not being
+    evaluated again at the same time.
+
+    Args:
+        folder_name (str): The name of the experiment
+        iterations (list): The iterations to compact, all of them if None
+    """
+    for iteration, compacted, individual_files in __list_partitions(folder_name, iterations):
+        if len(individual_files) == 0:
+            continue
+        stats = {path: os.stat(path) for path in individual_files.values()}
+        # The schema of each individual is saved in the compacted file, so that read_results can restore it
+        schemas = {}
+        if compacted is not None:
+            compacted_schema = pq.read_schema(compacted)
+            for individual_number in pc.unique(pq.read_table(compacted, columns=["individual"])["individual"]).to_pylist():
+                schemas[individual_number] = __individual_schema(compacted_schema, individual_number)
+        for individual_number, path in individual_files.items():
+            schemas[individual_number] = pq.read_schema(path).remove_metadata()
+        results = load_results(folder_name, [iteration])
+        table = pa.Table.from_pandas(results.droplevel("iteration").reset_index(), preserve_index=False)
+        differences = {str(individual_number): __schema_differences(table.schema, schema) for individual_number, schema in schemas.items()}
+        differences = {individual_number: difference for individual_number, difference in differences.items() if difference is not None}
+        table = table.replace_schema_metadata({
+            **table.schema.metadata,
+            __SCHEMAS_METADATA_KEY: json.dumps(differences),
+            __INDIVIDUALS_METADATA_KEY: json.dumps(sorted(schemas)),
+        })
+        __write_table(os.path.join(__partition_path(folder_name, iteration), __COMPACTED_FILE), table)
+        # Files replaced after they were listed may not have been read, and keep precedence over the compacted file
+        for path, stat in stats.items():
+            current = os.stat(path)
+            if (current.st_ino, current.st_mtime_ns) == (stat.st_ino, stat.st_mtime_ns):
+                os.remove(path)
+
+
+def import_json_results(folder_name):
+    """
+    Import into the results store of an experiment the per-individual JSON files that were written before the store
+    existed. Only the files found in the export folder of the experiment are read.
+
+    Returns:
+        int: The number of individuals imported
+    """
+    export_dir = os.path.join(GAME_DATA_FOLDER, 'Export', folder_name)
+    try:
+        entries = list(os.scandir(export_dir))
+    except FileNotFoundError:
+        return 0
+    legacy_files = []
+    for entry in entries:
+        match = __LEGACY_RESULTS_PATTERN.fullmatch(entry.name)
+        if match is not None:
+            legacy_files.append((int(match.group(1)), int(match.group(2)), entry.path))
+    for iteration, individual_number, file_name in tqdm.tqdm(sorted(legacy_files), desc="Importing results", disable=len(legacy_files) == 0):
+        append_results(folder_name, iteration, individual_number, pandas.read_json(file_name, precise_float=True))
+    compact_results(folder_name)
+    return len(legacy_files)
@@ -0,0 +1,254 @@
+import hashlib
+import json
+import os
+import subprocess
+import time
+from math import log2
+
+import numpy
+
+from internals.constants import GAME_DATA_FOLDER, EXPERIMENT_RUNNER_PATH, EXPERIMENT_RUNNER_FILE, UNITY_BACKEND_NAME, \
+    SYNTHETIC_BACKEND_NAME
+from internals.config import SYNTHETIC_POSITIONS_PER_SECOND, SYNTHETIC_KILLS_PER_MINUTE
+from internals.result_extractor import BOT_NUM
+
+# Walls added by the game around the map, removed again by the result extractor
+MAP_BORDER = 5
+
+
+class SimulationBackend:
+    """
+    Runs the simulations of an experiment, writing their exports (final results, positions, death positions and map) in
+    the Export folder of the game data, where the result extractor reads them.
+
+    Simulations are started first and then waited for together, so that a backend can run them in parallel.
+    """
+
+    name = None
+
+    def start(self, folder_name, experiment_name, map_genome_name, game_length, experiment_part, num_simulations,
+              bot1_data, bot2_data, log=False, save_map=False):
+        """
+        Start a simulation with the given parameters
+
+        Args:
+            folder_name (str): The folder name to store the results in
+            experiment_name (str): The name of the experiment
+            map_genome_name (str): The name of the map genome
+            game_length (int): The length of the game in seconds
+            experiment_part (int): The part of the experiment
+            num_simulations (int): The number of simulations to run
+            bot1_data (dict): The data of the first bot
+            bot2_data (dict): The data of the second bot
+            log (bool): Whether to log the results
+            save_map (bool): Whether to save the map
+
+        Returns:
+            object: A handle of the simulation, to be given to wait
+        """
+        raise NotImplementedError
+
+    def wait(self, simulations, timeout):
+        """
+        Wait for all the given simulations using one shared deadline.
+
+        Args:
+            simulations (list): The handles returned by start
+            timeout (float): The time in seconds after which the remaining simulations are stopped
+
+        Returns:
+            list: The exit code of each simulation, or None if it was stopped after the deadline
+        """
+        raise NotImplementedError
+
+
+class UnitySimulationBackend(SimulationBackend):
+    """Runs the simulations with the build of the game, one process for each."""
+
+    name = UNITY_BACKEND_NAME
+
+    def start(self, folder_name, experiment_name, map_genome_name, game_length, experiment_part, num_simulations,
+              bot1_data, bot2_data, log=False, save_map=False):
+        cmd = [os.path.join(EXPERIMENT_RUNNER_PATH, EXPERIMENT_RUNNER_FILE),
+               "-experimentType=BOT_GENOME_TESTER",
+               "-batchmode",
+               #"-nographics",
+               "-gameLength=" + str(game_length),
+               "-dataFolderPath=" + GAME_DATA_FOLDER,
+               "-folderName=" + folder_name,
+               "-experimentName=" + experiment_name + "_" + str(experiment_part),
+               "-numExperiments=" + str(num_simulations),
+               "-areaFilename=" + map_genome_name,
+               "-bot1file=" + bot1_data["file"],
+               "-bot1skill=" + bot1_data["skill"],
+               "-bot2file=" + bot2_data["file"],
+               "-bot2skill=" + bot2_data["skill"],
+               "-logPositions",
+               "-logDeathPositions"
+               ]
+        if save_map:
+            cmd.append("-saveMap"),
+
+        if log:
+            cmd.append("-logFile")
+            cmd.append(
+                os.path.join(GAME_DATA_FOLDER, "Log", folder_name, experiment_name + "_" + str(experiment_part) + ".txt"))
+        else:
+            cmd.append("-nolog")
+        # Run the process with a timeout
+        rtn = subprocess.Popen(cmd,
+                               cwd=EXPERIMENT_RUNNER_PATH,
+                               stdout=subprocess.DEVNULL,
+                               bufsize=0)
+        return rtn
+
+    def wait(self, simulations, timeout):
+        deadline = time.monotonic() + timeout
+        return_codes = []
+        for process in simulations:
+            try:
+                return_codes.append(process.wait(timeout=max(0, deadline - time.monotonic())))
+            except subprocess.TimeoutExpired:
+                process.kill()
+                process.wait()
+                return_codes.append(None)
+        return return_codes
+
+
+class SyntheticSimulationBackend(SimulationBackend):
+    """
+    Writes synthetic exports instead of playing the matches, to run and profile the whole pipeline without the game.
+
+    The exports have the same format and size of the ones of the game: positions are logged twice per second for each
+    bot, and kills happen at the given rate. Bots move between a few hotspots of the walkable tiles of the map, so that
+    heatmaps have realistic local maxima, and are killed at one of their positions by the other bot. The data is a
+    deterministic function of the genome, the experiment name and part and the seed, so runs can be reproduced.
+    """
+
+    name = SYNTHETIC_BACKEND_NAME
+
+    def __init__(self, positions_per_second=2, kills_per_minute=6, num_hotspots=4, seed=0):
+        self.positions_per_second = positions_per_second
+        self.kills_per_minute = kills_per_minute
+        self.num_hotspots = num_hotspots
+        self.seed = seed
+
+    def start(self, folder_name, experiment_name, map_genome_name, game_length, experiment_part, num_simulations,
+              bot1_data, bot2_data, log=False, save_map=False):
+        with open(os.path.join(GAME_DATA_FOLDER, 'Import', 'Genomes', folder_name, map_genome_name), 'r') as f:
+            genome = json.load(f)
+        map_matrix = self.__map_matrix(genome)
+        floor = numpy.argwhere(map_matrix == 0)
+        if len(floor) == 0:
+            # There is nowhere to spawn the bots
+            return 1
+
+        name = experiment_name + "_" + str(experiment_part)
+        export_dir = os.path.join(GAME_DATA_FOLDER, 'Export', folder_name)
+        os.makedirs(export_dir, exist_ok=True)
+        digest = hashlib.sha256(json.dumps([genome, name, self.seed], sort_keys=True).encode()).digest()
+        rng = numpy.random.default_rng(int.from_bytes(digest[:8], "little"))
+
+        # Matches are appended to the same files, as done by the game
+        results = []
+        positions = [[] for _ in range(BOT_NUM)]
+        deaths = [[] for _ in range(BOT_NUM)]
+        for _ in range(num_simulations):
+            match_positions = [self.__positions(rng, map_matrix, floor, game_length) for _ in range(BOT_NUM)]
+            num_deaths = []
+            for bot_n in range(BOT_NUM):
+                killer_positions = match_positions[(bot_n + 1) % BOT_NUM]
+                num_deaths.append(rng.poisson(self.kills_per_minute / BOT_NUM * game_length / 60))
+                idxs = rng.integers(0, len(match_positions[bot_n]), num_deaths[bot_n])
+                positions[bot_n].append(match_positions[bot_n])
+                deaths[bot_n].append(numpy.hstack([match_positions[bot_n][idxs], killer_positions[idxs]]))
+            # The frags of each bot are the deaths of the other one
+            results.append(self.__match_results(rng, num_deaths[::-1], game_length))
+
+        scale = genome["mapScale"]
+        for bot_n in range(BOT_NUM):
+            bot_name = name + "_bot" + str(bot_n + 1)
+            numpy.savetxt(os.path.join(export_dir, "position_" + bot_name + ".csv"), numpy.vstack(positions[bot_n]) * scale, fmt="%.5f", delimiter=",")
+            numpy.savetxt(os.path.join(export_dir, "death_positions_" + bot_name + ".csv"), numpy.vstack(deaths[bot_n]) * scale, fmt="%.5f", delimiter=",")
+        if save_map:
+            # Rows are written from the top, walls are 'w' and walkable tiles 'r'
+            with open(os.path.join(export_dir, "map_" + name + ".txt"), "w") as f:
+                f.writelines("".join("w" if tile else "r" for tile in row) + "\n" for row in map_matrix[::-1])
+        with open(os.path.join(export_dir, "final_results_" + name + ".json"), "w") as f:
+            json.dump(results, f)
+        return 0
+
+    def wait(self, simulations, timeout):
+        # Simulations are written synchronously by start, their handle is the exit code
+        return list(simulations)
+
+    def __map_matrix(self, genome):
+        """Map of the genome as built by the game, with 1 for walls and the border of walls around it."""
+        map_matrix = numpy.ones((genome["height"] + 2 * MAP_BORDER, genome["width"] + 2 * MAP_BORDER), dtype=numpy.int8)
+        for area in genome["areas"]:
+            map_matrix[MAP_BORDER + area["bottomRow"]:MAP_BORDER + area["topRow"], MAP_BORDER + area["leftColumn"]:MAP_BORDER + area["rightColumn"]] = 0
+        return map_matrix
+
+    def __positions(self, rng, map_matrix, floor, game_length):
+        """Sample the positions of a bot during a match, in tiles, around hotspots chosen among the walkable tiles."""
+        num_positions = max(1, int(game_length * self.positions_per_second))
+        hotspots = floor[rng.integers(0, len(floor), self.num_hotspots)]
+        weights = rng.dirichlet(numpy.ones(self.num_hotspots))
+        rows_cols = hotspots[rng.choice(self.num_hotspots, num_positions, p=weights)] + 0.5 + rng.normal(0, 3, (num_positions, 2))
+
+        # Move the positions that ended up in a wall or outside of the map to a random walkable tile
+        tiles = numpy.floor(rows_cols).astype(numpy.intp)
+        invalid = (tiles < 0).any(axis=1) | (tiles[:, 0] >= map_matrix.shape[0]) | (tiles[:, 1] >= map_matrix.shape[1])
+        invalid[~invalid] = map_matrix[tiles[~invalid, 0], tiles[~invalid, 1]] == 1
+        num_invalid = numpy.count_nonzero(invalid)
+        rows_cols[invalid] = floor[rng.integers(0, len(floor), num_invalid)] + rng.random((num_invalid, 2))
+        # Exports are (x, z) coordinates, i.e. (column, row)
+        return rows_cols[:, ::-1]
+
+    def __match_results(self, rng, frags, game_length):
+        """Compile the results of a match as done by GameResultsAnalyzer, with plausible values for the statistics."""
+        results = {}
+        for bot_n in range(BOT_NUM):
+            suffix = str(bot_n + 1)
+            number_of_fights = int(frags[bot_n] + rng.poisson(2 + frags[bot_n]))
+            number_of_shots = int(rng.poisson(20 * number_of_fights + 1))
+            number_of_hits = int(rng.binomial(number_of_shots, rng.uniform(0.2, 0.6)))
+            results["timeInFight" + suffix] = float(rng.uniform(0.1, 0.5) * game_length)
+            results["timeToEngage" + suffix] = float(rng.uniform(1, 10) * number_of_fights)
+            results["numberOfFights" + suffix] = number_of_fights
+            results["numberOfSights" + suffix] = int(number_of_fights + rng.poisson(number_of_fights))
+            results["timeBetweenSights" + suffix] = float(rng.uniform(0, 0.2) * results["timeInFight" + suffix])
+            results["timeToSurrender" + suffix] = float(rng.uniform(0, 0.2) * results["timeInFight" + suffix])
+            results["numberOfRetreats" + suffix] = int(rng.binomial(number_of_fights, 0.2))
+            results["numberOfFrags" + suffix] = int(frags[bot_n])
+            results["numberOfSuicides" + suffix] = 0
+            results["numberOfShots" + suffix] = number_of_shots
+            results["numberOfHits" + suffix] = number_of_hits
+            results["accuracy" + suffix] = number_of_hits / number_of_shots if number_of_hits > 0 else 0
+            results["killStreakAverage" + suffix] = float(rng.uniform(1, 2)) if frags[bot_n] > 0 else 0
+            results["killStreakMax" + suffix] = int(min(frags[bot_n], rng.integers(1, 5)))
+
+        total_frags = sum(frags)
+        results["entropy"] = sum(-f / total_frags * log2(f / total_frags) for f in frags if f > 0) if total_frags > 0 else 0
+        fights = results["numberOfFights1"] + results["numberOfFights2"]
+        time_to_engage = results["timeToEngage1"] + results["timeToEngage2"]
+        results["pace"] = 2 / (1 + numpy.exp(-5 * fights / time_to_engage)) - 1 if time_to_engage > 0 else 0
+        time_in_fight = results["timeInFight1"] + results["timeInFight2"]
+        time_between_sights = results["timeBetweenSights1"] + results["timeBetweenSights2"]
+        results["pursueTime"] = time_in_fight / (2 * game_length)
+        results["fightTime"] = (time_in_fight - time_between_sights - results["timeToSurrender1"] - results["timeToSurrender2"]) / (2 * game_length)
+        results["sightLossRate"] = time_between_sights / time_in_fight
+        results["targetLossRate"] = (results["numberOfRetreats1"] + results["numberOfRetreats2"]) / fights if fights > 0 else 0
+        return results
+
+
+def get_simulation_backend(name):
+    """
+    Create the simulation backend with the given name. See constants.py for possible values
+    """
+    if name == UNITY_BACKEND_NAME:
+        return UnitySimulationBackend()
+    elif name == SYNTHETIC_BACKEND_NAME:
+        return SyntheticSimulationBackend(SYNTHETIC_POSITIONS_PER_SECOND, SYNTHETIC_KILLS_PER_MINUTE)
+    else:
+        raise ValueError(f"Unknown simulation backend {name}")
@@ -4,6 +4,7 @@ import numpy
 
 from internals.area import Area
 from internals.phenotype import Phenotype
+from internals.genome_layout import array_as_record
 from internals.smt_genome import mutation, crossover, generation, constants
 from internals.smt_genome.constants import SMT_SQUARE_SIZE, SMT_ROOMS_NUMBER, SMT_MAX_MAP_WIDTH, SMT_MAX_MAP_HEIGHT, \
     SMT_CORRIDOR_WIDTH, SMT_MAP_SCALE, SMT_LINES_NUMBER, SMT_SOLVER_GENOME_SCALE, SMT_CORRIDOR_WIDTH
@@ -11,6 +12,9 @@ from internals.smt_genome.solver import solve
 import bisect
 
 class SMTGenome:
+    # Fields of the array of the genome, in order, with their shape. See genomes.solutions_as_records
+    ARRAY_LAYOUT = [("rooms", (SMT_ROOMS_NUMBER, 2)), ("lines", (SMT_LINES_NUMBER, 4)), ("separation", ())]
+
     def __init__(self, rooms, lines, separation):
         self.rooms = rooms
         self.lines = lines
@@ -60,20 +64,14 @@ class SMTGenome:
             raise ValueError(
                 f"Expected genome to have {SMT_ROOMS_NUMBER} rooms and {SMT_LINES_NUMBER} lines.")
         
-        rooms = []
-        lines = []
-        for i in range(0, SMT_ROOMS_NUMBER * 2, 2):
-            if array[i] == 0 and array[i + 1] == 0:
-                rooms.append(None)
-            else:
-                rooms.append(SMTRoom(array[i], array[i + 1]))
-        for i in range(SMT_ROOMS_NUMBER * 2, SMT_ROOMS_NUMBER * 2 + SMT_LINES_NUMBER * 4, 4):
-            if array[i] == 0 and array[i + 1] == 0 and array[i + 2] == 0 and array[i + 3] == 0:
-                lines.append(None)
-            else:
-                lines.append(SMTLine((array[i], array[i + 1]), (array[i + 2], array[i + 3])))
-        separation = array[SMT_ROOMS_NUMBER * 2 + SMT_LINES_NUMBER * 4]
-        return SMTGenome(rooms, lines, separation)
+        return SMTGenome.record_as_genome(array_as_record(SMTGenome.ARRAY_LAYOUT, array))
+
+    @staticmethod
+    def record_as_genome(record):
+        """Builds a genome from a record of a batch, with its fields as lists. See genomes.records_as_genomes"""
+        rooms = [None if width == 0 and height == 0 else SMTRoom(width, height) for width, height in record["rooms"]]
+        lines = [None if line == [0, 0, 0, 0] else SMTLine((line[0], line[1]), (line[2], line[3])) for line in record["lines"]]
+        return SMTGenome(rooms, lines, record["separation"])
 
 
     def phenotype(self):
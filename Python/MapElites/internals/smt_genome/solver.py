@@ -1,18 +1,17 @@
-from z3 import *
-from internals.smt_genome.constants import SMT_ROOMS_NUMBER, SMT_MAX_MAP_WIDTH, SMT_MAX_MAP_HEIGHT, SMT_MAX_ROOM_HEIGHT, SMT_MIN_ROOM_HEIGHT, SMT_LINES_NUMBER \
-    , SMT_MAX_ROOM_WIDTH, SMT_MIN_ROOM_WIDTH, SMT_SOLVER_GENOME_SCALE, SMT_SOLVER_LINE_WIDTH, SMT_SOLVER_SCALE_FACTOR
-import time
+import math
+import threading
+from collections import OrderedDict
+
+import numpy as np
+from z3 import And, Context, Int, Or, SimpleSolver, Solver, sat, unsat
 from scipy.spatial import Delaunay
 from scipy.sparse.csgraph import minimum_spanning_tree
-import numpy as np
 
+from internals.config import SMT_SOLVER_TIMEOUT, SMT_INCREMENTAL_SOLVER, SMT_HINT_TIMEOUT
+from internals.profiling import StageProfile
+from internals.smt_genome.constants import SMT_ROOMS_NUMBER, SMT_MAX_MAP_WIDTH, SMT_MAX_MAP_HEIGHT, SMT_LINES_NUMBER \
+    , SMT_SOLVER_GENOME_SCALE, SMT_SOLVER_LINE_WIDTH, SMT_SOLVER_SCALE_FACTOR
 
-rooms = []
-actual_number_of_rooms = 0
-
-timing_info = {}
-accumulated_timing_info = {}
-timing_per_run = {}
 
 SCALE_FACTOR = SMT_SOLVER_SCALE_FACTOR
 
@@ -20,255 +19,289 @@ CANVAS_WIDTH = SMT_MAX_MAP_WIDTH * SMT_SOLVER_GENOME_SCALE
 CANVAS_HEIGHT = SMT_MAX_MAP_HEIGHT * SMT_SOLVER_GENOME_SCALE
 
 BORDER = 0
-LINEWIDTH = SMT_SOLVER_LINE_WIDTH  
+LINEWIDTH = SMT_SOLVER_LINE_WIDTH
 LINEWIDTH_Y = LINEWIDTH * SCALE_FACTOR
 
-SEPARATION = 1
-SEPARATION_Y = SEPARATION * SCALE_FACTOR
-
-
-def update_timing():
-    global timing_info
-    global accumulated_timing_info
-
-    if not accumulated_timing_info:
-        #print("Initializing accumulated_timing_info")
-        for timing in timing_info:
-            accumulated_timing_info[timing] = []
-
-    for timing in timing_info:
-        accumulated_timing_info[timing].append(timing_info[timing])
-
-def init_rooms(genome_rooms):
-    global rooms, actual_number_of_rooms
-    rooms = []
-    for i in range(SMT_ROOMS_NUMBER):
-        if genome_rooms[i] is not None:
-            r = {'x': Int('room_{}_x'.format(i)), 'y': Int('room_{}_y'.format(i)),
-                 'width': None, 'height': None, 'quad': None}
-            r['width'] = genome_rooms[i].width
-            r['height'] = genome_rooms[i].height * SCALE_FACTOR
-            r['quad'] = 1
-            rooms.append(r)
-    actual_number_of_rooms = len(rooms)
-
-def create_canvas_constraints(slv):
-    global and_clause_count, or_clause_count
-    for i in range(actual_number_of_rooms):
-        slv.add(rooms[i]['x'] >= 0, rooms[i]['x'] + rooms[i]['width'] <= CANVAS_WIDTH)
-        slv.add(rooms[i]['y'] >= 0, rooms[i]['y'] + rooms[i]['height'] <= CANVAS_HEIGHT * SCALE_FACTOR)
-        and_clause_count = and_clause_count + 4
-        or_clause_count = or_clause_count + 0
-
-def create_separation_constraints(slv):
-    for i in range(actual_number_of_rooms):
-        for j in range(i+1, actual_number_of_rooms):
-            add_separation_constraint(slv, i, j)
-
-def add_separation_constraint(slv, i, j):
-    global and_clause_count, or_clause_count
-    vert_cond = {"above": "rooms[j]['y'] <= (rooms[i]['y'] - rooms[j]['height'] - SEPARATION_Y)",
-#                 "same": "rooms[j]['y'] == rooms[i]['y']",
-                 "same": None,
-                 "below": "rooms[i]['y'] <= (rooms[j]['y'] - rooms[i]['height'] - SEPARATION_Y)" }
-
-    horiz_cond = {"left": "rooms[j]['x'] <= (rooms[i]['x'] - rooms[j]['width'] - SEPARATION)",
-#                  "same": "rooms[j]['x'] == rooms[i]['x']",
-                  "same": None,
-                  "right": "rooms[i]['x'] <= (rooms[j]['x'] - rooms[i]['width'] - SEPARATION)" }
-
-    constraint = "Or("
-
-    # for dir in directions:
-    #     if vert_cond[dir['vert']] is not None and horiz_cond[dir['horiz']] is not None:
-    #         constraint += "And(" + vert_cond[dir['vert']] + ", " + horiz_cond[dir['horiz']] + "),\n"
-    #     if vert_cond[dir['vert']] is None and horiz_cond[dir['horiz']] is not None:
-    #         constraint += horiz_cond[dir['horiz']] + ",\n"
-    #     if vert_cond[dir['vert']] is not None and horiz_cond[dir['horiz']] is None:
-    #         constraint += vert_cond[dir['vert']] + ",\n"
-    constraint += vert_cond['above'] + ",\n" + vert_cond['below'] + ",\n" + horiz_cond['left'] + ",\n" + horiz_cond['right'] + ",\n"
-
-    constraint = constraint[:-2]
-    constraint += "\n)"
-    slv.add(eval(constraint))
-    and_clause_count = and_clause_count + 1
-    or_clause_count = or_clause_count + 4
-
-def create_lines_constraints(slv, genome_lines):
-    """ Add a series of linear constraints following lines created by mousepoints """
-    lines = []
-    for i in range(SMT_LINES_NUMBER):
-        if genome_lines[i] is None:
-            continue
-        x1 = (genome_lines[i].start[0] - BORDER)
-        y1 = (genome_lines[i].start[1] - BORDER) * SCALE_FACTOR
-        x2 = (genome_lines[i].end[0] - BORDER)
-        y2 = (genome_lines[i].end[1] - BORDER) * SCALE_FACTOR
-
-        m_num = (y2 - y1)
-        if (x2-x1) == 0:
-            m_den = 1
-        else:
-            m_den = (x2 - x1)
 
-        l_info = {'m_num': m_num, 'm_den': m_den, 'm': m_num/m_den, 'y1': y1, 'y2': y2, 'x1': x1, 'x2': x2}
-        lines.append(l_info)
-    if len(lines) > 0:
-        create_point_line_constraints(slv, lines)
+class SMTLayoutSolver:
+    """
+    Places the rooms of SMT genomes on the canvas, so that they don't overlap and follow the lines of the genome.
+
+    The solver keeps no state about the genome being solved, which lives in the local variables of solve, so the same
+    solver can be used by many threads at the same time. Constraints are built as z3 expressions, in the same order and
+    with the same terms as the original string based constraints, so that the solutions don't change. Each genome is
+    solved in a new z3 context, so that its layout only depends on the genome and not on the genomes solved before it.
+
+    In incremental mode every thread instead keeps a z3 context, created the first time it solves a genome and reused
+    by all its later calls, together with a cache of the constraints built in it and a z3 solver with the constraints
+    shared by all genomes (the rooms can't be placed before the origin of the canvas). The constraints of each genome
+    are pushed on top of them and popped once it is solved. Children differ from their parents in few rooms and lines,
+    so the rooms that a genome shares with the most similar recently solved genome are first assumed to be where they
+    were placed in it, with a short timeout. If that fails, the whole layout is searched with the full timeout, unless
+    the assumptions turned out to be irrelevant to the failure, in which case the genome can't be solved at all and
+    fails immediately. The layout of a genome then depends on the genomes solved before it by the same thread, so runs
+    can't be reproduced.
+    """
+
+    def __init__(self, timeout=600, random_seed=0, incremental=False, hint_timeout=50, layout_memory=256,
+                 constraint_cache_size=20000):
+        """
+        Args:
+            timeout (int): The timeout of each check of the z3 solver, in milliseconds
+            random_seed (int): The random seed of the z3 solver
+            incremental (bool): Whether to solve genomes incrementally, see above
+            hint_timeout (int): The timeout of the check with the rooms of a previous layout kept in place, in
+                milliseconds
+            layout_memory (int): The number of recent layouts remembered by each thread to be used as hints
+            constraint_cache_size (int): The number of constraints cached by each thread in incremental mode, the
+                cache is cleared when it grows larger
+        """
+        self.timeout = timeout
+        self.random_seed = random_seed
+        self.incremental = incremental
+        self.hint_timeout = hint_timeout
+        self.layout_memory = layout_memory
+        self.constraint_cache_size = constraint_cache_size
+        self.__local = threading.local()
+
+    def solve(self, genome, profile=None):
+        """
+        Place the rooms of a genome and connect them with the minimum spanning tree of their Delaunay triangulation.
+
+        Args:
+            genome (SMTGenome): The genome to solve
+            profile (StageProfile): If given, the time and memory of each stage of the solver are recorded in it
+
+        Returns:
+            tuple: (rooms_positions, mst), the (x, y) position of each room of the genome that is not None and the
+                minimum spanning tree connecting them as a sparse matrix
+
+        Raises:
+            Exception: If the rooms can't be placed within the timeout
+        """
+        profile = profile if profile is not None else StageProfile()
+        state = self.__thread_state() if self.incremental else None
+        context = state.context if self.incremental else Context()
+        cache = state.constraints if self.incremental else {}
+
+        with profile.stage("smt_constraints"):
+            rooms = self.__init_rooms(genome.rooms, context)
+            separation = self.__to_python(genome.separation)
+            if len(cache) > self.constraint_cache_size:
+                cache.clear()
+            # In incremental mode the lower bounds of the canvas are already in the solver
+            constraints = self.__canvas_constraints(rooms, cache, not self.incremental)
+            constraints += self.__separation_constraints(rooms, separation, cache)
+            constraints += self.__lines_constraints(rooms, genome.lines, cache)
+
+        if self.incremental:
+            positions = self.__solve_incremental(rooms, constraints, state, profile)
+        else:
+            positions = self.__solve_fresh(rooms, constraints, context, profile)
 
+        with profile.stage("smt_mst"):
+            center_points = [(x + room['width'] / 2, y + room['height'] / 2) for (x, y), room in zip(positions, rooms)]
+            tri = Delaunay(center_points)
+            mst = minimum_spanning_tree(self.__create_graph_array(tri, center_points))
 
-def create_point_line_constraints(slv, lines):
-    global  and_clause_count, or_clause_count
+        rooms_positions = [(x, y / SCALE_FACTOR) for x, y in positions]
+        return rooms_positions, mst
 
-    for i in range(actual_number_of_rooms):
-        constraint = "Or("
-        for line in lines:
-            # Separating numerator and denominator of slope causes significant slowdown, due to division
-            #constraint += "((rooms[i]['y'] - " + str(line['y2']) +") == (" + str(line['m_num']) + " * (rooms[i]['x'] - " \
-            #               + str(line['x2']) + ")) / " + str(line['m_den']) + "),\n"
-
-            if line['m'] > 0:
-                constraint += "And((rooms[i]['y'] <= " + str(line['m']) + "* (rooms[i]['x'] - " \
-                               + str(line['x2']) + "+" + str(LINEWIDTH) + ") +" + str(line['y2']) + "),\n"
-                constraint += "(rooms[i]['y'] >= " + str(line['m']) + "* (rooms[i]['x'] - " \
-                               + str(line['x2']) + "-" + str(LINEWIDTH) + "+" + str(rooms[i]['width']) + ")+" + str(line['y2']) + "),\n"
+    def __thread_state(self):
+        state = self.__local
+        if not hasattr(state, "context"):
+            state.context = Context()
+            state.constraints = {}
+            state.layouts = OrderedDict()
+            # The plain SMT solver of z3 supports push and pop, the default one falls back to it after the first push
+            state.solver = SimpleSolver(ctx=state.context)
+            state.solver.set('random_seed', self.random_seed)
+            for i in range(SMT_ROOMS_NUMBER):
+                x, y = self.__room_variables(i, state.context)
+                state.solver.add(x >= 0, y >= 0)
+        return state
+
+    def __solve_fresh(self, rooms, constraints, context, profile):
+        with profile.stage("smt_check"):
+            solver = Solver(ctx=context)
+            solver.set('random_seed', self.random_seed)
+            solver.set(timeout=self.timeout)
+            for constraint in constraints:
+                solver.add(constraint)
+            result = solver.check()
+        if result != sat:
+            raise Exception("No solution found")
+        model = solver.model()
+        return [(model[room['x']].as_long(), model[room['y']].as_long()) for room in rooms]
+
+    def __solve_incremental(self, rooms, constraints, state, profile):
+        solver = state.solver
+        solver.push()
+        try:
+            with profile.stage("smt_check"):
+                for constraint in constraints:
+                    solver.add(constraint)
+                result = None
+                hint = self.__find_hint(rooms, state.layouts)
+                if len(hint) > 0:
+                    solver.set(timeout=self.hint_timeout)
+                    result = solver.check(*hint)
+                    if result == unsat and len(solver.unsat_core()) == 0:
+                        # Unsatisfiable whatever the position of the rooms of the hint
+                        raise Exception("No solution found")
+                if result != sat:
+                    solver.set(timeout=self.timeout)
+                    result = solver.check()
+            if result != sat:
+                raise Exception("No solution found")
+            model = solver.model()
+            positions = [(model[room['x']].as_long(), model[room['y']].as_long()) for room in rooms]
+        finally:
+            solver.pop()
+
+        self.__remember_layout(rooms, positions, state.layouts)
+        return positions
+
+    def __find_hint(self, rooms, layouts):
+        """ Get the assumptions keeping the rooms shared with the most similar remembered layout in place """
+        keys = [room['key'] for room in rooms]
+        best_layout, best_shared = None, 0
+        # The most recent layouts are preferred when the number of shared rooms is the same
+        for layout in reversed(layouts.values()):
+            shared = sum(key in layout for key in keys)
+            if shared > best_shared:
+                best_layout, best_shared = layout, shared
+        if best_layout is None:
+            return []
+        hint = []
+        for room in rooms:
+            if room['key'] in best_layout:
+                x, y = best_layout[room['key']]
+                hint += [room['x'] == x, room['y'] == y]
+        return hint
+
+    def __remember_layout(self, rooms, positions, layouts):
+        layout_key = tuple(room['key'] for room in rooms)
+        layouts[layout_key] = {room['key']: position for room, position in zip(rooms, positions)}
+        layouts.move_to_end(layout_key)
+        if len(layouts) > self.layout_memory:
+            layouts.popitem(last=False)
+
+    def __room_variables(self, index, context):
+        return Int('room_{}_x'.format(index), context), Int('room_{}_y'.format(index), context)
+
+    def __init_rooms(self, genome_rooms, context):
+        rooms = []
+        for i in range(SMT_ROOMS_NUMBER):
+            if genome_rooms[i] is not None:
+                x, y = self.__room_variables(i, context)
+                width = self.__to_python(genome_rooms[i].width)
+                height = self.__to_python(genome_rooms[i].height) * SCALE_FACTOR
+                rooms.append({'x': x, 'y': y, 'width': width, 'height': height, 'key': (i, width, height)})
+        return rooms
+
+    def __canvas_constraints(self, rooms, cache, lower_bounds=True):
+        constraints = []
+        for room in rooms:
+            key = ('canvas', room['key'])
+            if key not in cache:
+                cache[key] = [room['x'] >= 0,
+                              room['x'] + room['width'] <= CANVAS_WIDTH,
+                              room['y'] >= 0,
+                              room['y'] + room['height'] <= CANVAS_HEIGHT * SCALE_FACTOR]
+            constraints += cache[key] if lower_bounds else cache[key][1::2]
+        return constraints
+
+    def __separation_constraints(self, rooms, separation, cache):
+        """ Each pair of rooms must be separated vertically or horizontally """
+        separation_y = separation * SCALE_FACTOR
+        constraints = []
+        for i in range(len(rooms)):
+            for j in range(i + 1, len(rooms)):
+                room_i, room_j = rooms[i], rooms[j]
+                key = ('separation', room_i['key'], room_j['key'], separation)
+                if key not in cache:
+                    cache[key] = Or(
+                        room_j['y'] <= (room_i['y'] - room_j['height'] - separation_y),  # Above
+                        room_i['y'] <= (room_j['y'] - room_i['height'] - separation_y),  # Below
+                        room_j['x'] <= (room_i['x'] - room_j['width'] - separation),  # Left
+                        room_i['x'] <= (room_j['x'] - room_i['width'] - separation),  # Right
+                    )
+                constraints.append(cache[key])
+        return constraints
+
+    def __lines_constraints(self, rooms, genome_lines, cache):
+        """ Each room must lie along at least one of the lines of the genome """
+        lines = []
+        for i in range(SMT_LINES_NUMBER):
+            if genome_lines[i] is None:
+                continue
+            x1 = (self.__to_python(genome_lines[i].start[0]) - BORDER)
+            y1 = (self.__to_python(genome_lines[i].start[1]) - BORDER) * SCALE_FACTOR
+            x2 = (self.__to_python(genome_lines[i].end[0]) - BORDER)
+            y2 = (self.__to_python(genome_lines[i].end[1]) - BORDER) * SCALE_FACTOR
+
+            m_num = (y2 - y1)
+            if (x2 - x1) == 0:
+                m_den = 1
             else:
-                constraint += "And((rooms[i]['y'] >= " + str(line['m']) + "* (rooms[i]['x'] - " \
-                               + str(line['x2']) + "+" + str(LINEWIDTH) + ") +" + str(line['y2']) + "),\n"
-                constraint += "(rooms[i]['y'] <= " + str(line['m']) + "* (rooms[i]['x'] - " \
-                               + str(line['x2']) + "-" + str(LINEWIDTH) + "+" + str(rooms[i]['width']) + ")+" + str(line['y2']) + "),\n"
+                m_den = (x2 - x1)
+            # Separating numerator and denominator of slope causes significant slowdown, due to division
+            lines.append({'m': m_num / m_den, 'y1': y1, 'y2': y2, 'x1': x1, 'x2': x2})
+
+        if len(lines) == 0:
+            return []
+        constraints = []
+        for room in rooms:
+            along_lines = []
+            for line in lines:
+                key = ('line', room['key'], line['x1'], line['y1'], line['x2'], line['y2'])
+                if key not in cache:
+                    cache[key] = self.__line_constraint(room, line)
+                along_lines.append(cache[key])
+            constraints.append(Or(along_lines))
+        return constraints
+
+    def __line_constraint(self, room, line):
+        x, y = room['x'], room['y']
+        if line['m'] > 0:
+            along = [y <= line['m'] * (x - line['x2'] + LINEWIDTH) + line['y2'],
+                     y >= line['m'] * (x - line['x2'] - LINEWIDTH + room['width']) + line['y2']]
+        else:
+            along = [y >= line['m'] * (x - line['x2'] + LINEWIDTH) + line['y2'],
+                     y <= line['m'] * (x - line['x2'] - LINEWIDTH + room['width']) + line['y2']]
 
+        high_y, low_y = max(line['y1'], line['y2']), min(line['y1'], line['y2'])
+        # If the y range is too small for the room, use the x range instead
+        if high_y - room['height'] > low_y:
+            within = [y >= low_y, y <= high_y - room['height']]
+        else:
+            high_x, low_x = max(line['x1'], line['x2']), min(line['x1'], line['x2'])
+            within = [x >= low_x, x <= high_x - room['width']]
+        return And(*along, *within)
 
-            if line['y2'] > line['y1']:
-                high_y = line['y2']
-                low_y = line['y1']
-            else:
-                high_y = line['y1']
-                low_y = line['y2']
-
-            # check to see if y-height range is too small. If so, use x range instead
-            if high_y - rooms[i]['height'] > low_y:
-                # y range is fine
-                constraint += "(rooms[i]['y'] >= " + str(low_y) + "),\n"
-                constraint += "(rooms[i]['y'] <= " + str(high_y) + "-" + str(rooms[i]['height']) + ")),\n"
-            else:
-                # use x range
-                if line['x2'] > line['x1']:
-                    high_x = line['x2']
-                    low_x = line['x1']
-                else:
-                    high_x = line['x1']
-                    low_x = line['x2']
-                constraint += "(rooms[i]['x'] >= " + str(low_x) + "),\n"
-                constraint += "(rooms[i]['x'] <= " + str(high_x) + "-" + str(rooms[i]['width']) + ")),\n"
-
-            and_clause_count = and_clause_count + 4
-            or_clause_count = or_clause_count + 1
-        
-        constraint = constraint[:-2]
-        constraint += "\n)"
-        #print("Room: {}  Constraint: \n{}\n\n".format(i,constraint))
-        slv.add(eval(constraint))
-
-def init_all_constraints(slv, lines=None):
-    global timing_info
-    global and_clause_count, or_clause_count
-
-    and_clause_count = 0
-    or_clause_count = 0
-    begin = time.perf_counter()
-    all_begin = begin
-    create_canvas_constraints(slv)
-    end = time.perf_counter()
-    timing_info['create_canvas_constraints'] = end-begin
-
-
-    begin = time.perf_counter()
-    create_separation_constraints(slv)
-    end = time.perf_counter()
-    timing_info['create_separation_constraints'] = end - begin
-
-
-    if len(lines) >= 1:
-        begin = time.perf_counter()
-        create_lines_constraints(slv, lines)
-        end = time.perf_counter()
-        timing_info['create_control_line_constraints'] = end - begin
-
-    all_end = time.perf_counter()
-    timing_info['create_all_constraints'] = all_end - all_begin
-    #print("======")
-    #print("And clause count: {}".format(and_clause_count))
-    #print("Or clause count: {}".format(or_clause_count))
-
-def compute_room_centerpoints(m):
-    cp = []
-
-    for i in range(actual_number_of_rooms):
-        rooms[i]['center_x'] = m[rooms[i]['x']].as_long() + (rooms[i]['width']/2)
-        rooms[i]['center_y'] = m[rooms[i]['y']].as_long() + (rooms[i]['height']/2)
-        cp.append((rooms[i]['center_x'], rooms[i]['center_y']))
-        ##print("Centerpoint is: {}".format(cp))
-
-    return cp
-
-
-def distance(p1, p2):
-    return math.sqrt(pow(p2[0]-p1[0], 2) + pow((p2[1]-p1[1])/SCALE_FACTOR, 2))
-
-def create_graph_array(tri, cp):
-    """ Given a Delaunay triangulation, creates a matrix form of this, with edge weights as lengths """
-    graph = np.zeros((actual_number_of_rooms, actual_number_of_rooms))
-    ##print("graph is: {}".format(graph))
-
-    if tri is not None:
-        for t in tri.simplices:
-            graph[t[0]][t[1]] = distance(cp[t[0]], cp[t[1]])
-            graph[t[1]][t[2]] = distance(cp[t[1]], cp[t[2]])
-            graph[t[2]][t[0]] = distance(cp[t[2]], cp[t[0]])
-
-    ##print("graph is: {}".format(graph))
-    return graph
+    def __create_graph_array(self, tri, cp):
+        """ Given a Delaunay triangulation, creates a matrix form of this, with edge weights as lengths """
+        graph = np.zeros((len(cp), len(cp)))
+        if tri is not None:
+            for t in tri.simplices:
+                graph[t[0]][t[1]] = self.__distance(cp[t[0]], cp[t[1]])
+                graph[t[1]][t[2]] = self.__distance(cp[t[1]], cp[t[2]])
+                graph[t[2]][t[0]] = self.__distance(cp[t[2]], cp[t[0]])
+        return graph
+
+    @staticmethod
+    def __to_python(value):
+        # Values of the genome may be numpy scalars, which z3 doesn't accept
+        return value.item() if isinstance(value, np.generic) else value
+
+    @staticmethod
+    def __distance(p1, p2):
+        return math.sqrt(pow(p2[0]-p1[0], 2) + pow((p2[1]-p1[1])/SCALE_FACTOR, 2))
+
+
+# Shared by all the SMT genomes of the process
+DEFAULT_SOLVER = SMTLayoutSolver(SMT_SOLVER_TIMEOUT, incremental=SMT_INCREMENTAL_SOLVER, hint_timeout=SMT_HINT_TIMEOUT)
 
 def solve(genome):
-    global SEPARATION, SEPARATION_Y 
-    SEPARATION = genome.separation
-    SEPARATION_Y = SEPARATION * SCALE_FACTOR
-    
-    init_rooms(genome.rooms)
-    
-    solver = Solver()
-    solver.set('random_seed', 0)
-    solver.set(timeout=600)
-    init_all_constraints(solver, genome.lines)
-    
-    begin = time.perf_counter()
-    s = solver.check()
-    end = time.perf_counter()
-    #print(s)
-    #print("Solve time: {} ms".format((end-begin)*1000.))
-    
-    if s.r == Z3_L_TRUE:
-        begin = time.perf_counter()
-        model = solver.model()
-        center_points = compute_room_centerpoints(model)
-        tri = Delaunay(center_points)
-        end = time.perf_counter()
-        timing_info['delaunay_time'] = end - begin
-        
-        begin = time.perf_counter()
-        ar = create_graph_array(tri, center_points)
-        mst = minimum_spanning_tree(ar)
-        end = time.perf_counter()
-        timing_info['mst_time'] = end - begin
-        
-        update_timing()
-        
-        rooms_positions = []
-        for i in range(actual_number_of_rooms):
-            rooms_positions.append((model[rooms[i]['x']].as_long(), model[rooms[i]['y']].as_long()/SCALE_FACTOR))
-        
-        return rooms_positions, mst
-    else:
-        #print(f"No solution found with {len([room for room in genome.rooms if room is not None])} rooms and {len([line for line in genome.lines if line is not None])} lines with separation {SEPARATION}")
-        raise Exception("No solution found")
\ No newline at end of file
+    return DEFAULT_SOLVER.solve(genome)
@@ -1,6 +1,18 @@
+import os
+import threading
+
 import numpy as np
 import igraph as ig
-from numba import jit
+from numba import config, jit, prange, get_num_threads
+
+from internals.config import AVOID_TBB_THREADING_LAYER
+
+# The TBB threading layer of numba hangs the process when it exits if it was started by a thread other than the main
+# one, as Dask workers do, so it is only used if no other layer is available. The choice applies to the whole process,
+# so it is left alone if the threading layer was already configured.
+if AVOID_TBB_THREADING_LAYER and config.THREADING_LAYER == "default" and "NUMBA_THREADING_LAYER" not in os.environ \
+        and "NUMBA_THREADING_LAYER_PRIORITY" not in os.environ:
+    config.THREADING_LAYER_PRIORITY = ["omp", "workqueue", "tbb"]
 
 WALL_TILE = 0
 SPACE_TILE = 1
@@ -141,6 +153,111 @@ def create_visibility_matrix_DDA(graph, matrix, init=0, offset=0):
         visibility_matrix[x][y] = graph.degree(v) + offset
     return visibility_matrix
 
+# Compact DDA visibility: same graph of create_visibility_graph_DDA, but compiled with numba end to end. The checked
+# pairs are stored in a bitset over the upper triangle of the pairs matrix instead of a dense float matrix, and the
+# edges are returned as a NumPy array.
+
+@jit(nopython=True)
+def pair_bit_index(a, b, n):
+    # Index of the pair (a, b) in the packed upper triangle (diagonal included) of a n x n matrix
+    if a > b:
+        a, b = b, a
+    return a * (2 * n - a + 1) // 2 + (b - a)
+
+@jit(nopython=True)
+def test_and_set_pair(checked, a, b, n):
+    # Marks the pair as checked, returning whether it was already checked
+    bit = pair_bit_index(a, b, n)
+    word = bit >> 6
+    mask = np.uint64(1) << np.uint64(bit & 63)
+    was_set = (checked[word] & mask) != 0
+    checked[word] |= mask
+    return was_set
+
+@jit(nopython=True)
+def append_edge(edges, num_edges, a, b):
+    # Appends an edge, doubling the capacity of the array when needed
+    if num_edges == edges.shape[0]:
+        new_edges = np.empty((edges.shape[0] * 2, 2), dtype=edges.dtype)
+        new_edges[:num_edges] = edges[:num_edges]
+        edges = new_edges
+    edges[num_edges, 0] = a
+    edges[num_edges, 1] = b
+    return edges, num_edges + 1
+
+@jit(nopython=True)
+def compact_DDA_edges(matrix, coords, idx_map):
+    n = coords.shape[0]
+    checked = np.zeros((n * (n + 1) // 2 + 63) // 64, dtype=np.uint64)
+    edges = np.empty((max(16, n * 4), 2), dtype=np.int32)
+    num_edges = 0
+    for i in range(n):
+        for j in range(n - 1, i, -1):
+            bit = pair_bit_index(i, j, n)
+            if (checked[bit >> 6] >> np.uint64(bit & 63)) & np.uint64(1):
+                continue
+
+            x0, y0 = coords[i, 0], coords[i, 1]
+            x1, y1 = coords[j, 0], coords[j, 1]
+            dx = x1 - x0
+            dy = y1 - y0
+            steps = max(abs(dx), abs(dy))
+            xinc = dx / steps
+            yinc = dy / steps
+            x = float(x0)
+            y = float(y0)
+
+            # Walk the line, adding an edge between the start and every tile visible along it
+            visible = True
+            for _ in range(steps):
+                int_x, int_y = int(x), int(y)
+                if matrix[int_x, int_y] == WALL_TILE:
+                    visible = False
+                    break
+                new_point_idx = idx_map[int_x, int_y]
+                if not test_and_set_pair(checked, i, new_point_idx, n):
+                    edges, num_edges = append_edge(edges, num_edges, i, new_point_idx)
+                x = x + xinc
+                y = y + yinc
+
+            if visible:
+                test_and_set_pair(checked, i, j, n)
+                edges, num_edges = append_edge(edges, num_edges, i, j)
+    return edges[:num_edges].copy()
+
+def create_visibility_edges_DDA(map_matrix):
+    """
+    Computes the edges of the DDA visibility graph.
+
+    Returns:
+        coords (numpy.ndarray): (N, 2) array with the coordinates of the walkable tiles, in row-major order
+        edges (numpy.ndarray): (E, 2) int32 array of edges between indexes of coords
+    """
+    map_matrix = np.asarray(map_matrix)
+    coords = np.argwhere(map_matrix == SPACE_TILE)
+    idx_map = np.full(map_matrix.shape, -1, dtype=np.int32)
+    idx_map[coords[:, 0], coords[:, 1]] = np.arange(len(coords), dtype=np.int32)
+    edges = compact_DDA_edges(map_matrix, coords, idx_map)
+    return coords, edges
+
+def create_visibility_graph_DDA_compact(map_matrix):
+    coords, edges = create_visibility_edges_DDA(map_matrix)
+    return create_visibility_graph_from_edges(coords, edges)
+
+def create_visibility_graph_from_edges(coords, edges):
+    graph = ig.Graph()
+    graph.add_vertices(len(coords))
+    graph.vs["coords"] = coords
+    graph.add_edges(edges)
+    return graph
+
+def create_visibility_matrix_from_edges(coords, edges, matrix, init=0, offset=0):
+    # Same as create_visibility_matrix_DDA, computing the degrees directly from the edges (loops count twice)
+    degrees = np.bincount(edges.ravel(), minlength=len(coords))
+    visibility_matrix = np.full((len(matrix), len(matrix[0])), init)
+    visibility_matrix[coords[:, 0], coords[:, 1]] = degrees + offset
+    return visibility_matrix
+
 # Use grid-based visibility to check if a tile can see all other tiles
 
 # Note that this only works if WALL_TILE = 0 and SPACE_TILE = 1
@@ -170,4 +287,63 @@ def create_visibility_matrix_grid(map_matrix):
         for j in range(len(map_matrix[0])):
             if map_matrix[i][j] == SPACE_TILE:
                 visibility_matrix = np.add(visibility_matrix, grid_based_visibility(map_matrix, i, j))
-    return visibility_matrix
\ No newline at end of file
+    return visibility_matrix
+
+# Batched grid-based visibility: computes the same result as create_visibility_matrix_grid, but all sources are processed
+# in a single numba call, in parallel, without copying the map for each source and accumulating in place.
+
+@jit(nopython=True)
+def sweep_quadrant(matrix, scratch, accumulator, x0, y0, step_x, step_y, skip_row, skip_col):
+    # Same recurrence of visibility_from_corner, applied to the quadrant starting at (x0, y0) and moving by
+    # (step_x, step_y). The values are computed from the map directly into scratch, so no copy is needed.
+    # Tiles in the row (column) of the source are shared with another quadrant: they are only added to the accumulator
+    # if skip_row (skip_col) is False, so that each tile is counted exactly once.
+    len_x = matrix.shape[0] - x0 if step_x > 0 else x0 + 1
+    len_y = matrix.shape[1] - y0 if step_y > 0 else y0 + 1
+    for dx in range(len_x):
+        x = x0 + step_x * dx
+        for dy in range(len_y):
+            y = y0 + step_y * dy
+            if dx == 0 and dy == 0:
+                value = matrix[x, y]
+            elif dx == 0:
+                value = matrix[x, y] * ((dy * scratch[x, y - step_y]) / dy)
+            elif dy == 0:
+                value = matrix[x, y] * ((dx * scratch[x - step_x, y]) / dx)
+            else:
+                value = matrix[x, y] * ((dx * scratch[x - step_x, y] + dy * scratch[x, y - step_y]) / (dx + dy))
+            scratch[x, y] = value
+            if (dx == 0 and skip_row) or (dy == 0 and skip_col):
+                continue
+            if value >= 0.5:
+                accumulator[x, y] += 1.0
+
+# The workqueue threading layer can't run parallel functions from many threads at the same time, e.g. when Dask workers
+# are threads, so they are run by one thread at a time
+__parallel_lock = threading.Lock()
+
+@jit(nopython=True, parallel=True)
+def batched_grid_visibility(matrix, sources, visibility_matrix, n_chunks):
+    # Each chunk of sources has its own scratch and accumulator, which are summed at the end
+    partial = np.zeros((n_chunks, matrix.shape[0], matrix.shape[1]))
+    for c in prange(n_chunks):
+        scratch = np.empty(matrix.shape)
+        for s in range(c, sources.shape[0], n_chunks):
+            x0 = sources[s, 0]
+            y0 = sources[s, 1]
+            sweep_quadrant(matrix, scratch, partial[c], x0, y0, 1, 1, False, False)
+            sweep_quadrant(matrix, scratch, partial[c], x0, y0, -1, 1, True, False)
+            sweep_quadrant(matrix, scratch, partial[c], x0, y0, -1, -1, False, True)
+            sweep_quadrant(matrix, scratch, partial[c], x0, y0, 1, -1, True, True)
+    for c in range(n_chunks):
+        visibility_matrix += partial[c]
+
+def create_visibility_matrix_grid_batched(map_matrix):
+    map_matrix = np.asarray(map_matrix, dtype=float)
+    visibility_matrix = np.zeros(map_matrix.shape)
+    sources = np.argwhere(map_matrix == SPACE_TILE)
+    if len(sources) > 0:
+        n_chunks = max(1, min(get_num_threads(), len(sources)))
+        with __parallel_lock:
+            batched_grid_visibility(map_matrix, sources, visibility_matrix, n_chunks)
+    return visibility_matrix
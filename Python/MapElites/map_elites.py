@@ -2,6 +2,7 @@
 #TODO
 """
 import argparse
+import copy
 import json
 import os
 from pathlib import Path
@@ -28,13 +29,18 @@ import internals.smt_genome.mutation as smt_mutation
 import internals.smt_genome.generation as smt_generation
 import internals.graph_genome.generation as graph_generation
 import internals.evaluation as eval
+from internals.atomic_write import atomic_write
+from internals.genomes import genomes_as_solutions
+from internals.checkpoint import ARCHIVE_KEY, CHECKPOINT_FOLDER_NAME, LINEAGES_KEY, CheckpointLog, clear_checkpoint, get_elite_lineages, resume_checkpoint
+from internals.profiling import aggregate_profiles
+from internals.results_store import compact_results
 import matplotlib
 matplotlib.use('Agg')
-import matplotlib.pyplot as plt
+from matplotlib.figure import Figure
 import numpy as np
 import pandas as pd
 import tqdm
-from dask.distributed import Client, LocalCluster
+from dask.distributed import Client, LocalCluster, as_completed
 import pickle
 
 from ribs.archives import ArchiveDataFrame, GridArchive, SlidingBoundariesArchive
@@ -194,25 +200,38 @@ def create_scheduler(seed, emitter_type, representation, n_emitters, batch_size)
 def initialize_solutions(creation_function, n_solutions):
     x0 = []
     x0 = creation_function().to_array()
-    
-    solutions = []
-    for _ in range(n_solutions):
-        solutions.append(creation_function().to_array())
+
+    solutions = genomes_as_solutions([creation_function() for _ in range(n_solutions)])
 
     return x0, solutions
 
 
-def run_search(client: Client, scheduler: SchedulerLineage, representation, iterations, log_freq, folder_name, bot1_data, bot2_data, game_length=600):
-    """
-    #TODO
+def get_objective_and_measures(dataset, failed):
+    """Extracts the objective and the measures of an individual from its evaluation dataset.
+
+    Returns:
+        tuple: (objective, [measure_0, measure_1])
     """
-    print(
-        "> Starting search.\n"
-        "  - Open Dask's dashboard at http://localhost:8787 to monitor workers."
-    )
-    outdir = Path(os.path.join(MAP_ELITES_OUTPUT_FOLDER, folder_name))
+    if failed:
+        return 0 if conf.OBJECTIVE_RANGE[0] == None else conf.OBJECTIVE_RANGE[0], [0, 0]
+
+    if conf.MANUALLY_CHOOSE_FEATURES:
+        # Modify here to use a different/combination of features.
+        entropy = round(np.mean(dataset["entropy"]), 5)
+
+        balanceTopology = round(np.mean(dataset["balanceTopology"]), 5)
+        peripheryCenterBalance = round(np.mean(dataset["peripheryCenterBalance"]), 5)
+        pursueTime = round(np.mean(dataset["pursueTime"]), 5)
+        entropy = round(np.mean(dataset["entropy"]), 5)
+
+        return entropy, [balanceTopology, pursueTime]
+    else:
+        return round(np.mean(dataset[conf.OBJECTIVE_NAME]), 5), [round(np.mean(dataset[conf.MEASURES_NAMES[0]]), 5), round(np.mean(dataset[conf.MEASURES_NAMES[1]]), 5)]
+
 
-    metrics = {
+def init_metrics():
+    """Creates the empty metrics dictionary filled during the search."""
+    return {
         "Max Score": {
             "x": [],
             "y": [],
@@ -229,38 +248,36 @@ def run_search(client: Client, scheduler: SchedulerLineage, representation, iter
             "x": [0],
             "y": [0],
         },
+        # Mean time in seconds and largest memory in bytes of each stage of the evaluations since the previous log
+        "Stage Times": {
+            "x": [],
+            "y": [],
+        },
+        "Stage Memory": {
+            "x": [],
+            "y": [],
+        },
     }
-    num_failed = 0
+
+def run_search(client: Client, scheduler: SchedulerLineage, representation, iterations, log_freq, folder_name, bot1_data, bot2_data, game_length=600, checkpoint=None, resume_state=None):
+    """
+    #TODO
+    """
+    print(
+        "> Starting search.\n"
+        "  - Open Dask's dashboard at http://localhost:8787 to monitor workers."
+    )
+    outdir = Path(os.path.join(MAP_ELITES_OUTPUT_FOLDER, folder_name))
+
+    start_itr, metrics, num_failed, skip_existing = get_resume_state(resume_state)
+    # Profiles of the evaluations since the previous log
+    profiles = []
 
     start_time = time.time()
-    for itr in tqdm.trange(1, iterations + 1):
+    for itr in tqdm.trange(start_itr + 1, iterations + 1):
         # Request genomes from the scheduler.
         genotypes_sols = scheduler.ask()
         
-        match representation:
-            case constants.ALL_BLACK_NAME:
-                phenotypes = list(map(lambda geno: (ABGenome.array_as_genome(list(map(int, geno.tolist())))).phenotype(), genotypes_sols))
-            case constants.GRID_GRAPH_NAME:
-                phenotypes = list(map(lambda geno: (GraphGenome.array_as_genome(list(map(int, geno.tolist())))).phenotype(), genotypes_sols))
-            case constants.SMT_NAME:
-                genotypes = list(map(lambda geno: SMTGenome.array_as_genome(list(map(int, geno.tolist()))), genotypes_sols))
-                phenotypes = []
-                to_skip = []
-                for geno in genotypes:
-                    try:
-                        phenotypes.append(geno.phenotype())
-                        to_skip.append(False)
-                        #tqdm.tqdm.write("Phenotype created")
-                    except Exception as e:
-                        #tqdm.tqdm.write(str(e))
-                        phenotypes.append(None)
-                        to_skip.append(True)
-            case constants.POINT_NAME:
-                phenotypes = list(map(lambda geno: (PointGenome.array_as_genome(list(map(int, geno.tolist())))).phenotype(), genotypes_sols))
-            case constants.POINT_AD_NAME:
-                phenotypes = list(map(lambda geno: (PointAdGenome.array_as_genome(list(map(int, geno.tolist())))).phenotype(), genotypes_sols))
-        #tqdm.tqdm.write("Finished creating phenotypes")
-
         # Evaluate the genomes and record the objectives and measures.
         objs, meas = [], []
 
@@ -270,92 +287,264 @@ def run_search(client: Client, scheduler: SchedulerLineage, representation, iter
         # Remember if individual failed to evaluate
         failed_inds = []
 
-        # Ask the Dask client to distribute the simulations among the Dask
-        # workers, then gather the results of the simulations.
-        futures = []
+        # Ask the Dask client to distribute the phenotype creation and the simulations among the Dask workers, then
+        # gather the results of the simulations. The index of each solution is its individual number.
+        num_solutions = len(genotypes_sols)
         futures = client.map(
-            lambda p: 
-            #eval.test()
-            eval.evaluate(
-                p, 
-                itr -1, 
-                phenotypes.index(p), 
-                bot1_data, 
-                bot2_data,
-                game_length,
-                folder_name=folder_name
-                )
-            , phenotypes
+            eval.evaluate_solution,
+            list(genotypes_sols),
+            [representation] * num_solutions,
+            [itr - 1] * num_solutions,
+            range(num_solutions),
+            bot1_data=bot1_data,
+            bot2_data=bot2_data,
+            game_length=game_length,
+            folder_name=folder_name,
+            skip_existing=skip_existing,
+            pure=False,
         )
         results = client.gather(futures)
+        # Merge the results stored by the workers for this iteration, so that they can be read quickly
+        compact_results(folder_name, [itr - 1])
 
         # Process the results.
-        for idx, (dataset, failed) in enumerate(results):
-            if not failed:
-
-                if conf.MANUALLY_CHOOSE_FEATURES:
-                    # Modify here to use a different/combination of features.
-                    entropy = round(np.mean(dataset["entropy"]), 5)
-
-                    balanceTopology = round(np.mean(dataset["balanceTopology"]), 5)
-                    peripheryCenterBalance = round(np.mean(dataset["peripheryCenterBalance"]), 5)
-                    pursueTime = round(np.mean(dataset["pursueTime"]), 5)
-                    entropy = round(np.mean(dataset["entropy"]), 5)
-
-                    objs.append(entropy)
-                    meas.append([balanceTopology, pursueTime])
-                else:
-                    objs.append(round(np.mean(dataset[conf.OBJECTIVE_NAME]), 5))
-                    meas.append([round(np.mean(dataset[conf.MEASURES_NAMES[0]]), 5), round(np.mean(dataset[conf.MEASURES_NAMES[1]]), 5)])
-
-                itrs.append(itr-1)
-                inds.append(idx)
-                failed_inds.append(0)
-            else:
+        for idx, (dataset, failed, profile) in enumerate(results):
+            obj, mea = get_objective_and_measures(dataset, failed)
+            profiles.append(profile)
+            if failed:
                 num_failed += 1
-                objs.append(0 if conf.OBJECTIVE_RANGE[0] == None else conf.OBJECTIVE_RANGE[0])
-                meas.append([0, 0])
-                itrs.append(itr-1)
-                inds.append(idx)
-                failed_inds.append(1)
+            objs.append(obj)
+            meas.append(mea)
+            itrs.append(itr-1)
+            inds.append(idx)
+            failed_inds.append(1 if failed else 0)
         
         # Send the results back to the scheduler.
         scheduler.tell(objs, meas, iterations=itrs, individual_numbers=inds, failed=failed_inds)
+        if checkpoint is not None:
+            checkpoint.record(genotypes_sols, objs, meas, itrs, inds, failed_inds, get_elite_lineages(scheduler, genotypes_sols, meas))
 
         # Logging.
         if itr % log_freq == 0 or itr == iterations:
-            elapsed_time = time.time() - start_time
-            metrics["Max Score"]["x"].append(itr)
-            metrics["Max Score"]["y"].append(scheduler.archive.stats.obj_max)
-            metrics["Archive Size"]["x"].append(itr)
-            metrics["Archive Size"]["y"].append(len(scheduler.archive))
-            metrics["QD Score"]["x"].append(itr)
-            metrics["QD Score"]["y"].append(scheduler.archive.stats.qd_score)
-            metrics["Failed"]["x"].append(itr)
-            metrics["Failed"]["y"].append(num_failed)
-            tqdm.tqdm.write(
-                f"> {itr} itrs completed after {elapsed_time:.2f} s\n"
-                f"  - Max Score: {metrics['Max Score']['y'][-1]}\n"
-                f"  - Archive Size: {metrics['Archive Size']['y'][-1]}\n"
-                f"  - QD Score: {metrics['QD Score']['y'][-1]}\n"
-                f"  - Failed: {metrics['Failed']['y'][-1]}")
-            if conf.SAVE_INTERMEDIATE_RESULTS:
-                scheduler.archive.data(return_type="pandas").to_csv(outdir / "archive.csv")
-                save_ccdf(scheduler.archive, str(outdir / "archive_ccdf.png"))
-                save_heatmap(scheduler.archive, str(outdir / "heatmap.png"))
-                save_metrics(outdir, metrics)
-                plt.close('all')
-                lineage_table_file = open(os.path.join(outdir, 'lineages.pkl'), 'wb')
-                pickle.dump(scheduler.get_lineage_table(), lineage_table_file)
-                lineage_table_file.close()
-                archive_file = open(os.path.join(outdir, 'archive.pkl'), 'wb')
-                pickle.dump(scheduler.archive, archive_file)
-                archive_file.close()
+            log_metrics(scheduler, metrics, itr, num_failed, time.time() - start_time, outdir, checkpoint, itr == iterations, profiles=profiles)
+            profiles = []
 
 
     return metrics
 
 
+def run_search_async(client: Client, scheduler: SchedulerLineage, representation, iterations, log_freq, folder_name, bot1_data, bot2_data, game_length=600, checkpoint=None, resume_state=None):
+    """Asynchronous (steady-state) version of run_search.
+
+    Instead of waiting for the whole batch of every iteration, each emitter is asked separately and its solutions are
+    submitted to the Dask workers as soon as they are created. Every result is told to the scheduler as soon as it
+    arrives and, when all the solutions of an emitter have been evaluated, that emitter is asked for a new batch. This
+    way no worker waits for the slowest simulation of the batch.
+
+    Each emitter batch gets the iteration number it would have in run_search (one iteration every len(emitters)
+    batches), and individual numbers are assigned in order of submission within the iteration, so that experiment
+    names stay unique and results can be matched to their files regardless of the order in which they arrive.
+
+    When resuming, the batches that were still being evaluated when the snapshot was taken are submitted again with
+    their original iteration and individual numbers.
+    """
+    print(
+        "> Starting asynchronous search.\n"
+        "  - Open Dask's dashboard at http://localhost:8787 to monitor workers."
+    )
+    outdir = Path(os.path.join(MAP_ELITES_OUTPUT_FOLDER, folder_name))
+
+    start_itr, metrics, num_failed, skip_existing = get_resume_state(resume_state)
+    search_state = resume_state["search_state"] if resume_state is not None and resume_state["search_state"] is not None else {}
+
+    n_emitters = len(scheduler.emitters)
+    total_batches = iterations * n_emitters
+    told_batches = start_itr * n_emitters
+    asked_batches = search_state.get("asked_batches", told_batches)
+    # Next free individual number of each iteration
+    next_individual_numbers = search_state.get("next_individual_numbers", {})
+    # Maps each submitted future to (emitter_idx, batch_id, solution_idx, iteration, individual_number)
+    future_info = {}
+    # Solutions of the batches that have not been fully told yet
+    batch_solutions = {}
+    # Profiles of the evaluations since the previous log
+    profiles = []
+
+    def submit_solutions(emitter_idx, batch_id, solution_idxs, itr, first_ind):
+        futures = []
+        for solution_idx in solution_idxs:
+            ind = first_ind + solution_idx
+            future = client.submit(
+                eval.evaluate_solution,
+                batch_solutions[batch_id][solution_idx],
+                representation,
+                itr,
+                ind,
+                bot1_data,
+                bot2_data,
+                game_length,
+                folder_name=folder_name,
+                skip_existing=skip_existing,
+                pure=False,
+            )
+            future_info[future.key] = (emitter_idx, batch_id, solution_idx, itr, ind)
+            futures.append(future)
+        return futures
+
+    def submit_batch(emitter_idx):
+        nonlocal asked_batches
+        itr = asked_batches // n_emitters
+        asked_batches += 1
+        first_ind = next_individual_numbers.get(itr, 0)
+        batch_id, solutions = scheduler.ask_emitter(emitter_idx, info={"iteration": itr, "first_individual_number": first_ind})
+        next_individual_numbers[itr] = first_ind + len(solutions)
+        batch_solutions[batch_id] = solutions
+        return submit_solutions(emitter_idx, batch_id, list(range(len(solutions))), itr, first_ind)
+
+    start_time = time.time()
+    completed = as_completed()
+    # Batches restored from a snapshot
+    pending_batches = scheduler.get_pending_batches()
+    for batch_id, (emitter_idx, solutions, untold_idxs, info) in pending_batches.items():
+        batch_solutions[batch_id] = solutions
+        completed.update(submit_solutions(emitter_idx, batch_id, untold_idxs, info["iteration"], info["first_individual_number"]))
+    busy_emitters = set(emitter_idx for emitter_idx, _, _, _ in pending_batches.values())
+    for emitter_idx in range(n_emitters):
+        if emitter_idx not in busy_emitters and asked_batches < total_batches:
+            completed.update(submit_batch(emitter_idx))
+
+    progress = tqdm.tqdm(total=total_batches, initial=told_batches)
+    for future in completed:
+        emitter_idx, batch_id, solution_idx, itr, ind = future_info.pop(future.key)
+        dataset, failed, profile = future.result()
+        profiles.append(profile)
+
+        obj, mea = get_objective_and_measures(dataset, failed)
+        if failed:
+            num_failed += 1
+        emitter_done = scheduler.tell_single(batch_id, solution_idx, obj, mea, iterations=itr, individual_numbers=ind, failed=1 if failed else 0)
+        if checkpoint is not None:
+            solution = batch_solutions[batch_id][solution_idx]
+            checkpoint.record([solution], [obj], [mea], [itr], [ind], [1 if failed else 0], get_elite_lineages(scheduler, [solution], [mea]))
+        if not emitter_done:
+            continue
+        del batch_solutions[batch_id]
+
+        told_batches += 1
+        progress.update(1)
+        # Refill the workers with a new batch from the emitter that just finished.
+        if asked_batches < total_batches:
+            completed.update(submit_batch(emitter_idx))
+
+        # Logging, every time a full iteration worth of batches has been told.
+        if told_batches % n_emitters == 0:
+            itr_done = told_batches // n_emitters
+            if itr_done % log_freq == 0 or itr_done == iterations:
+                # Results of individuals that are still being evaluated are merged the next time
+                compact_results(folder_name, range(itr_done))
+                search_state = {"asked_batches": asked_batches, "next_individual_numbers": dict(next_individual_numbers)}
+                log_metrics(scheduler, metrics, itr_done, num_failed, time.time() - start_time, outdir, checkpoint, itr_done == iterations, search_state, profiles)
+                profiles = []
+    progress.close()
+
+    return metrics
+
+
+def get_resume_state(resume_state):
+    """Gets the iteration to start from, the metrics and the number of failed individuals of a search.
+
+    Args:
+        resume_state (dict): The state of the search to resume, as loaded from its checkpoint, or None for a new search.
+
+    Returns:
+        tuple: (start_iteration, metrics, num_failed, skip_existing), where skip_existing tells whether the
+        evaluations already completed by the resumed search should be reused.
+    """
+    if resume_state is None:
+        return 0, init_metrics(), 0, False
+    metrics = resume_state["metrics"] if resume_state["metrics"] is not None else init_metrics()
+    return resume_state["iteration"], metrics, resume_state["num_failed"], True
+
+
+def log_metrics(scheduler, metrics, itr, num_failed, elapsed_time, outdir, checkpoint=None, last=False, search_state=None, profiles=None):
+    """Records the current state of the archive in the metrics, prints it and, if enabled, saves the intermediate results.
+
+    Args:
+        scheduler (SchedulerLineage): The scheduler of the search.
+        metrics (dict): Metrics as output by run_search, updated in place.
+        itr (int): The number of completed iterations.
+        num_failed (int): The number of individuals that failed to evaluate so far.
+        elapsed_time (float): The time since the beginning of the search, in seconds.
+        outdir (Path): output directory for saving files.
+        checkpoint (CheckpointLog): If given, the results are appended to it, and the intermediate results are saved
+            only together with its snapshots, by its background thread.
+        last (bool): Whether this is the last iteration of the search.
+        search_state (dict): Other state of the search loop, saved with the snapshots to resume it.
+        profiles (list): The StageProfile of each evaluation since the previous log.
+    """
+    metrics["Max Score"]["x"].append(itr)
+    metrics["Max Score"]["y"].append(scheduler.archive.stats.obj_max)
+    metrics["Archive Size"]["x"].append(itr)
+    metrics["Archive Size"]["y"].append(len(scheduler.archive))
+    metrics["QD Score"]["x"].append(itr)
+    metrics["QD Score"]["y"].append(scheduler.archive.stats.qd_score)
+    metrics["Failed"]["x"].append(itr)
+    metrics["Failed"]["y"].append(num_failed)
+    tqdm.tqdm.write(
+        f"> {itr} itrs completed after {elapsed_time:.2f} s\n"
+        f"  - Max Score: {metrics['Max Score']['y'][-1]}\n"
+        f"  - Archive Size: {metrics['Archive Size']['y'][-1]}\n"
+        f"  - QD Score: {metrics['QD Score']['y'][-1]}\n"
+        f"  - Failed: {metrics['Failed']['y'][-1]}")
+    if profiles:
+        stage_times, stage_memory = aggregate_profiles(profiles)
+        metrics["Stage Times"]["x"].append(itr)
+        metrics["Stage Times"]["y"].append(stage_times)
+        metrics["Stage Memory"]["x"].append(itr)
+        metrics["Stage Memory"]["y"].append(stage_memory)
+        tqdm.tqdm.write(
+            f"  - Evaluation time: {sum(stage_times.values()):.2f} s per individual ("
+            + ", ".join(f"{name} {stage_time:.3f} s" for name, stage_time in stage_times.items()) + ")\n"
+            f"  - Evaluation memory: "
+            + ", ".join(f"{name} {memory / (1024 * 1024):.1f} MB" for name, memory in stage_memory.items()))
+    if conf.EVALUATION_CACHE:
+        cache_stats = eval.get_evaluation_cache().stats()
+        tqdm.tqdm.write(
+            f"  - Cache hit rate: {cache_stats['hit_rate']:.2%} ({cache_stats['hits']} hits, {cache_stats['misses']} misses, "
+            f"{cache_stats['entries']} entries, {cache_stats['size_bytes'] / (1024 * 1024):.1f} MB)")
+
+    if checkpoint is not None:
+        if not (last or checkpoint.snapshot_due(itr)):
+            checkpoint.flush(itr)
+            return
+        blobs = checkpoint.snapshot(itr, scheduler, metrics, num_failed, search_state)
+        if conf.SAVE_INTERMEDIATE_RESULTS:
+            # The background thread rebuilds the archive from the snapshot, so the search goes on while it is saved
+            archive_data, lineages_data, metrics = blobs[ARCHIVE_KEY], blobs[LINEAGES_KEY], copy.deepcopy(metrics)
+            checkpoint.submit(lambda: save_intermediate_results(pickle.loads(archive_data), metrics, outdir, archive_data, lineages_data))
+    elif conf.SAVE_INTERMEDIATE_RESULTS:
+        save_intermediate_results(scheduler.archive, metrics, outdir, pickle.dumps(scheduler.archive), pickle.dumps(scheduler.get_lineage_table()))
+
+
+def save_intermediate_results(archive, metrics, outdir, archive_data, lineages_data):
+    """Saves the archive, its plots, the metrics and the lineage table.
+
+    The plots are drawn on their own figures instead of through pyplot, so that this can run on the background thread
+    of the checkpoint log.
+
+    Args:
+        archive (ArchiveBase): The archive of the search.
+        archive_data (bytes): The pickled archive, saved as archive.pkl.
+        lineages_data (bytes): The pickled lineage table, saved as lineages.pkl.
+    """
+    save_ccdf(archive, str(outdir / "archive_ccdf.png"))
+    save_heatmap(archive, str(outdir / "heatmap.png"))
+    save_metrics(outdir, metrics)
+    archive.data(return_type="pandas").to_csv(outdir / "archive.csv")
+    for name, content in (('archive.pkl', archive_data), ('lineages.pkl', lineages_data)):
+        atomic_write(os.path.join(outdir, name), lambda f: f.write(content))
+
+
 def save_heatmap(archive, filename):
     """Saves a heatmap of the scheduler's archive to the filename.
 
@@ -363,7 +552,8 @@ def save_heatmap(archive, filename):
         archive (GridArchive): Archive with results from an experiment.
         filename (str): Path to an image file.
     """
-    fig, ax = plt.subplots(figsize=(8, 6))
+    fig = Figure(figsize=(8, 6))
+    ax = fig.subplots()
     match conf.ARCHIVE_TYPE:
         case constants.GRID_ARCHIVE_NAME:
             grid_archive_heatmap(archive, ax=ax, vmin=conf.OBJECTIVE_RANGE[0], vmax=conf.OBJECTIVE_RANGE[1])
@@ -384,8 +574,15 @@ def save_metrics(outdir, metrics):
     """
     # Plots.
     for metric in metrics:
-        fig, ax = plt.subplots()
-        ax.plot(metrics[metric]["x"], metrics[metric]["y"])
+        fig = Figure()
+        ax = fig.subplots()
+        if len(metrics[metric]["y"]) > 0 and isinstance(metrics[metric]["y"][0], dict):
+            # One area for each stage of the evaluations
+            stages = list(dict.fromkeys(name for values in metrics[metric]["y"] for name in values))
+            ax.stackplot(metrics[metric]["x"], [[values.get(name, 0) for values in metrics[metric]["y"]] for name in stages], labels=stages)
+            ax.legend(loc="upper left", fontsize="small")
+        else:
+            ax.plot(metrics[metric]["x"], metrics[metric]["y"])
         ax.set_title(metric)
         ax.set_xlabel("Iteration")
         fig.savefig(str(outdir / f"{metric.lower().replace(' ', '_')}.png"))
@@ -408,7 +605,8 @@ def save_ccdf(archive, filename):
         archive (GridArchive): Archive with results from an experiment.
         filename (str): Path to an image file.
     """
-    fig, ax = plt.subplots()
+    fig = Figure()
+    ax = fig.subplots()
     ax.hist(
         archive.data("objective"),
         50,  # Number of cells.
@@ -433,6 +631,7 @@ def evolve_maps(
                 game_length=600,
                 seed=None,
                 folder_name="test_directory",
+                resume=False,
                 ):
     """
     #TODO
@@ -453,8 +652,34 @@ def evolve_maps(
     importdir.mkdir(exist_ok=True)
     exportdir.mkdir(exist_ok=True)
 
+    if conf.EVALUATION_CACHE:
+        eval.get_evaluation_cache().reset_stats()
+
     scheduler = create_scheduler(seed, emitter_type, representation, n_emitters, batch_size)
-    metrics = run_search(client, scheduler, representation,iterations, log_freq, folder_name, bot1_data, bot2_data, game_length)
+
+    # Restore the archive, lineages, emitters and metrics of a previous run of the same experiment.
+    checkpoint_folder = os.path.join(outdir, CHECKPOINT_FOLDER_NAME)
+    resume_state = None
+    if resume:
+        if os.path.isdir(checkpoint_folder):
+            resume_state = resume_checkpoint(checkpoint_folder, scheduler)
+            scheduler = resume_state["scheduler"]
+            print(f"> Resuming search after iteration {resume_state['iteration']}.")
+        else:
+            print("> No checkpoint found, starting a new search.")
+    elif conf.CHECKPOINT:
+        # The checkpoint of a previous run of the same experiment is replaced by the one of the new search
+        clear_checkpoint(checkpoint_folder)
+
+    checkpoint = None
+    if conf.CHECKPOINT:
+        checkpoint = CheckpointLog(checkpoint_folder, start_iteration=resume_state["iteration"] if resume_state is not None else 0)
+    search = run_search_async if conf.ASYNC_SEARCH else run_search
+    try:
+        metrics = search(client, scheduler, representation,iterations, log_freq, folder_name, bot1_data, bot2_data, game_length, checkpoint=checkpoint, resume_state=resume_state)
+    finally:
+        if checkpoint is not None:
+            checkpoint.close()
 
     # Outputs.
     scheduler.archive.data(return_type="pandas").to_csv(outdir / "archive.csv")
@@ -468,6 +693,7 @@ if __name__ == "__main__":
 
     parser.add_argument("--workers", default=4, type=int, dest="workers")
     parser.add_argument("--is_test", default=False, type=bool, dest="is_test")
+    parser.add_argument("--resume", action="store_true", dest="resume")
 
     args = parser.parse_args(sys.argv[1:])
 
@@ -497,5 +723,6 @@ if __name__ == "__main__":
         client=client, 
         folder_name=conf.folder_name(args.is_test),
         game_length=conf.GAME_LENGTH,
+        resume=args.resume,
         )
     
\ No newline at end of file
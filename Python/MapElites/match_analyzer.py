@@ -1,3 +1,5 @@
+import hashlib
+import json
 import pickle
 import PIL
 import PIL.Image
@@ -17,7 +19,10 @@ import igraph as ig
 from matplotlib import cm
 from os import path
 from internals.constants import ANALYSIS_OUTPUT_FOLDER, GAME_DATA_FOLDER, MAP_ELITES_OUTPUT_FOLDER
+from internals.atomic_write import atomic_write
 from internals.evaluation import evaluate
+from internals.map_intermediates import load_topology_graph
+from internals.results_store import feature_ranges_by_file, load_mean_results
 from dask.distributed import Client, LocalCluster
 from internals import config as conf
 import tqdm
@@ -30,6 +35,7 @@ matplotlib.use('Agg')
 import seaborn as sns
 import networkx as nx
 from scipy.cluster.hierarchy import linkage, dendrogram
+from scipy.spatial.distance import pdist
 from sklearn.decomposition import PCA
 from sklearn.impute import SimpleImputer
 from sklearn.manifold import TSNE
@@ -497,17 +503,8 @@ def run_variance_analysis(
                 mean_dataset = pd.DataFrame([mean], columns=dataset.columns)
                 datasets.append(mean_dataset)
     else:
-        datasets = []
-        for num in tqdm.trange(0, num_repetitions):
-            final_result_name = f"final_results_{itr}_{num}"
-            try:
-                dataset = pd.read_json(os.path.join(exportdir, final_result_name + ".json"))
-                mean = dataset.mean()
-                mean_dataset = pd.DataFrame([mean], columns=dataset.columns)
-                datasets.append(mean_dataset)
-            except Exception as e:
-                #print(e)
-                continue
+        mean_results = load_mean_results(name, iterations=[itr])
+        datasets = [mean_results[mean_results.index.get_level_values("individual") < num_repetitions]]
     df = pd.concat(datasets)
     df.index = range(len(df))
     df.to_json(os.path.join(outdir, f"final_results_{name}.json"), orient="columns", indent=4)
@@ -604,17 +601,8 @@ def run_covariance_analysis(
         for idx, phenotype in enumerate(phenotypes):
             __save_map(os.path.join(mapsdir, f"phenotype_{name}_{idx}.png"), phenotypes[0].map_matrix())
     else:
-        datasets = []
-        for num in tqdm.trange(0, num_phenotypes):
-            final_result_name = f"final_results_{itr}_{num}"
-            try:
-                dataset = pd.read_json(os.path.join(exportdir, final_result_name + ".json"))
-                mean = dataset.mean()
-                mean_dataset = pd.DataFrame([mean], columns=dataset.columns)
-                datasets.append(mean_dataset)
-            except Exception as e:
-                #print(e)
-                continue
+        mean_results = load_mean_results(name, iterations=[itr])
+        datasets = [mean_results[mean_results.index.get_level_values("individual") < num_phenotypes]]
     df = pd.concat(datasets)
     imputer = SimpleImputer(strategy='mean')
     df = pd.DataFrame(imputer.fit_transform(df), columns=df.columns)
@@ -747,23 +735,28 @@ def get_feature_ranges(experiment_names, baseoutdir, to_compute=True):
     outdir = Path(path.join(baseoutdir, "feature_ranges"))
     outdir.mkdir(exist_ok=True)
     if to_compute:
-        datasets = []
+        # Ranges of each file of the results stores, reused for the files that did not change since they were computed
+        index_path = os.path.join(outdir, "feature_ranges_index.json")
+        try:
+            with open(index_path, "r") as f:
+                index = json.load(f)
+        except (FileNotFoundError, ValueError):
+            index = {}
+        mins, maxs = {}, {}
         for experiment_name in experiment_names:
             tqdm.tqdm.write(f"Processing {experiment_name}")
             exportdir = Path(os.path.join(GAME_DATA_FOLDER, "Export", experiment_name))
             exportdir.mkdir(exist_ok=True)
-            for iteration in tqdm.trange(0, 400):
-                for individual_number in range(0, 10):
-                    name = f"final_results_{iteration}_{individual_number}"
-                    try:
-                        dataset = pd.read_json(os.path.join(exportdir, name + ".json"))
-                        datasets.append(dataset)
-                    except:
-                        pass
-        df = pd.concat(datasets)
-
-        df_min = pd.DataFrame([df.min()], columns=df.columns)
-        df_max = pd.DataFrame([df.max()], columns=df.columns)
+            index[experiment_name] = feature_ranges_by_file(experiment_name, index.get(experiment_name))
+            for file_ranges in index[experiment_name].values():
+                for feature, value in file_ranges["min"].items():
+                    mins[feature] = min(mins[feature], value) if feature in mins else value
+                for feature, value in file_ranges["max"].items():
+                    maxs[feature] = max(maxs[feature], value) if feature in maxs else value
+        atomic_write(index_path, lambda f: json.dump(index, f), mode="w")
+
+        df_min = pd.DataFrame([mins])
+        df_max = pd.DataFrame([maxs])
         # Substitute features whose theoretical max and min are known
         #df_min["timeInFight1"] = 0
         #df_max["timeInFight1"] = 1200
@@ -841,8 +834,16 @@ def get_color_map(resolution = 500):
     color += X[:, :, None] * Y[:, :, None] * color_4[None, None, :]
     return color
 
-def get_graph(phenotype: Phenotype, rooms_only=False):
-    vornoi_graph, _, _ = phenotype.to_topology_graph_vornoi()
+# Parameters of the GL2Vec model that embeds the graphs of the maps in the t-SNE analysis
+GL2VEC_PARAMS = {"wl_iterations": 2, "dimensions": 128*5, "epochs": 10, "seed": 42, "min_count": 1, "attributed": True}
+# Iterations of the t-SNE optimization with early exaggeration, as done by scikit-learn
+TSNE_EXAGGERATION_ITERATIONS = 250
+
+def get_graph(phenotype: Phenotype, rooms_only=False, folder_name=None, experiment_name=None):
+    if folder_name is not None:
+        vornoi_graph, _, _ = load_topology_graph(folder_name, experiment_name, phenotype)
+    else:
+        vornoi_graph, _, _ = phenotype.to_topology_graph_vornoi()
     if rooms_only:
         vornoi_graph = to_rooms_only_graph(vornoi_graph)
     graph = nx.Graph()
@@ -853,6 +854,183 @@ def get_graph(phenotype: Phenotype, rooms_only=False):
     
     return graph
 
+def load_phenotype(experiment_name, iteration, individual_number):
+    with open(os.path.join(GAME_DATA_FOLDER, "Export", experiment_name, f"phenotype_{iteration}_{individual_number}.pkl"), 'rb') as phenotype_file:
+        return pickle.load(phenotype_file)
+
+def __write_array(file_path, array):
+    atomic_write(file_path, lambda f: np.save(f, array))
+
+def load_tsne_inputs(cachedir, experiment_names, num_experiment_iterations=400, use_stored_graphs=True, rooms_only=False):
+    """
+    Load the individuals of a set of experiments for the t-SNE analysis, with their flattened map matrices and the
+    GL2Vec embeddings of their graphs. Map matrices and embeddings are cached in cachedir, and are only computed again
+    if the phenotype of any individual changed, so that the analysis can be run again without loading every phenotype
+    and fitting GL2Vec again.
+
+    Args:
+        cachedir (Path): The directory of the cache of the set of experiments
+        experiment_names (list): The names of the experiments
+        num_experiment_iterations (int): The number of iterations of each experiment to load
+        use_stored_graphs (bool): If False, the graphs and the embeddings are computed again
+        rooms_only (bool): If True, only the rooms of the graphs are embedded
+
+    Returns:
+        tuple: (individuals, datasets, map_matrices, graph_embeddings) where individuals is the list of
+            (experiment_name, iteration, individual_number) of the individuals, datasets the mean results of the
+            individuals of each experiment, map_matrices a read-only memory-mapped (num_individuals, num_tiles) uint8
+            array and graph_embeddings a (num_individuals, dimensions) array
+    """
+    cachedir.mkdir(exist_ok=True)
+    manifest_path = os.path.join(cachedir, "manifest.json")
+    map_matrices_path = os.path.join(cachedir, "map_matrices.npy")
+    graph_embeddings_path = os.path.join(cachedir, "graph_embeddings.npy")
+
+    # The cache is valid if it was built from the same phenotype files, with the same parameters
+    mean_results = {}
+    phenotype_stamps = {}
+    for experiment_name in experiment_names:
+        exportdir = Path(os.path.join(GAME_DATA_FOLDER, "Export", experiment_name))
+        exportdir.mkdir(exist_ok=True)
+        mean_results[experiment_name] = load_mean_results(experiment_name, iterations=range(0, num_experiment_iterations))
+        stats = {entry.name: entry.stat() for entry in os.scandir(exportdir) if entry.name.startswith("phenotype_")}
+        for iteration, individual_number in mean_results[experiment_name].index:
+            stat = stats.get(f"phenotype_{iteration}_{individual_number}.pkl")
+            if stat is not None:
+                phenotype_stamps[f"{experiment_name}/{iteration}_{individual_number}"] = [stat.st_mtime_ns, stat.st_size]
+    params = {"gl2vec": GL2VEC_PARAMS, "rooms_only": rooms_only}
+    try:
+        with open(manifest_path, "r") as f:
+            manifest = json.load(f)
+    except (FileNotFoundError, ValueError):
+        manifest = None
+
+    # A cache whose arrays were removed is rebuilt, as if it was never written
+    cache_valid = manifest is not None and manifest["params"] == params and manifest["phenotypes"] == phenotype_stamps \
+        and os.path.exists(map_matrices_path) and os.path.exists(graph_embeddings_path)
+    if use_stored_graphs and cache_valid:
+        tqdm.tqdm.write(f"Loading {len(manifest['individuals'])} individuals from {cachedir}")
+        individuals = [tuple(individual) for individual in manifest["individuals"]]
+        graph_embeddings = np.load(graph_embeddings_path)
+    else:
+        # The manifest is written last, so the cache is never valid while its files are being replaced
+        if manifest is not None:
+            os.remove(manifest_path)
+        individuals = []
+        phenotypes = []
+        graphs = []
+        for experiment_name in experiment_names:
+            tqdm.tqdm.write(f"Processing {experiment_name}")
+            exportdir = Path(os.path.join(GAME_DATA_FOLDER, "Export", experiment_name))
+            for iteration, individual_number in tqdm.tqdm(mean_results[experiment_name].index):
+                try:
+                    phenotype = load_phenotype(experiment_name, iteration, individual_number)
+                except Exception as e:
+                    continue
+                graph_file_path = os.path.join(exportdir, f"graph_{iteration}_{individual_number}.pkl")
+                try:
+                    if not use_stored_graphs:
+                        raise Exception("Force recomputation")
+                    with open(graph_file_path, 'rb') as graph_file:
+                        graph = pickle.load(graph_file)
+                except Exception as e:
+                    graph = get_graph(phenotype, rooms_only, experiment_name, f"{iteration}_{individual_number}")
+                    # Save pickle
+                    with open(graph_file_path, 'wb') as f:
+                        pickle.dump(graph, f)
+                individuals.append((experiment_name, int(iteration), int(individual_number)))
+                phenotypes.append(phenotype)
+                graphs.append(graph)
+
+        # Maps smaller than the largest one are padded with walls
+        map_matrices = np.zeros((len(phenotypes), max((p.mapWidth * p.mapHeight for p in phenotypes), default=0)), dtype=np.uint8)
+        for i, phenotype in enumerate(phenotypes):
+            map_matrix = phenotype.map_matrix().ravel()
+            map_matrices[i, :len(map_matrix)] = map_matrix
+        __write_array(map_matrices_path, map_matrices)
+        del map_matrices
+
+        #graph2vec = Graph2Vec(dimensions=128*5, wl_iterations=2, attributed=True, seed=42, min_count=1)
+        #graph2vec.fit(graphs)
+        #graph2vec_embeddings = graph2vec.get_embedding()
+
+        gl2vec = GL2Vec(**GL2VEC_PARAMS)
+        gl2vec.fit(graphs)
+        graph_embeddings = gl2vec.get_embedding()
+        __write_array(graph_embeddings_path, graph_embeddings)
+
+        atomic_write(manifest_path, lambda f: json.dump({"params": params, "phenotypes": phenotype_stamps,
+                                                         "individuals": individuals}, f), mode="w")
+
+    map_matrices = np.load(map_matrices_path, mmap_mode="r")
+    datasets = []
+    for experiment_name in experiment_names:
+        loaded = [(iteration, individual_number) for name, iteration, individual_number in individuals if name == experiment_name]
+        datasets.append(mean_results[experiment_name].loc[loaded])
+    return individuals, datasets, map_matrices, graph_embeddings
+
+def compute_tsne(cachedir, name, data, perplexities, tsne_iterations=2000, fast_tsne=False):
+    """
+    Compute the 2D t-SNE of some data for each perplexity. Points are cached in cachedir, keyed by a digest of the data,
+    so that only the perplexities that were never computed for the same data are computed when the analysis is run
+    again.
+
+    scikit-learn is used by default. With fast_tsne, openTSNE is used instead: it is initialized with PCA as
+    scikit-learn is, and the nearest neighbours of the points are searched once for the largest perplexity and reused to
+    compute the affinities of the others.
+
+    Args:
+        cachedir (Path): The directory of the cache
+        name (str): The name of the data in the cache
+        data (array-like): (num_points, num_dimensions) data
+        perplexities (list): The perplexities of the t-SNE
+        tsne_iterations (int): The number of iterations of the optimization, including the early exaggeration
+        fast_tsne (bool): If True, openTSNE is used
+
+    Returns:
+        dict: The (num_points, 2) points of the t-SNE with each perplexity
+    """
+    array = np.ascontiguousarray(data)
+    digest = hashlib.sha1(repr((array.shape, array.dtype.str)).encode())
+    digest.update(array.view(np.uint8))
+    method = "opentsne" if fast_tsne else "sklearn"
+    prefix = f"tsne_{name}_{method}_"
+    prefix_digest = f"{prefix}{digest.hexdigest()[:16]}_"
+    # Points of data that changed are never used again
+    for entry in os.scandir(cachedir):
+        if entry.name.startswith(prefix) and not entry.name.startswith(prefix_digest):
+            os.remove(entry.path)
+
+    points = {}
+    missing = []
+    for perplexity in perplexities:
+        try:
+            points[perplexity] = np.load(os.path.join(cachedir, f"{prefix_digest}p{perplexity}_i{tsne_iterations}.npy"))
+        except (FileNotFoundError, ValueError):
+            missing.append(perplexity)
+    if fast_tsne and len(missing) > 0:
+        # openTSNE is only needed for the fast path
+        import openTSNE
+        array = array.astype(np.float32, copy=False)
+        affinities = openTSNE.affinity.PerplexityBasedNN(array, perplexity=max(missing), n_jobs=-1, random_state=42)
+        initialization = openTSNE.initialization.pca(array, random_state=42)
+    for perplexity in missing:
+        tqdm.tqdm.write(f"Computing t-SNE of {name} with perplexity {perplexity}")
+        if fast_tsne:
+            affinities.set_perplexity(perplexity)
+            tsne = openTSNE.TSNE(
+                n_iter=tsne_iterations - TSNE_EXAGGERATION_ITERATIONS,
+                early_exaggeration_iter=TSNE_EXAGGERATION_ITERATIONS,
+                n_jobs=-1,
+                random_state=42
+            )
+            points[perplexity] = np.asarray(tsne.fit(affinities=affinities, initialization=initialization))
+        else:
+            tsne = TSNE(n_components=2, random_state=42, perplexity=perplexity, max_iter=tsne_iterations)
+            points[perplexity] = tsne.fit_transform(data)
+        __write_array(os.path.join(cachedir, f"{prefix_digest}p{perplexity}_i{tsne_iterations}.npy"), points[perplexity])
+    return points
+
 def tsne_analysis(
         client: Client, 
         baseoutdir, 
@@ -864,72 +1042,20 @@ def tsne_analysis(
         visualize_tsne_img=False,
         visualize_tsne_graph=False,
         use_stored_graphs=True,
-        rooms_only=False
+        rooms_only=False,
+        fast_tsne=False
         ):
     exportdir = Path(os.path.join(GAME_DATA_FOLDER, "Export", final_result_name))
     exportdir.mkdir(exist_ok=True)
+    cachedir = Path(os.path.join(exportdir, "tsne_cache"))
     outdir = Path(path.join(baseoutdir, final_result_name))
     outdir.mkdir(exist_ok=True)
     outdirsub = Path(path.join(outdir, "specific_features"))
     outdirsub.mkdir(exist_ok=True)
 
     # Load all datasets
-    datasets = []
-    phenotypes = []
-    graphs = []
+    individuals, datasets, map_matrices, graph_embeddings = load_tsne_inputs(cachedir, experiment_names, num_experiment_iterations, use_stored_graphs, rooms_only)
     graph_images = []
-    for experiment_name in experiment_names:
-        tqdm.tqdm.write(f"Processing {experiment_name}")
-        exportdir = Path(os.path.join(GAME_DATA_FOLDER, "Export", experiment_name))
-        exportdir.mkdir(exist_ok=True)
-        for iteration in tqdm.trange(0, num_experiment_iterations):
-            for individual_number in range(0, 10):
-                final_result_name = f"final_results_{iteration}_{individual_number}"
-                phenotype_name = f"phenotype_{iteration}_{individual_number}"
-                graph_name = f"graph_{iteration}_{individual_number}"
-                try:
-                    dataset = pd.read_json(os.path.join(exportdir, final_result_name + ".json"))
-                    mean = dataset.mean()
-                    mean_dataset = pd.DataFrame([mean], columns=dataset.columns)
-                    phenotype_file = open(os.path.join(exportdir, phenotype_name + '.pkl'), 'rb')
-                    phenotype = pickle.load(phenotype_file)
-                    phenotype_file.close()
-                    datasets.append(mean_dataset)
-                    phenotypes.append(phenotype)
-                except Exception as e:
-                    #print(e)
-                    continue
-                try:
-                    if not use_stored_graphs:
-                        raise Exception("Force recomputation")
-                    graph_file = open(os.path.join(exportdir, graph_name + '.pkl'), 'rb')
-                    graph = pickle.load(graph_file)
-                    graph_file.close()
-                    graphs.append(graph)
-                except Exception as e:
-                    graph = get_graph(phenotype, rooms_only)
-                    graphs.append(graph)
-                    # Save pickle
-                    with open(os.path.join(exportdir, graph_name + '.pkl'), 'wb') as f:
-                        pickle.dump(graph, f)
-                #try:
-                #    if not use_stored_graphs:
-                #        raise Exception("Force recomputation")
-                #    graph_image_file = os.path.join(exportdir, graph_name + '_image.png')
-                #    graph_image = PIL.Image.open(graph_image_file)
-                #    graph_images.append(graph_image)
-                #except Exception as e:
-                #    fig, ax = plot_graph_vornoi(phenotype, rooms_only, show=False)
-                #    graph_image_file = os.path.join(exportdir, graph_name + '_image.png')
-                #    fig.savefig(graph_image_file, format='png', dpi=300)
-                #    image = PIL.Image.frombytes('RGB', fig.canvas.get_width_height(), fig.canvas.buffer_rgba())
-                #    graph_images.append(image)
-
-                # If last inserted graph has no node, remove phenotype
-                #if len(graph.nodes) == 0:
-                #    phenotypes.pop()
-                #    datasets.pop()
-                #    graphs.pop()
     df = pd.concat(datasets)
     column = features_final.copy()
     # Remove balanceTopology
@@ -938,40 +1064,33 @@ def tsne_analysis(
     # Substitute NaN values with the mean of the column
     imputer = SimpleImputer(strategy='mean')
     df = pd.DataFrame(imputer.fit_transform(df), columns=df.columns)
-    phenotypes_flat = [phenotype.map_matrix().flatten() for phenotype in phenotypes]
-    df_phenotypes = pd.DataFrame(phenotypes_flat)
 
-    #graph2vec = Graph2Vec(dimensions=128*5, wl_iterations=2, attributed=True, seed=42, min_count=1)  
-    #graph2vec.fit(graphs)
-    #graph2vec_embeddings = graph2vec.get_embedding()
-    #df_graph_embeddings = pd.DataFrame(graph2vec_embeddings)
-
-    gl2vec = GL2Vec(wl_iterations=2, dimensions=128*5, epochs=10, seed=42, min_count=1, attributed=True)
-    gl2vec.fit(graphs)
-    gl2vec_embeddings = gl2vec.get_embedding()
-    df_graph_embeddings = pd.DataFrame(gl2vec_embeddings)
+    # Compute t-SNE for features, image similarity and graph similarity
+    df_graph_embeddings = pd.DataFrame(graph_embeddings)
+    points_feat_by_perplexity = compute_tsne(cachedir, "features", df, perplexities, tsne_iterations, fast_tsne)
+    points_img_by_perplexity = compute_tsne(cachedir, "img", map_matrices, perplexities, tsne_iterations, fast_tsne)
+    points_graph_by_perplexity = compute_tsne(cachedir, "graph", df_graph_embeddings, perplexities, tsne_iterations, fast_tsne)
 
     # Get color map for 2D visualization
     color_map_resolution = 500
     color_map = get_color_map(color_map_resolution)
 
+    # Pairs of points compared by the distance analysis, in the order of pdist
+    pairs_i, pairs_j = np.triu_indices(len(df), 1)
+
     for perplexity in perplexities:
-        # Compute t-SNE for features
-        tsne = TSNE(n_components=2, random_state=42, perplexity=perplexity, max_iter=tsne_iterations)
-        points_feat = tsne.fit_transform(df)
-        
+        points_feat = points_feat_by_perplexity[perplexity]
+
         # get minimum X and Y values and max
         min_x = np.min(points_feat[:, 0])
         min_y = np.min(points_feat[:, 1])
         max_x = np.max(points_feat[:, 0])
         max_y = np.max(points_feat[:, 1])
 
-        # Assign to each point a color based on the 2D color map
-        colors = np.zeros((len(points_feat), 3))
-        for i, point in enumerate(points_feat):
-            x = int((point[0] - min_x) / (max_x - min_x) * color_map_resolution - 1)
-            y = int((point[1] - min_y) / (max_y - min_y) * color_map_resolution - 1)
-            colors[i] = color_map[x, y]
+        # Assign to each point a color based on the 2D color map, truncating the coordinates as int() does
+        x = ((points_feat[:, 0] - min_x) / (max_x - min_x) * color_map_resolution - 1).astype(int)
+        y = ((points_feat[:, 1] - min_y) / (max_y - min_y) * color_map_resolution - 1).astype(int)
+        colors = color_map[x, y]
 
         plt.scatter(points_feat[:, 0], points_feat[:, 1], s=1, c=colors)
         plt.annotate(f"t-SNE with features. Perplexity: {perplexity}", (0.5, 1.05), xycoords='axes fraction', ha='center', va='bottom')
@@ -979,9 +1098,7 @@ def tsne_analysis(
         plt.clf()
         plt.close()
 
-        # Compute t-SNE for image similarity
-        tsne = TSNE(n_components=2, random_state=42, perplexity=perplexity, max_iter=tsne_iterations)
-        points_img = tsne.fit_transform(df_phenotypes)
+        points_img = points_img_by_perplexity[perplexity]
 
         #Scatter point by giving them a color corresponding to the 2D color map based on points feat positions
         fig, ax = plt.subplots()
@@ -1000,7 +1117,7 @@ def tsne_analysis(
                         min_dist = dist
                         min_idx = idx
                 # Plot show map of closest point
-                phenotype = phenotypes[min_idx]
+                phenotype = load_phenotype(*individuals[min_idx])
                 fig, ax = plt.subplots()
                 ax.axis('off')
                 plt.imshow(phenotype.map_matrix(inverted=True), cmap='gray')
@@ -1012,12 +1129,10 @@ def tsne_analysis(
         plt.clf()
         plt.close()
 
-        # Compute t-SNE for graph similarity
         fig, ax = plt.subplots()
-        tsne = TSNE(n_components=2, random_state=42, perplexity=perplexity, max_iter=tsne_iterations)
-        
+        points_graph = points_graph_by_perplexity[perplexity]
+
         #Scatter point by giving them a color corresponding to the 2D color map based on points feat positions
-        points_graph = tsne.fit_transform(df_graph_embeddings)
         plt.scatter(points_graph[:, 0], points_graph[:, 1], s=1, c=colors)
         plt.annotate(f"t-SNE with graphs. Color represents position in t-SNE with features. Perplexity: {perplexity}", (0.5, 1.05), xycoords='axes fraction', ha='center', va='bottom')
         plt.savefig(os.path.join(outdir, f"{name}_graph_p{perplexity}.png"), format='png', dpi=300)
@@ -1034,7 +1149,7 @@ def tsne_analysis(
                         min_dist = dist
                         min_idx = idx
                 # Plot show map of closest point
-                phenotype = phenotypes[min_idx]
+                phenotype = load_phenotype(*individuals[min_idx])
                 plot_graph_vornoi(phenotype, rooms_only)
             cid = fig.canvas.mpl_connect('button_press_event', onclick)
             plt.show()
@@ -1081,12 +1196,9 @@ def tsne_analysis(
             plt.close()
         
         # Visualize difference in distance for the feature and graph tsne
-        distances_tsne_features = []
-        distances_tsne_graph = []
-        for i in range(len(df)):
-            for j in range(i+1, len(df)):
-                distances_tsne_features.append(np.linalg.norm(points_feat[i] - points_feat[j]))
-                distances_tsne_graph.append(np.linalg.norm(points_graph[i] - points_graph[j]))
+        distances_tsne_features = pdist(points_feat)
+        distances_tsne_graph = pdist(points_graph)
+        distances_tsne_img = pdist(points_img)
         plt.gcf().set_size_inches(18, 14) 
         plt.scatter(distances_tsne_features, distances_tsne_graph, s=0.1)
         plt.xlabel("Distance in Feature t-SNE", fontsize=20)
@@ -1096,10 +1208,6 @@ def tsne_analysis(
         plt.close()
 
         # Visualize difference in distance for the feature and img tsne
-        distances_tsne_img = []
-        for i in range(len(df)):
-            for j in range(i+1, len(df)):
-                distances_tsne_img.append(np.linalg.norm(points_img[i] - points_img[j]))
         plt.gcf().set_size_inches(18, 14) 
         plt.scatter(distances_tsne_features, distances_tsne_img, s=0.1)
         plt.xlabel("Distance in Feature t-SNE", fontsize=20)
@@ -1109,12 +1217,6 @@ def tsne_analysis(
         plt.close()
 
         # Visualize difference in distance for the img and graph tsne
-        distances_tsne_img = []
-        distances_tsne_graph = []
-        for i in range(len(df)):
-            for j in range(i+1, len(df)):
-                distances_tsne_img.append(np.linalg.norm(points_img[i] - points_img[j]))
-                distances_tsne_graph.append(np.linalg.norm(points_graph[i] - points_graph[j]))
         plt.gcf().set_size_inches(18, 14) 
         plt.scatter(distances_tsne_img, distances_tsne_graph, s=0.1)
         plt.xlabel("Distance in Image t-SNE", fontsize=20)
@@ -1140,10 +1242,8 @@ def tsne_analysis(
         column_main = features_final.copy()
         column_main.remove('balanceTopology')
         for feature in column_main:
-            differences_feature = []
-            for i in range(len(df)):
-                for j in range(i+1, len(df)):
-                    differences_feature.append(df[feature][i] - df[feature][j])
+            values = df[feature].to_numpy()
+            differences_feature = values[pairs_i] - values[pairs_j]
 
             plt.gcf().set_size_inches(18, 14)
             plt.scatter(differences_feature, distances_tsne_graph, s=0.02)
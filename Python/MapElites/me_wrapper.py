@@ -40,7 +40,8 @@ if __name__ == "__main__":
     else:
         analyze_archive(
             representation=conf.REPRESENTATION_NAME,
-            folder_name=conf.folder_name(False)
+            folder_name=conf.folder_name(False),
+            client=client
         )
 
     conf.REPRESENTATION_NAME = constants.GRID_GRAPH_NAME
@@ -61,7 +62,8 @@ if __name__ == "__main__":
     else:
         analyze_archive(
             representation=conf.REPRESENTATION_NAME,
-            folder_name=conf.folder_name(False)
+            folder_name=conf.folder_name(False),
+            client=client
         )        
     
     conf.REPRESENTATION_NAME = constants.POINT_AD_NAME
@@ -82,7 +84,8 @@ if __name__ == "__main__":
     else:
         analyze_archive(
             representation=conf.REPRESENTATION_NAME,
-            folder_name=conf.folder_name(False)
+            folder_name=conf.folder_name(False),
+            client=client
         )
     
     conf.REPRESENTATION_NAME = constants.SMT_NAME
@@ -103,5 +106,6 @@ if __name__ == "__main__":
     else:
         analyze_archive(
             representation=conf.REPRESENTATION_NAME,
-            folder_name=conf.folder_name(False)
+            folder_name=conf.folder_name(False),
+            client=client
         )
\ No newline at end of file
@@ -9,6 +9,7 @@ from matplotlib import cm
 from os import path
 from internals.constants import ANALYSIS_OUTPUT_FOLDER, GAME_DATA_FOLDER, MAP_ELITES_OUTPUT_FOLDER
 from internals.evaluation import evaluate
+from internals.results_store import load_mean_results
 from dask.distributed import Client, LocalCluster
 from internals import config as conf
 import tqdm
@@ -83,7 +84,7 @@ def run_analysis(name, itr, genopme_type, feature_ranges, num_parallel_simulatio
         results = client.gather(futures)
 
         datasets = []
-        for idx, (dataset, failed) in enumerate(results):
+        for idx, (dataset, failed, _) in enumerate(results):
             if failed:
                 print(f"Failed to evaluate phenotype {idx}")
             else:
@@ -92,17 +93,8 @@ def run_analysis(name, itr, genopme_type, feature_ranges, num_parallel_simulatio
                 datasets.append(mean_dataset)
 
     else:
-        datasets = []
-        for num in tqdm.trange(0, num_phenotypes):
-            final_result_name = f"final_results_{itr}_{num}"
-            try:
-                dataset = pd.read_json(os.path.join(exportdir, final_result_name + ".json"))
-                mean = dataset.mean()
-                mean_dataset = pd.DataFrame([mean], columns=dataset.columns)
-                datasets.append(mean_dataset)
-            except Exception as e:
-                #print(e)
-                continue
+        mean_results = load_mean_results(name, iterations=[itr])
+        datasets = [mean_results[mean_results.index.get_level_values("individual") < num_phenotypes]]
     
     df = pd.concat(datasets)
     df.index = range(len(df))
@@ -0,0 +1,29 @@
+import os
+
+import pytest
+
+from internals.atomic_write import atomic_write
+
+
+def test_replaces_file(tmp_path):
+    path = os.path.join(tmp_path, "file.txt")
+    assert atomic_write(path, lambda f: f.write("first"), mode="w") == len("first")
+    atomic_write(path, lambda f: f.write(b"second"))
+    with open(path) as f:
+        assert f.read() == "second"
+    assert os.listdir(tmp_path) == ["file.txt"]
+
+
+def test_failed_write_keeps_previous_file(tmp_path):
+    path = os.path.join(tmp_path, "file.txt")
+    atomic_write(path, lambda f: f.write("first"), mode="w")
+
+    def fail(f):
+        f.write("partial")
+        raise RuntimeError("Write failed")
+
+    with pytest.raises(RuntimeError):
+        atomic_write(path, fail, mode="w")
+    with open(path) as f:
+        assert f.read() == "first"
+    assert os.listdir(tmp_path) == ["file.txt"]
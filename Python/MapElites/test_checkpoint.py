@@ -0,0 +1,128 @@
+import os
+import pickle
+import random
+
+import numpy as np
+
+import internals.constants as constants
+from internals.checkpoint import ARCHIVE_KEY, LINEAGES_KEY, CheckpointLog, chunk_path, clear_checkpoint, get_elite_lineages, \
+    load_checkpoint, resume_checkpoint, snapshot_path
+from map_elites import create_scheduler
+
+BATCH_SIZE = 4
+
+
+def new_scheduler():
+    return create_scheduler(0, constants.ALL_BLACK_EMITTER_NAME, constants.ALL_BLACK_NAME, 1, BATCH_SIZE)
+
+
+def run_iterations(scheduler, checkpoint, start, end, snapshot_itrs=()):
+    """Tell random results to the scheduler, flushing the checkpoint at every iteration"""
+    asked = []
+    for itr in range(start + 1, end + 1):
+        solutions = scheduler.ask()
+        asked.append(solutions)
+        objs = np.random.uniform(0, 1, len(solutions)).tolist()
+        meas = [[random.uniform(0, 1), random.uniform(0, 40)] for _ in solutions]
+        itrs, inds, failed = [itr - 1] * len(solutions), list(range(len(solutions))), [0] * len(solutions)
+        scheduler.tell(objs, meas, iterations=itrs, individual_numbers=inds, failed=failed)
+        checkpoint.record(solutions, objs, meas, itrs, inds, failed, get_elite_lineages(scheduler, solutions, meas))
+        if itr in snapshot_itrs:
+            checkpoint.snapshot(itr, scheduler, {"itr": itr}, 0)
+        else:
+            checkpoint.flush(itr)
+    return asked
+
+
+def archive_data(archive):
+    data = archive.data()
+    order = np.argsort(data["index"])
+    return {name: values[order] for name, values in data.items()}
+
+
+def assert_same_archive(archive, other):
+    data, other_data = archive_data(archive), archive_data(other)
+    assert data.keys() == other_data.keys()
+    for name in data:
+        assert np.array_equal(data[name], other_data[name])
+
+
+def test_load_replays_chunks_after_snapshot(tmp_path):
+    scheduler = new_scheduler()
+    checkpoint = CheckpointLog(str(tmp_path), snapshot_freq=2)
+    run_iterations(scheduler, checkpoint, 0, 5, snapshot_itrs=(2,))
+    checkpoint.close()
+
+    state = load_checkpoint(str(tmp_path))
+    assert state["iteration"] == 5
+    assert state["metrics"] == {"itr": 2}
+    assert_same_archive(state["scheduler"].archive, scheduler.archive)
+    assert state["scheduler"].get_lineage_table() == scheduler.get_lineage_table()
+
+    state = load_checkpoint(str(tmp_path), iteration=3)
+    assert state["iteration"] == 3
+    assert len(state["scheduler"].archive) <= len(scheduler.archive)
+
+
+def test_snapshot_compacts_log(tmp_path):
+    scheduler = new_scheduler()
+    checkpoint = CheckpointLog(str(tmp_path), snapshot_freq=2)
+    run_iterations(scheduler, checkpoint, 0, 3)
+    blobs = checkpoint.snapshot(4, scheduler, {}, 0)
+    checkpoint.close()
+
+    assert sorted(os.listdir(str(tmp_path))) == [os.path.basename(snapshot_path(str(tmp_path), 4))]
+    assert_same_archive(pickle.loads(blobs[ARCHIVE_KEY]), scheduler.archive)
+    assert pickle.loads(blobs[LINEAGES_KEY]) == scheduler.get_lineage_table()
+    state = load_checkpoint(str(tmp_path))
+    assert state["iteration"] == 4
+    assert_same_archive(state["scheduler"].archive, scheduler.archive)
+    # The emitters share the restored archive
+    assert all(emitter.archive is state["scheduler"].archive for emitter in state["scheduler"].emitters)
+
+
+def test_load_without_snapshot_rebuilds_archive(tmp_path):
+    scheduler = new_scheduler()
+    checkpoint = CheckpointLog(str(tmp_path))
+    run_iterations(scheduler, checkpoint, 0, 3)
+    checkpoint.close()
+
+    state = load_checkpoint(str(tmp_path), new_scheduler())
+    assert state["iteration"] == 3
+    assert_same_archive(state["scheduler"].archive, scheduler.archive)
+
+
+def test_resume_continues_from_snapshot(tmp_path):
+    np.random.seed(0)
+    random.seed(0)
+    scheduler = new_scheduler()
+    checkpoint = CheckpointLog(str(tmp_path))
+    run_iterations(scheduler, checkpoint, 0, 2, snapshot_itrs=(2,))
+    # Iterations after the snapshot are lost in a crash and their chunks are written again when resuming
+    expected_solutions = run_iterations(scheduler, checkpoint, 2, 3)[0]
+    checkpoint.close()
+    assert os.path.exists(chunk_path(str(tmp_path), 3))
+
+    state = resume_checkpoint(str(tmp_path), new_scheduler())
+    assert state["iteration"] == 2
+    assert not os.path.exists(chunk_path(str(tmp_path), 3))
+    assert np.array_equal(state["scheduler"].ask(), expected_solutions)
+
+
+def test_new_search_replaces_previous_checkpoint(tmp_path):
+    previous = new_scheduler()
+    checkpoint = CheckpointLog(str(tmp_path))
+    run_iterations(previous, checkpoint, 0, 4, snapshot_itrs=(2,))
+    checkpoint.close()
+
+    clear_checkpoint(str(tmp_path))
+    scheduler = new_scheduler()
+    checkpoint = CheckpointLog(str(tmp_path))
+    run_iterations(scheduler, checkpoint, 0, 1)
+    checkpoint.close()
+
+    # Neither the snapshot nor the later chunks of the previous search are loaded
+    state = resume_checkpoint(str(tmp_path), new_scheduler())
+    assert state["iteration"] == 1
+    assert state["metrics"] is None
+    assert_same_archive(state["scheduler"].archive, scheduler.archive)
@@ -0,0 +1,65 @@
+import os
+import random
+
+import numpy as np
+import pandas
+import pytest
+
+import internals.constants as constants
+import internals.evaluation as evaluation
+import internals.map_intermediates as map_intermediates
+import internals.result_extractor as result_extractor
+import internals.results_store as results_store
+import internals.simulation as simulation
+from internals.genomes import genomes_as_solutions, solution_to_phenotype
+from internals.smt_genome.smt_genome import SMTGenome
+
+FOLDER_NAME = "test_evaluation"
+BOT1_DATA = {"file": "sniper", "skill": "0.15"}
+BOT2_DATA = {"file": "shotgun", "skill": "0.85"}
+
+
+@pytest.fixture(autouse=True)
+def data_folder(tmp_path, monkeypatch):
+    for module in (evaluation, simulation, result_extractor, results_store, map_intermediates):
+        monkeypatch.setattr(module, "GAME_DATA_FOLDER", str(tmp_path))
+    monkeypatch.setattr(evaluation, "SIMULATION_BACKEND", constants.SYNTHETIC_BACKEND_NAME)
+    monkeypatch.setattr(evaluation, "EVALUATION_CACHE", False)
+    monkeypatch.setattr(evaluation, "__simulation_backend", None)
+    for root in ("Export", os.path.join("Import", "Genomes")):
+        os.makedirs(os.path.join(tmp_path, root, FOLDER_NAME))
+
+
+def smt_solutions(number):
+    """Solutions of random SMT genomes that can be solved"""
+    random.seed(0)
+    np.random.seed(0)
+    solutions = []
+    while len(solutions) < number:
+        solution = genomes_as_solutions([SMTGenome.create_random_genome()])[0]
+        if solution_to_phenotype(constants.SMT_NAME, solution) is not None:
+            solutions.append(solution)
+    return solutions
+
+
+def evaluate(solution, skip_existing):
+    return evaluation.evaluate_solution(solution, constants.SMT_NAME, 0, 0, BOT1_DATA, BOT2_DATA, game_length=60,
+                                        folder_name=FOLDER_NAME, num_parallel_simulations=2, skip_existing=skip_existing)
+
+
+def test_resume_reuses_completed_smt_evaluation(monkeypatch):
+    solution, other_solution = smt_solutions(2)
+    dataset, failed, _ = evaluate(solution, False)
+    assert not failed
+
+    # After a restart the phenotype may be built differently, the evaluation is matched on the solution instead
+    with monkeypatch.context() as patch:
+        patch.setattr(evaluation, "solution_to_phenotype", lambda *args: pytest.fail("The phenotype was built again"))
+        resumed_dataset, failed, profile = evaluate(solution, True)
+    assert not failed
+    assert "simulation" not in profile.times
+    pandas.testing.assert_frame_equal(resumed_dataset, dataset)
+
+    _, failed, profile = evaluate(other_solution, True)
+    assert not failed
+    assert "simulation" in profile.times
@@ -0,0 +1,93 @@
+import os
+
+import numpy as np
+import pytest
+
+import internals.constants as constants
+import internals.evaluation as evaluation
+import internals.map_intermediates as map_intermediates
+import internals.result_extractor as result_extractor
+import internals.results_store as results_store
+import internals.simulation as simulation
+from internals.ab_genome.ab_genome import ABGenome
+from internals.evaluation_cache import EvaluationCache
+from internals.map_intermediates import intermediates_path
+
+FOLDER_NAME = "test_evaluation_cache"
+BOT1_DATA = {"file": "sniper", "skill": "0.15"}
+BOT2_DATA = {"file": "shotgun", "skill": "0.85"}
+
+
+@pytest.fixture
+def export_folder(tmp_path, monkeypatch):
+    data_folder = os.path.join(tmp_path, "Data")
+    for module in (evaluation, simulation, result_extractor, results_store, map_intermediates):
+        monkeypatch.setattr(module, "GAME_DATA_FOLDER", data_folder)
+    for root in ("Export", os.path.join("Import", "Genomes")):
+        os.makedirs(os.path.join(data_folder, root, FOLDER_NAME))
+    return os.path.join(data_folder, "Export", FOLDER_NAME)
+
+
+@pytest.fixture
+def cache(tmp_path, monkeypatch):
+    cache = EvaluationCache(folder=os.path.join(tmp_path, "EvaluationCache"))
+    monkeypatch.setattr(evaluation, "EVALUATION_CACHE", True)
+    monkeypatch.setattr(evaluation, "SIMULATION_BACKEND", constants.SYNTHETIC_BACKEND_NAME)
+    # The backend of a previous test may be cached
+    monkeypatch.setattr(evaluation, "__simulation_backend", None)
+    monkeypatch.setattr(evaluation, "get_evaluation_cache", lambda: cache)
+    return cache
+
+
+def test_get_and_put(tmp_path):
+    cache = EvaluationCache(folder=str(tmp_path))
+    assert cache.get("missing") is None
+    cache.put("key", {"value": 1})
+    assert cache.get("key") == {"value": 1}
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["entries"]) == (1, 1, 1)
+
+
+def test_key_depends_on_map_and_bots():
+    phenotype = ABGenome.create_random_genome().phenotype()
+    key = EvaluationCache.key(phenotype, BOT1_DATA, BOT2_DATA, 600, 5, 1)
+    assert key == EvaluationCache.key(phenotype, BOT1_DATA, BOT2_DATA, 600, 5, 1)
+    assert key != EvaluationCache.key(phenotype, BOT1_DATA, BOT1_DATA, 600, 5, 1)
+    assert key != EvaluationCache.key(phenotype, BOT1_DATA, BOT2_DATA, 600, 5, 1, constants.SYNTHETIC_BACKEND_NAME)
+
+
+def test_eviction_keeps_recent_entries(tmp_path):
+    cache = EvaluationCache(folder=str(tmp_path), max_size_bytes=3000)
+    for i in range(10):
+        cache.put(f"key_{i}", {"data": bytes(1000)})
+        os.utime(os.path.join(tmp_path, f"key_{i}.pkl"), (i, i))
+    assert cache.stats()["size_bytes"] <= 3000
+    assert cache.get("key_9") is not None
+    assert cache.get("key_0") is None
+
+
+def test_hit_restores_evaluation(cache, export_folder):
+    phenotype = ABGenome.create_random_genome().phenotype()
+    dataset, failed, _ = evaluation.evaluate(phenotype, 0, 0, BOT1_DATA, BOT2_DATA, game_length=60, folder_name=FOLDER_NAME, num_parallel_simulations=2)
+    assert not failed and cache.stats()["misses"] == 1
+
+    cached_dataset, failed, profile = evaluation.evaluate(phenotype, 0, 1, BOT1_DATA, BOT2_DATA, game_length=60, folder_name=FOLDER_NAME, num_parallel_simulations=2)
+    assert not failed and cache.stats()["hits"] == 1
+    assert "simulation" not in profile.times
+    assert cached_dataset.equals(dataset)
+    for file_name in os.listdir(export_folder):
+        if file_name.startswith(("position_0_0_", "death_positions_0_0_", "map_0_0_")):
+            assert os.path.exists(os.path.join(export_folder, file_name.replace("_0_0_", "_0_1_", 1)))
+    assert os.path.exists(intermediates_path(FOLDER_NAME, "0_1"))
+
+
+def test_hit_without_exports_is_a_miss(cache, export_folder):
+    phenotype = ABGenome.create_random_genome().phenotype()
+    evaluation.evaluate(phenotype, 0, 0, BOT1_DATA, BOT2_DATA, game_length=60, folder_name=FOLDER_NAME, num_parallel_simulations=2)
+    os.remove(os.path.join(export_folder, "position_0_0_0_bot1.csv"))
+
+    _, failed, profile = evaluation.evaluate(phenotype, 0, 1, BOT1_DATA, BOT2_DATA, game_length=60, folder_name=FOLDER_NAME, num_parallel_simulations=2)
+    assert not failed
+    assert "simulation" in profile.times
+    assert os.path.exists(os.path.join(export_folder, "position_0_1_0_bot1.csv"))
+    assert cache.stats()["hits"] == 0 and cache.stats()["misses"] == 2
@@ -0,0 +1,49 @@
+import random
+
+import numpy as np
+import pytest
+
+import internals.constants as constants
+from internals.genome_layout import array_as_record
+from internals.genomes import GENOME_CLASSES, genomes_as_solutions, records_as_genomes, solutions_as_records
+
+NUM_GENOMES = 20
+
+
+def random_solutions(genome_class):
+    random.seed(0)
+    np.random.seed(0)
+    return genomes_as_solutions([genome_class.create_random_genome() for _ in range(NUM_GENOMES)])
+
+
+@pytest.mark.parametrize("representation", list(GENOME_CLASSES))
+def test_records_as_genomes_equals_array_as_genome(representation):
+    genome_class = GENOME_CLASSES[representation]
+    solutions = random_solutions(genome_class)
+    genomes = records_as_genomes(genome_class, solutions_as_records(genome_class, solutions))
+    assert len(genomes) == NUM_GENOMES
+    for solution, genome in zip(solutions, genomes):
+        expected = genome_class.array_as_genome(list(map(int, solution.tolist())))
+        assert type(genome) is genome_class
+        assert genome.to_array() == expected.to_array()
+        # Solutions of the archive are decoded as floats by the genome operators
+        assert genome_class.array_as_genome(solution).to_array() == expected.to_array()
+
+
+@pytest.mark.parametrize("representation", list(GENOME_CLASSES))
+def test_array_as_record_matches_records(representation):
+    genome_class = GENOME_CLASSES[representation]
+    solutions = random_solutions(genome_class)
+    records = solutions_as_records(genome_class, solutions)
+    for solution, record in zip(solutions, records):
+        expected = {name: record[name].tolist() for name, _ in genome_class.ARRAY_LAYOUT}
+        assert array_as_record(genome_class.ARRAY_LAYOUT, list(map(int, solution.tolist()))) == expected
+
+
+def test_solutions_of_wrong_length_are_rejected():
+    genome_class = GENOME_CLASSES[constants.ALL_BLACK_NAME]
+    solutions = random_solutions(genome_class)
+    with pytest.raises(ValueError):
+        solutions_as_records(genome_class, solutions[:, 1:])
+    with pytest.raises(ValueError):
+        genome_class.array_as_genome(solutions[0, 1:].tolist())
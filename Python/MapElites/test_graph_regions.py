@@ -0,0 +1,57 @@
+import igraph as ig
+
+from internals.graph import merge_adjacent_regions_second_criterion
+
+
+def build_graph(nodes, edges):
+    """Build a topology graph from (region, chokepoint, radius) tuples of its nodes"""
+    graph = ig.Graph(n=len(nodes), edges=edges)
+    graph.vs['region'] = [region for region, _, _ in nodes]
+    graph.vs['chokepoint'] = [chokepoint for _, chokepoint, _ in nodes]
+    graph.vs['radius'] = [radius for _, _, radius in nodes]
+    return graph
+
+
+def test_second_criterion_merges_through_larger_chokepoint():
+    # Region 2 has two chokepoints, the larger one is wider than 70% of its radius
+    graph = build_graph(
+        [(True, False, 10), (False, True, 9), (True, False, 10), (False, True, 2), (True, False, 10)],
+        [(0, 1), (1, 2), (2, 3), (3, 4)],
+    )
+    merge_adjacent_regions_second_criterion(graph, 0.7)
+    assert graph.vcount() == 3
+    assert graph.vs['region'] == [True, False, True]
+    assert graph.vs['radius'] == [10, 2, 10]
+    assert sorted(graph.get_edgelist()) == [(0, 1), (1, 2)]
+
+
+def test_second_criterion_keeps_narrow_chokepoints():
+    graph = build_graph(
+        [(True, False, 10), (False, True, 3), (True, False, 10), (False, True, 2), (True, False, 10)],
+        [(0, 1), (1, 2), (2, 3), (3, 4)],
+    )
+    merge_adjacent_regions_second_criterion(graph, 0.7)
+    assert graph.vcount() == 5
+
+
+def test_second_criterion_region_between_regions():
+    # Region 1 is directly connected to two regions, there is no chokepoint to compare
+    graph = build_graph(
+        [(True, False, 10), (True, False, 8), (True, False, 10)],
+        [(0, 1), (1, 2)],
+    )
+    merge_adjacent_regions_second_criterion(graph, 0.7)
+    assert graph.vcount() == 3
+    assert sorted(graph.get_edgelist()) == [(0, 1), (1, 2)]
+
+
+def test_second_criterion_region_between_regions_after_merge():
+    # The first pass merges region 2 with region 0, the second pass finds region 5 between two regions
+    graph = build_graph(
+        [(True, False, 10), (False, True, 9), (True, False, 10), (False, True, 2), (True, False, 10),
+         (True, False, 8), (True, False, 10)],
+        [(0, 1), (1, 2), (2, 3), (3, 4), (4, 5), (5, 6)],
+    )
+    merge_adjacent_regions_second_criterion(graph, 0.7)
+    assert graph.vcount() == 5
+    assert graph.vs['radius'] == [10, 2, 10, 8, 10]
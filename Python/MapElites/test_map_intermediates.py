@@ -0,0 +1,72 @@
+import os
+import random
+
+import numpy as np
+import pytest
+
+import internals.map_intermediates as map_intermediates
+from internals.ab_genome.ab_genome import ABGenome
+from internals.map_intermediates import load_topology_graph, load_visibility_matrix, save_intermediates
+
+FOLDER_NAME = "test_map_intermediates"
+
+
+@pytest.fixture(autouse=True)
+def data_folder(tmp_path, monkeypatch):
+    monkeypatch.setattr(map_intermediates, "GAME_DATA_FOLDER", str(tmp_path))
+    os.makedirs(os.path.join(tmp_path, "Export", FOLDER_NAME))
+
+
+def random_phenotype(seed):
+    random.seed(seed)
+    np.random.seed(seed)
+    return ABGenome.create_random_genome().phenotype()
+
+
+def not_computed(*args):
+    raise AssertionError("The intermediates should have been loaded")
+
+
+def assert_same_topology(topology, other):
+    graph, outer_shell, obstacles = topology
+    other_graph, other_outer_shell, other_obstacles = other
+    assert graph.get_edgelist() == other_graph.get_edgelist()
+    assert sorted(graph.vertex_attributes()) == sorted(other_graph.vertex_attributes())
+    for name in graph.vertex_attributes():
+        assert graph.vs[name] == other_graph.vs[name]
+    for name in graph.edge_attributes():
+        assert graph.es[name] == other_graph.es[name]
+    assert outer_shell.equals(other_outer_shell)
+    assert len(obstacles) == len(other_obstacles)
+    assert all(obstacle.equals(other_obstacle) for obstacle, other_obstacle in zip(obstacles, other_obstacles))
+
+
+def test_round_trip(monkeypatch):
+    phenotype = random_phenotype(0)
+    topology = phenotype.to_topology_graph_vornoi()
+    visibility_matrix = phenotype.to_visibility_matrix_grid()
+    save_intermediates(FOLDER_NAME, "0_0", phenotype, topology, visibility_matrix)
+
+    monkeypatch.setattr(phenotype, "to_topology_graph_vornoi", not_computed)
+    monkeypatch.setattr(phenotype, "to_visibility_matrix_grid", not_computed)
+    assert_same_topology(load_topology_graph(FOLDER_NAME, "0_0", phenotype), topology)
+    loaded_visibility = load_visibility_matrix(FOLDER_NAME, "0_0", phenotype)
+    assert loaded_visibility.dtype == np.float64
+    assert np.array_equal(loaded_visibility, visibility_matrix)
+
+
+def test_other_map_is_computed():
+    phenotype, other = random_phenotype(0), random_phenotype(1)
+    save_intermediates(FOLDER_NAME, "0_0", phenotype, phenotype.to_topology_graph_vornoi(), phenotype.to_visibility_matrix_grid())
+
+    # A map of the same size whose intermediates were not saved
+    assert (other.mapWidth, other.mapHeight) == (phenotype.mapWidth, phenotype.mapHeight)
+    assert not np.array_equal(other.map_matrix(), phenotype.map_matrix())
+    assert_same_topology(load_topology_graph(FOLDER_NAME, "0_0", other), other.to_topology_graph_vornoi())
+    assert np.array_equal(load_visibility_matrix(FOLDER_NAME, "0_0", other), other.to_visibility_matrix_grid())
+
+
+def test_missing_intermediates_are_computed():
+    phenotype = random_phenotype(0)
+    assert_same_topology(load_topology_graph(FOLDER_NAME, "0_0", phenotype), phenotype.to_topology_graph_vornoi())
+    assert np.array_equal(load_visibility_matrix(FOLDER_NAME, "0_0", phenotype), phenotype.to_visibility_matrix_grid())
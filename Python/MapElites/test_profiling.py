@@ -0,0 +1,53 @@
+import pickle
+import time
+
+import pytest
+
+from internals.profiling import StageProfile, aggregate_profiles
+
+
+@pytest.mark.parametrize("trace_memory", [False, True])
+def test_stages_accumulate(trace_memory):
+    profile = StageProfile(trace_memory=trace_memory)
+    with profile.stage("load"):
+        time.sleep(0.01)
+    with profile.stage("compute"):
+        data = bytearray(8 * 1024 * 1024)
+    with profile.stage("load"):
+        time.sleep(0.01)
+    assert list(profile.times) == ["load", "compute"]
+    assert profile.times["load"] >= 0.02
+    assert profile.total_time() == pytest.approx(sum(profile.times.values()))
+    if trace_memory:
+        assert profile.memory["compute"] >= len(data)
+    assert all(memory >= 0 for memory in profile.memory.values())
+
+
+def test_stage_is_recorded_on_error():
+    profile = StageProfile()
+    with pytest.raises(ValueError):
+        with profile.stage("failing"):
+            raise ValueError()
+    assert "failing" in profile.times
+
+
+def test_pickle():
+    profile = StageProfile()
+    with profile.stage("stage"):
+        pass
+    copy = pickle.loads(pickle.dumps(profile))
+    assert copy.times == profile.times and copy.memory == profile.memory
+    with copy.stage("other"):
+        pass
+    assert list(copy.times) == ["stage", "other"]
+
+
+def test_aggregate_profiles():
+    profiles = [StageProfile(), StageProfile()]
+    profiles[0].times, profiles[0].memory = {"a": 1.0, "b": 2.0}, {"a": 10, "b": 5}
+    profiles[1].times, profiles[1].memory = {"a": 3.0, "c": 4.0}, {"a": 20, "c": 1}
+    times, memory = aggregate_profiles(profiles)
+    assert times == {"a": 2.0, "b": 1.0, "c": 2.0}
+    assert list(times) == ["a", "b", "c"]
+    assert memory == {"a": 20, "b": 5, "c": 1}
+    assert aggregate_profiles([]) == ({}, {})
@@ -0,0 +1,124 @@
+import os
+
+import numpy as np
+import pandas
+import pytest
+
+import internals.results_store as results_store
+from internals.results_store import append_results, compact_results, feature_ranges_by_file, load_results, read_results, \
+    store_path
+
+FOLDER_NAME = "test_results_store"
+
+
+@pytest.fixture(autouse=True)
+def data_folder(tmp_path, monkeypatch):
+    monkeypatch.setattr(results_store, "GAME_DATA_FOLDER", str(tmp_path))
+
+
+def make_dataset(seed, integer_kills=True, with_accuracy=True):
+    rng = np.random.default_rng(seed)
+    dataset = pandas.DataFrame({
+        "numberOfFights": rng.integers(0, 50, 3),
+        "kills1": rng.integers(0, 20, 3) if integer_kills else rng.uniform(0, 20, 3),
+        "entropy": rng.uniform(0, 1, 3),
+        "isValid": [True, False, True],
+    })
+    if with_accuracy:
+        dataset["accuracy"] = rng.uniform(0, 1, 3)
+    return dataset
+
+
+def test_read_before_and_after_compaction():
+    datasets = {
+        0: make_dataset(0),
+        1: make_dataset(1, integer_kills=False),
+        2: make_dataset(2, with_accuracy=False),
+        3: make_dataset(3)[["accuracy", "isValid", "entropy", "kills1", "numberOfFights"]],
+    }
+    for individual, dataset in datasets.items():
+        append_results(FOLDER_NAME, 3, individual, dataset)
+    for individual, dataset in datasets.items():
+        pandas.testing.assert_frame_equal(read_results(FOLDER_NAME, 3, individual), dataset)
+
+    compact_results(FOLDER_NAME)
+    assert os.listdir(os.path.join(store_path(FOLDER_NAME), "iteration=3")) == ["compacted.parquet"]
+    for individual, dataset in datasets.items():
+        pandas.testing.assert_frame_equal(read_results(FOLDER_NAME, 3, individual), dataset)
+    assert read_results(FOLDER_NAME, 3, 5) is None
+    assert read_results(FOLDER_NAME, 4, 0) is None
+
+
+def test_compaction_keeps_schema_of_previous_compactions():
+    first, second = make_dataset(0), make_dataset(1, integer_kills=False)
+    append_results(FOLDER_NAME, 0, 0, first)
+    compact_results(FOLDER_NAME, [0])
+    append_results(FOLDER_NAME, 0, 1, second)
+    compact_results(FOLDER_NAME, [0])
+    pandas.testing.assert_frame_equal(read_results(FOLDER_NAME, 0, 0), first)
+    pandas.testing.assert_frame_equal(read_results(FOLDER_NAME, 0, 1), second)
+
+
+def test_load_results():
+    for iteration in range(2):
+        for individual in range(2):
+            append_results(FOLDER_NAME, iteration, individual, make_dataset(iteration * 2 + individual))
+    compact_results(FOLDER_NAME, [0])
+    # Added again after its iteration was compacted
+    replaced = make_dataset(10)
+    append_results(FOLDER_NAME, 0, 1, replaced)
+
+    results = load_results(FOLDER_NAME)
+    assert list(results.index.names) == results_store.INDEX_COLUMNS
+    assert sorted(set(results.index.droplevel("match"))) == [(0, 0), (0, 1), (1, 0), (1, 1)]
+    assert np.array_equal(results.loc[(0, 1), "kills1"].to_numpy(), replaced["kills1"].to_numpy())
+    pandas.testing.assert_frame_equal(read_results(FOLDER_NAME, 0, 1), replaced)
+
+    mean_results = results_store.load_mean_results(FOLDER_NAME, iterations=[1], columns=["entropy"])
+    assert list(mean_results.columns) == ["entropy"]
+    assert mean_results.loc[(1, 0), "entropy"] == pytest.approx(make_dataset(2)["entropy"].mean())
+
+
+def test_load_results_of_files_with_different_schemas():
+    append_results(FOLDER_NAME, 0, 0, make_dataset(0))
+    append_results(FOLDER_NAME, 0, 1, make_dataset(1, integer_kills=False, with_accuracy=False))
+    results = load_results(FOLDER_NAME, columns=["kills1", "accuracy"])
+    assert list(results.columns) == ["kills1", "accuracy"]
+    assert results["kills1"].dtype == np.float64
+    assert results.loc[(0, 1), "accuracy"].isna().all()
+    assert not results.loc[(0, 0), "accuracy"].isna().any()
+
+
+def merge_ranges(ranges):
+    mins, maxs = {}, {}
+    for file_ranges in ranges.values():
+        for feature, value in file_ranges["min"].items():
+            mins[feature] = min(mins[feature], value) if feature in mins else value
+        for feature, value in file_ranges["max"].items():
+            maxs[feature] = max(maxs[feature], value) if feature in maxs else value
+    return mins, maxs
+
+
+def test_feature_ranges_skip_superseded_results():
+    stale = make_dataset(0)
+    stale["kills1"] = 1000
+    append_results(FOLDER_NAME, 0, 0, stale)
+    append_results(FOLDER_NAME, 0, 1, make_dataset(1))
+    compact_results(FOLDER_NAME)
+    ranges = feature_ranges_by_file(FOLDER_NAME)
+    assert merge_ranges(ranges)[1]["kills1"] == 1000
+
+    append_results(FOLDER_NAME, 0, 0, make_dataset(2))
+    ranges = feature_ranges_by_file(FOLDER_NAME, ranges)
+    assert ranges[os.path.join("iteration=0", "compacted.parquet")]["replaced"] == [0]
+    results = load_results(FOLDER_NAME)
+    mins, maxs = merge_ranges(ranges)
+    for feature in ["numberOfFights", "kills1", "entropy", "accuracy"]:
+        assert mins[feature] == results[feature].min()
+        assert maxs[feature] == results[feature].max()
+
+    compact_results(FOLDER_NAME)
+    ranges = feature_ranges_by_file(FOLDER_NAME, ranges)
+    assert list(ranges) == [os.path.join("iteration=0", "compacted.parquet")]
+    assert ranges[os.path.join("iteration=0", "compacted.parquet")]["replaced"] == []
+    assert merge_ranges(ranges) == (mins, maxs)
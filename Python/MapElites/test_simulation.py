@@ -0,0 +1,74 @@
+import json
+import os
+import random
+
+import numpy as np
+import pytest
+
+import internals.constants as constants
+import internals.result_extractor as result_extractor
+import internals.simulation as simulation
+from internals.ab_genome.ab_genome import ABGenome
+from internals.simulation import MAP_BORDER, SyntheticSimulationBackend, get_simulation_backend
+
+FOLDER_NAME = "test_simulation"
+BOT1_DATA = {"file": "sniper", "skill": "0.15"}
+BOT2_DATA = {"file": "shotgun", "skill": "0.85"}
+
+
+@pytest.fixture
+def phenotype(tmp_path, monkeypatch):
+    monkeypatch.setattr(simulation, "GAME_DATA_FOLDER", str(tmp_path))
+    monkeypatch.setattr(result_extractor, "GAME_DATA_FOLDER", str(tmp_path))
+    os.makedirs(os.path.join(tmp_path, "Import", "Genomes", FOLDER_NAME))
+    random.seed(0)
+    np.random.seed(0)
+    phenotype = ABGenome.create_random_genome().phenotype()
+    phenotype.write_to_file(os.path.join(tmp_path, "Import", "Genomes", FOLDER_NAME, "0_0.json"))
+    return phenotype
+
+
+def run(backend, experiment_part, save_map=False):
+    simulations = [backend.start(FOLDER_NAME, "0_0", "0_0.json", 60, experiment_part, 2, BOT1_DATA, BOT2_DATA, save_map=save_map)]
+    return backend.wait(simulations, 10)
+
+
+def test_get_simulation_backend():
+    assert get_simulation_backend(constants.SYNTHETIC_BACKEND_NAME).name == constants.SYNTHETIC_BACKEND_NAME
+    assert get_simulation_backend(constants.UNITY_BACKEND_NAME).name == constants.UNITY_BACKEND_NAME
+    with pytest.raises(ValueError):
+        get_simulation_backend("Unknown")
+
+
+def test_synthetic_exports(phenotype, tmp_path):
+    backend = SyntheticSimulationBackend()
+    assert run(backend, 0, save_map=True) == [0]
+    export_dir = os.path.join(tmp_path, "Export", FOLDER_NAME)
+
+    with open(os.path.join(export_dir, "final_results_0_0_0.json")) as f:
+        results = json.load(f)
+    assert len(results) == 2
+    assert all(0 <= match["entropy"] <= 1 for match in results)
+
+    map_matrix = np.array(result_extractor.read_map("0_0", FOLDER_NAME))
+    assert np.array_equal(map_matrix[MAP_BORDER:-MAP_BORDER, MAP_BORDER:-MAP_BORDER], phenotype.map_matrix(inverted=True))
+
+    # Bots are always on walkable tiles
+    for bot_n in range(result_extractor.BOT_NUM):
+        positions = np.loadtxt(os.path.join(export_dir, f"position_0_0_0_bot{bot_n + 1}.csv"), delimiter=",") / phenotype.mapScale
+        assert len(positions) == 2 * 60 * 2
+        tiles = np.floor(positions).astype(int)
+        assert not map_matrix[tiles[:, 1], tiles[:, 0]].any()
+
+
+def test_synthetic_exports_are_deterministic(phenotype, tmp_path):
+    export_dir = os.path.join(tmp_path, "Export", FOLDER_NAME)
+    run(SyntheticSimulationBackend(), 0)
+    with open(os.path.join(export_dir, "position_0_0_0_bot1.csv")) as f:
+        positions = f.read()
+    run(SyntheticSimulationBackend(), 0)
+    with open(os.path.join(export_dir, "position_0_0_0_bot1.csv")) as f:
+        assert f.read() == positions
+    run(SyntheticSimulationBackend(), 1)
+    with open(os.path.join(export_dir, "position_0_0_1_bot1.csv")) as f:
+        assert f.read() != positions
@@ -0,0 +1,112 @@
+import random
+import threading
+
+import numpy as np
+import pytest
+
+from internals.config import SMT_INCREMENTAL_SOLVER
+from internals.smt_genome.smt_genome import SMTGenome
+from internals.smt_genome.solver import CANVAS_HEIGHT, CANVAS_WIDTH, SCALE_FACTOR, SMTLayoutSolver
+
+NUM_GENOMES = 4
+NUM_CHILDREN = 3
+
+
+def random_genomes():
+    """Random genomes, each followed by some of its mutated children"""
+    random.seed(0)
+    np.random.seed(0)
+    genomes = []
+    for _ in range(NUM_GENOMES):
+        genome = SMTGenome.create_random_genome()
+        genomes.append(genome)
+        # Mutation changes the genome in place
+        genomes += [SMTGenome.mutate(SMTGenome.array_as_genome(genome.to_array())) for _ in range(NUM_CHILDREN)]
+    return genomes
+
+
+def solve_all(solver, genomes):
+    """Get the layout of each genome, or None if it can't be solved"""
+    layouts = []
+    for genome in genomes:
+        try:
+            layouts.append(solver.solve(genome))
+        except Exception:
+            layouts.append(None)
+    return layouts
+
+
+def assert_valid_layout(genome, layout):
+    rooms = [room for room in genome.rooms if room is not None]
+    positions, mst = layout
+    assert len(positions) == len(rooms)
+    assert mst.shape == (len(rooms), len(rooms))
+    # Checked in the coordinates of the solver, where heights are scaled
+    boxes = [(x, round(y * SCALE_FACTOR), room.width, room.height * SCALE_FACTOR) for (x, y), room in zip(positions, rooms)]
+    for x, y, width, height in boxes:
+        assert 0 <= x and x + width <= CANVAS_WIDTH
+        assert 0 <= y and y + height <= CANVAS_HEIGHT * SCALE_FACTOR
+    separation, separation_y = genome.separation, genome.separation * SCALE_FACTOR
+    for i in range(len(boxes)):
+        for j in range(i + 1, len(boxes)):
+            xi, yi, wi, hi = boxes[i]
+            xj, yj, wj, hj = boxes[j]
+            assert yj <= yi - hj - separation_y or yi <= yj - hi - separation_y or \
+                xj <= xi - wj - separation or xi <= xj - wi - separation
+
+
+@pytest.mark.parametrize("incremental", [False, True])
+def test_layouts_are_valid(incremental):
+    genomes = random_genomes()
+    layouts = solve_all(SMTLayoutSolver(incremental=incremental), genomes)
+    assert any(layout is not None for layout in layouts)
+    for genome, layout in zip(genomes, layouts):
+        if layout is not None:
+            assert_valid_layout(genome, layout)
+
+
+def test_incremental_solves_the_same_genomes():
+    genomes = random_genomes()
+    fresh = solve_all(SMTLayoutSolver(timeout=2000), genomes)
+    incremental = solve_all(SMTLayoutSolver(timeout=2000, incremental=True), genomes)
+    assert [layout is None for layout in incremental] == [layout is None for layout in fresh]
+
+
+def test_fresh_solver_is_deterministic():
+    genomes = random_genomes()
+    layouts = solve_all(SMTLayoutSolver(), genomes)
+    again = solve_all(SMTLayoutSolver(), genomes)
+    assert [layout[0] if layout is not None else None for layout in again] == \
+        [layout[0] if layout is not None else None for layout in layouts]
+
+
+def test_layouts_do_not_depend_on_solving_order():
+    genomes = random_genomes()
+    # The timeout is long, so that the same genomes are solved within it
+    solver = SMTLayoutSolver(timeout=2000, incremental=SMT_INCREMENTAL_SOLVER)
+    layouts = solve_all(solver, genomes)
+    reversed_layouts = solve_all(solver, genomes[::-1])[::-1]
+    assert any(layout is not None for layout in layouts)
+    assert [layout[0] if layout is not None else None for layout in reversed_layouts] == \
+        [layout[0] if layout is not None else None for layout in layouts]
+
+
+def test_solver_is_shared_by_threads():
+    genomes = random_genomes()
+    solver = SMTLayoutSolver(incremental=True)
+    errors = []
+
+    def solve_genomes():
+        try:
+            for genome, layout in zip(genomes, solve_all(solver, genomes)):
+                if layout is not None:
+                    assert_valid_layout(genome, layout)
+        except AssertionError as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=solve_genomes) for _ in range(2)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert errors == []
@@ -0,0 +1,77 @@
+import random
+
+import numpy as np
+import pytest
+
+from internals.ab_genome.ab_genome import ABGenome
+from internals.result_extractor import compute_symmetry
+
+
+def scalar_symmetry(map_matrix):
+    """The symmetry as computed by __analyze_symmetry before compute_symmetry, one tile at a time"""
+    x_len = len(map_matrix)
+    y_len = len(map_matrix[0])
+
+    min_x, max_x, min_y, max_y = x_len, 0, x_len, 0
+    for x in range(len(map_matrix)):
+        for y in range(len(map_matrix[0])):
+            if map_matrix[x][y] == 1:
+                min_x = min(min_x, x)
+                max_x = max(max_x, x)
+                min_y = min(min_y, y)
+                max_y = max(max_y, y)
+    x_len = max_x - min_x
+    y_len = max_y - min_y
+
+    num_walkable_tiles = np.count_nonzero(map_matrix)
+
+    x_symmetry = 0
+    y_mid_point = int(np.floor(y_len/2))
+    for x in range(min_x, max_x + 1):
+        for y in range(min_y, min_y + y_mid_point + 1):
+            opposite_y = max_y - (y - min_y)
+            if map_matrix[x][y] == map_matrix[x][opposite_y]:
+                if map_matrix[x][y] != 0:
+                    x_symmetry += 2 if y != opposite_y else 1
+
+    y_symmetry = 0
+    x_mid_point = int(np.floor(x_len/2))
+    for y in range(min_y, max_y + 1):
+        for x in range(min_x, min_x + x_mid_point + 1):
+            opposite_x = max_x - (x - min_x)
+            if map_matrix[x][y] == map_matrix[opposite_x][y]:
+                if map_matrix[x][y] != 0:
+                    y_symmetry += 2 if x != opposite_x else 1
+
+    x_symmetry /= num_walkable_tiles
+    y_symmetry /= num_walkable_tiles
+    return x_symmetry, y_symmetry, max(x_symmetry, y_symmetry)
+
+
+def random_maps(seed, shape, num_maps=8):
+    """Random maps whose tiles holding 1 are in a random box, so that the bounding boxes differ"""
+    rng = np.random.default_rng(seed)
+    maps = np.zeros((num_maps,) + shape, dtype=np.int8)
+    for map_matrix in maps:
+        x0, y0 = rng.integers(0, shape[0] // 2), rng.integers(0, shape[1] // 2)
+        x1, y1 = rng.integers(x0 + 1, shape[0] + 1), rng.integers(y0 + 1, shape[1] + 1)
+        map_matrix[x0:x1, y0:y1] = rng.random((x1 - x0, y1 - y0)) < 0.6
+        map_matrix[x0, y0] = 1
+    return maps
+
+
+def assert_same_symmetry(maps):
+    x_symmetry, y_symmetry, max_symmetry = compute_symmetry(maps)
+    for i, map_matrix in enumerate(maps):
+        assert (x_symmetry[i], y_symmetry[i], max_symmetry[i]) == scalar_symmetry(map_matrix)
+
+
+@pytest.mark.parametrize("seed, shape", [(0, (12, 12)), (1, (9, 16)), (2, (17, 7))])
+def test_batch_matches_scalar_symmetry(seed, shape):
+    assert_same_symmetry(random_maps(seed, shape))
+
+
+def test_batch_matches_scalar_symmetry_on_phenotype_maps():
+    random.seed(0)
+    np.random.seed(0)
+    assert_same_symmetry(np.stack([ABGenome.create_random_genome().phenotype().map_matrix() for _ in range(4)]))
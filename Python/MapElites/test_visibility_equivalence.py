@@ -0,0 +1,43 @@
+import random
+
+import numpy as np
+import pytest
+
+from internals.ab_genome.ab_genome import ABGenome
+from internals.visibility import SPACE_TILE, create_visibility_edges_DDA, create_visibility_graph_DDA, \
+    create_visibility_matrix_DDA, create_visibility_matrix_from_edges, create_visibility_matrix_grid, \
+    create_visibility_matrix_grid_batched
+
+
+def random_map(seed, shape, space_ratio=0.7):
+    rng = np.random.default_rng(seed)
+    return (rng.random(shape) < space_ratio).astype(int) * SPACE_TILE
+
+
+def phenotype_map(seed):
+    random.seed(seed)
+    np.random.seed(seed)
+    return ABGenome.create_random_genome().phenotype().map_matrix()
+
+
+@pytest.mark.parametrize("seed, shape", [(0, (12, 12)), (1, (9, 16)), (2, (17, 7))])
+def test_batched_grid_visibility_on_random_maps(seed, shape):
+    map_matrix = random_map(seed, shape)
+    assert np.array_equal(create_visibility_matrix_grid_batched(map_matrix), create_visibility_matrix_grid(map_matrix))
+
+
+def test_batched_grid_visibility_on_phenotype_map():
+    map_matrix = phenotype_map(0)
+    assert np.array_equal(create_visibility_matrix_grid_batched(map_matrix), create_visibility_matrix_grid(map_matrix))
+
+
+@pytest.mark.parametrize("seed, shape", [(0, (12, 12)), (1, (9, 16)), (2, (17, 7))])
+def test_compact_DDA_matches_efficient_DDA(seed, shape):
+    map_matrix = random_map(seed, shape)
+    graph = create_visibility_graph_DDA(map_matrix)
+    coords, edges = create_visibility_edges_DDA(map_matrix)
+    assert np.array_equal(coords, np.array(graph.vs["coords"]))
+    # Same edges, in the same order. The endpoints of the edges of undirected graphs may be swapped by igraph
+    assert [tuple(sorted(edge)) for edge in edges.tolist()] == [tuple(sorted(edge)) for edge in graph.get_edgelist()]
+    assert np.array_equal(create_visibility_matrix_from_edges(coords, edges, map_matrix),
+                          create_visibility_matrix_DDA(graph, map_matrix))